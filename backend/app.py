@@ -1,7 +1,7 @@
 # =========================
 # IMPORTS Y CONFIGURACIÓN
 # =========================
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, has_app_context, Response, stream_with_context
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_mail import Mail, Message
@@ -12,30 +12,106 @@ import random
 import string
 from flask_bcrypt import Bcrypt
 import datetime
-import joblib
+import json
+import time
+import threading
+import fcntl
 import numpy as np
 import osmnx as ox
 import networkx as nx
 from models import db, User, Role, CodigosVerificacion, Cotizacion, Pedido, PedidoDetalle
 from models import Proveedor, OrdenCompra, OrdenCompraDetalle, CuentaPagar, CuentaCobrar, MovimientoPago, InventarioSucursal, MetodoPago
-from ml.ruta_modelo import load_graph_z16, shortest_route_stats, ensure_edge_speeds
+from models import ModeloML, ReporteGuardado
+from ml.ruta_modelo import load_graph_z16, route_matrix, ensure_edge_speeds, export_graph_snapshot, SNAPSHOT_DIR
+from ml.ruta_modelo import load_contraction_hierarchies, FERIA_POINTS
+from ml.motor_rutas import MotorRutas
+from ml.indice_espacial import IndiceAristas
+from ml.tsp import solve_tsp
+from ml.vrp import solve_cvrp
+from ml.inferencia import LoteadorInferencia
+from ml.caracteristicas import vector, faltantes, ESQUEMA_LEGADO
+from ml.cache_rutas import CacheRutas, clave_ruta, CACHE_DB
+from ml.cache_distancias import DistanciasPares, PARES_DB
+from ml.registro import RegistroModelos, registrar_modelo, activar_modelo
+from serializadores import consulta, obtener, serializar, serializar_lista
+from listados import listar, ErrorListado
+from exportaciones import exportar
+from resumen_entregas import datos_dashboard, registrar_rutas
+from reportes import ejecutar as ejecutar_reporte, guardar as guardar_reporte, ErrorReporte
+from ml.trabajos import lanzar_entrenamiento, trabajo_activo, obtener_trabajo, eventos_trabajo, reclamar_registro, anotar_resultado
 
 # =========================
 # VARIABLES GLOBALES Y ML
 # =========================
 G_CACHED = None
-MODEL_CACHED = None
+MOTOR_CACHED = None
+INDICE_CACHED = None
+LOTEADOR = None
+
+# Distancia máxima (m) entre un clic y la calle más cercana
+MAX_SNAP_M = float(os.getenv('MAX_SNAP_M', 300))
+
+# Tiempo máximo (s) de búsqueda local del TSP por solicitud
+TSP_TIME_BUDGET_S = float(os.getenv('TSP_TIME_BUDGET_S', 0.5))
+VRP_TIME_BUDGET_S = float(os.getenv('VRP_TIME_BUDGET_S', 2.0))
+# Tope (s) para el presupuesto que pida el cliente: cada solicitud ocupa un worker
+TSP_TIME_BUDGET_MAX_S = float(os.getenv('TSP_TIME_BUDGET_MAX_S', 5.0))
+VRP_TIME_BUDGET_MAX_S = float(os.getenv('VRP_TIME_BUDGET_MAX_S', 10.0))
+
+def presupuesto_s(valor, por_defecto, maximo):
+    """Presupuesto de búsqueda pedido por el cliente, acotado a [0, maximo]."""
+    try:
+        valor = float(por_defecto if valor is None else valor)
+    except (TypeError, ValueError):
+        valor = por_defecto
+    if np.isnan(valor):
+        valor = por_defecto
+    return min(max(valor, 0.0), maximo)
+
+# Modelo ML activo (registro en ModeloML); cada cuántos segundos se revisa si cambió
+REGISTRO = RegistroModelos(ModeloML, intervalo_s=float(os.getenv('MODELO_REVISION_S', 10)))
+
+# Micro-batching de inferencia: filas por lote y espera máxima (ms) para juntarlas
+INFER_MAX_LOTE = int(os.getenv('INFER_MAX_LOTE', 64))
+INFER_ESPERA_MS = float(os.getenv('INFER_ESPERA_MS', 2))
+
+# Cache de /api/find-route: LRU con TTL en el proceso + SQLite compartido
+# (RUTA_CACHE_DB vacío = solo memoria)
+CACHE_RUTAS = CacheRutas(
+    max_entradas=int(os.getenv('RUTA_CACHE_MAX', 1024)),
+    ttl_s=float(os.getenv('RUTA_CACHE_TTL_S', 3600)),
+    db_path=os.getenv('RUTA_CACHE_DB', CACHE_DB) or None,
+)
+
+# Distancias entre pares de puntos ya buscados (depósito, clientes habituales):
+# SQLite compartido con expulsión LFU (DISTANCIAS_DB vacío = desactivado)
+PARES_DISTANCIA = DistanciasPares(
+    db_path=os.getenv('DISTANCIAS_DB', PARES_DB),
+    max_filas=int(os.getenv('DISTANCIAS_MAX_FILAS', 500000)),
+) if os.getenv('DISTANCIAS_DB', PARES_DB) else None
+
+# Máximo de rutas por solicitud en /api/predict-route-time/batch
+PREDICT_BATCH_MAX = int(os.getenv('PREDICT_BATCH_MAX', 1000))
+
+# Rango de prioridad de pedidos (mayor = se atiende primero si la flota no alcanza)
+PRIORIDADES_PEDIDO = {'baja': 0, 'normal': 1, 'alta': 2, 'urgente': 3}
 
 def load_ml_model():
-    """Carga y cachea el modelo ML."""
-    global MODEL_CACHED
-    if MODEL_CACHED is None:
-        try:
-            MODEL_CACHED = joblib.load('ml/model_rf.pkl')
-            print("Modelo ML cargado exitosamente")
-        except Exception as e:
-            print(f"Error cargando modelo ML: {e}")
-    return MODEL_CACHED
+    """
+    Modelo ML vigente del registro (fila activa de ModeloML). Dentro de una
+    solicitud revisa si se activó otro y lo carga en segundo plano; mientras
+    tanto sigue sirviendo el anterior.
+    """
+    if has_app_context():
+        return REGISTRO.verificar()
+    return REGISTRO.modelo
+
+def esquema_para(features):
+    """
+    Features de entrada (en orden) del modelo vigente que atiende `features`:
+    el principal si vienen las de camino; si no, el de servicio de 3 features.
+    """
+    return REGISTRO.elegir(features)[1]
 
 def init_graph():
     """Inicializa y cachea el grafo para reutilizarlo."""
@@ -53,18 +129,69 @@ def init_graph():
             ensure_edge_speeds(G_CACHED, fallback_kph=30.0)
     return G_CACHED
 
+def init_motor():
+    """
+    Abre el snapshot binario del grafo con mmap (las páginas se comparten entre
+    workers de gunicorn). Si no existe, lo genera una vez desde el GraphML: el
+    primer worker lo compila bajo un lock de archivo y los demás, al obtener el
+    lock, abren el snapshot que ese worker dejó.
+    """
+    global MOTOR_CACHED
+    if MOTOR_CACHED is None:
+        try:
+            MOTOR_CACHED = MotorRutas.cargar(SNAPSHOT_DIR, mmap_mode='r')
+            print("Motor de rutas cargado desde snapshot")
+        except Exception as e:
+            print(f"Snapshot no disponible ({e}); compilando desde el grafo...")
+            with open(SNAPSHOT_DIR.rstrip(os.sep) + '.lock', 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    MOTOR_CACHED = MotorRutas.cargar(SNAPSHOT_DIR, mmap_mode='r')
+                    print("Motor de rutas cargado desde el snapshot de otro worker")
+                except Exception:
+                    MOTOR_CACHED = export_graph_snapshot(init_graph(), ferias=FERIA_POINTS, buffer_m=500)
+        print(f"Motor de rutas: {MOTOR_CACHED.n_nodos} nodos, {len(MOTOR_CACHED.indices)} aristas")
+        # Jerarquías de contracción preprocesadas por ruta_modelo.main() (opcional)
+        load_contraction_hierarchies(MOTOR_CACHED)
+    return MOTOR_CACHED
+
+def fecha_de_ruta(data):
+    """Fecha/hora de la ruta pedida ('fecha' ISO en el JSON; por defecto, ahora). None si no es válida."""
+    if data.get('fecha'):
+        try:
+            return datetime.datetime.fromisoformat(data['fecha'])
+        except (TypeError, ValueError):
+            return None
+    return datetime.datetime.now()
+
+FECHA_INVALIDA = "Fecha inválida en 'fecha' (formato ISO, p. ej. 2024-05-16)"
+
+def init_indice():
+    """Construye (una sola vez) el STRtree de aristas sobre el motor cacheado."""
+    global INDICE_CACHED
+    if INDICE_CACHED is None:
+        INDICE_CACHED = IndiceAristas(init_motor())
+    return INDICE_CACHED
+
+def init_loteador():
+    """Loteador de inferencia del proceso (su hilo arranca con la primera fila)."""
+    global LOTEADOR
+    if LOTEADOR is None:
+        LOTEADOR = LoteadorInferencia(REGISTRO.por_esquema, max_lote=INFER_MAX_LOTE, espera_ms=INFER_ESPERA_MS)
+    return LOTEADOR
+
 def predict_route_time_ml(data):
-    """Predice tiempo de ruta usando modelo pre-entrenado."""
+    """Predice tiempo de ruta usando modelo pre-entrenado (vía el micro-batcher).
+
+    `data` trae las features de ml/caracteristicas.py; se arma la fila según
+    el esquema del modelo vigente.
+    """
     model = load_ml_model()
     if not model:
         return {'predicted_time_min': data['base_time_sec'] / 60.0}
     try:
-        X = np.array([[
-            data['dist_m'],
-            data['base_time_sec'],
-            data['is_thursday']
-        ]])
-        pred_sec = model.predict(X)[0]
+        esquema = esquema_para(data)
+        pred_sec = init_loteador().predecir(vector(data, esquema), esquema)
         return {
             'predicted_time_sec': float(pred_sec),
             'predicted_time_min': round(float(pred_sec) / 60.0, 2)
@@ -202,16 +329,8 @@ def change_password():
 @app.route('/api/users', methods=['GET'])
 def get_users():
     """Endpoint para obtener la lista de usuarios."""
-    users = User.query.all()
-    return jsonify({'success': True, 'users': [
-        {
-            'id': u.id,
-            'username': u.nombre,
-            'email': u.email,
-            'role': u.role.nombre,
-            'is_active': u.activo
-        } for u in users
-    ]})
+    users = consulta(User).all()
+    return jsonify({'success': True, 'users': serializar_lista(users)})
 
 @app.route('/api/users', methods=['POST'])
 def create_user():
@@ -314,12 +433,14 @@ def delete_user(user_id):
 def predict_route_time():
     """
     Endpoint que recibe los datos de una ruta y retorna la predicción de tiempo de entrega usando el modelo ML.
-    Espera un JSON con: dist_m, base_time_sec, is_thursday
+    Espera un JSON con: dist_m, base_time_sec, is_thursday y, opcionalmente,
+    las features de camino (n_giros, frac_principal, ...); sin ellas responde
+    el modelo de servicio de 3 features.
     """
     data = request.get_json()
     dist_m = data.get('dist_m')
     base_time_sec = data.get('base_time_sec')
-    is_thursday = data.get('is_thursday', 0)
+    data.setdefault('is_thursday', 0)
 
     # Validar datos de entrada
     if dist_m is None or base_time_sec is None:
@@ -331,10 +452,14 @@ def predict_route_time():
         # No se pudo cargar el modelo — devolver estimación basada en base_time_sec
         return jsonify({'success': True, 'predicted_time_sec': base_time_sec, 'predicted_time_min': round(base_time_sec / 60.0, 2)})
 
-    # Preparar datos para predicción
-    X = np.array([[dist_m, base_time_sec, is_thursday]])
+    esquema = esquema_para(data)
+    sin_valor = faltantes(data, esquema)
+    if sin_valor:
+        return jsonify({'success': False, 'message': f'El modelo vigente requiere: {", ".join(sin_valor)}'}), 400
+
+    # Predicción a través del micro-batcher (se agrupa con solicitudes concurrentes)
     try:
-        pred = model.predict(X)[0]
+        pred = init_loteador().predecir(vector(data, esquema), esquema)
         return jsonify({
             'success': True, 
             'predicted_time_sec': float(pred),
@@ -343,18 +468,200 @@ def predict_route_time():
     except Exception as e:
         return jsonify({'success': False, 'message': f'Error en la predicción: {str(e)}'}), 500
 
+@app.route('/api/predict-route-time/batch', methods=['POST'])
+def predict_route_time_batch():
+    """
+    Predicción de tiempo para muchas rutas en una sola llamada a model.predict.
+    Espera un JSON con 'routes': [{dist_m, base_time_sec, is_thursday, ...}, ...]
+    (o directamente la lista). Cada ruta con las features de camino va al
+    modelo vigente; las que solo traen las 3 de siempre, a su modelo de servicio.
+    Los resultados vuelven en el mismo orden; las filas inválidas llevan su
+    propio mensaje de error.
+    """
+    data = request.get_json(silent=True)
+    registros = data if isinstance(data, list) else (data or {}).get('routes')
+    if not isinstance(registros, list) or not registros:
+        return jsonify({'success': False, 'message': "Se requiere una lista 'routes' con al menos una ruta"}), 400
+    if len(registros) > PREDICT_BATCH_MAX:
+        return jsonify({'success': False, 'message': f'Máximo {PREDICT_BATCH_MAX} rutas por solicitud'}), 400
+
+    # Validación columnar: una columna por feature de los esquemas vigentes y, por fila, el
+    # primer modelo cuyo esquema viene completo (las filas de 3 features van al de servicio)
+    model = load_ml_model()
+    modelos = list(REGISTRO.por_esquema().items()) if model else []
+    esquemas = [list(e) for e, _ in modelos] or [ESQUEMA_LEGADO]
+    n = len(registros)
+    columnas = {c: np.full(n, np.nan) for c in dict.fromkeys(['dist_m', 'base_time_sec', 'is_thursday',
+                                                               *(c for e in esquemas for c in e)])}
+    grupo = np.full(n, -1)
+    errores = {}
+    for i, r in enumerate(registros):
+        if not isinstance(r, dict):
+            errores[i] = 'La ruta debe ser un objeto'
+            continue
+        r = dict(r)
+        r.setdefault('is_thursday', 0)
+        k = next((k for k, e in enumerate(esquemas) if not faltantes(r, e)), 0)
+        requeridas = list(dict.fromkeys(['dist_m', 'base_time_sec', 'is_thursday', *esquemas[k]]))
+        try:
+            for c in requeridas:
+                columnas[c][i] = float(r.get(c))
+        except (TypeError, ValueError):
+            errores[i] = f'Se requieren valores numéricos para: {", ".join(requeridas)}; is_thursday 0 o 1'
+            continue
+        fila = [columnas[c][i] for c in requeridas]
+        if not np.isfinite(fila).all() or min(fila) < 0:
+            errores[i] = 'Las features deben ser números finitos no negativos'
+        elif columnas['is_thursday'][i] not in (0, 1):
+            errores[i] = 'is_thursday debe ser 0 o 1'
+        else:
+            grupo[i] = k
+
+    pred = columnas['base_time_sec'].copy()  # sin modelo: estimación = tiempo base
+    for k, (esquema, modelo) in enumerate(modelos):
+        filas = grupo == k
+        if not filas.any():
+            continue
+        X = np.column_stack([columnas[c] for c in esquema])[filas]
+        try:
+            pred[filas] = modelo.predict(X)
+        except Exception as e:
+            return jsonify({'success': False, 'message': f'Error en la predicción: {str(e)}'}), 500
+
+    resultados = []
+    for i in range(n):
+        if i in errores:
+            resultados.append({'index': i, 'success': False, 'message': errores[i]})
+        else:
+            resultados.append({
+                'index': i,
+                'success': True,
+                'predicted_time_sec': float(pred[i]),
+                'predicted_time_min': round(float(pred[i]) / 60.0, 2)
+            })
+    return jsonify({'success': True, 'results': resultados, 'errors': len(errores)})
+
+@app.route('/api/ml/inference-stats', methods=['GET'])
+def inference_stats():
+    """Contadores del micro-batcher de inferencia de este proceso."""
+    return jsonify({'success': True, 'stats': init_loteador().estadisticas()})
+
+@app.route('/api/route-cache/stats', methods=['GET'])
+def route_cache_stats():
+    """Aciertos / fallos del cache de /api/find-route en este proceso."""
+    return jsonify({'success': True, 'stats': CACHE_RUTAS.estadisticas()})
+
+def registrar_trabajo(trabajo_id):
+    """Registra en ModeloML el artefacto de un entrenamiento completado (una sola vez)."""
+    trabajo = obtener_trabajo(trabajo_id)
+    if not trabajo or trabajo['estado'] != 'completado' or trabajo['registrado']:
+        return trabajo
+    # un reentrenamiento incremental sin entregas nuevas no produce artefacto
+    if not (trabajo['resultado'] or {}).get('ruta_archivo'):
+        return trabajo
+    if reclamar_registro(trabajo_id):
+        try:
+            fila = registrar_modelo(db, ModeloML, trabajo['resultado'])
+            anotar_resultado(trabajo_id, modelo_id=fila.id)
+            REGISTRO.verificar(forzar=True)
+        except Exception as e:
+            db.session.rollback()
+            anotar_resultado(trabajo_id, error_registro=str(e))
+            print(f"Error registrando modelo del trabajo {trabajo_id}: {e}")
+    return obtener_trabajo(trabajo_id)
+
+def vigilar_entrenamiento(proceso, trabajo_id):
+    """Hilo: espera el proceso del trabajo y registra el modelo al terminar."""
+    proceso.join()
+    with app.app_context():
+        registrar_trabajo(trabajo_id)
+
 @app.route('/api/train-route-model', methods=['POST'])
 def train_route_model():
     """
-    Endpoint para reentrenar el modelo ML con nuevos datos.
+    Lanza el reentrenamiento en segundo plano y responde de inmediato con el id
+    del trabajo. El avance se consulta en /api/train-route-model/<id> (JSON) o
+    /api/train-route-model/<id>/events (SSE).
+    Con {"incremental": true} solo agrega árboles entrenados con las rutas
+    completadas nuevas (tiempo total de sus MetricaEntrega) sobre el modelo activo.
     """
     try:
-        # Ejecuta el pipeline principal de ruta_modelo.py
-        from ml import ruta_modelo
-        ruta_modelo.main()
-        return jsonify({'success': True, 'message': 'Modelo reentrenado y guardado.'})
+        data = request.get_json(silent=True) or {}
+        en_curso = trabajo_activo()
+        if en_curso:
+            return jsonify({'success': False, 'message': 'Ya hay un entrenamiento en curso', 'job_id': en_curso}), 409
+        trabajo_id, proceso = lanzar_entrenamiento('incremental' if data.get('incremental') else 'entrenamiento')
+        threading.Thread(target=vigilar_entrenamiento, args=(proceso, trabajo_id), daemon=True).start()
+        return jsonify({'success': True, 'message': 'Entrenamiento iniciado', 'job_id': trabajo_id}), 202
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Error al iniciar el entrenamiento: {str(e)}'}), 500
+
+@app.route('/api/train-route-model/<job_id>', methods=['GET'])
+def train_route_model_status(job_id):
+    """Estado y etapa del trabajo de entrenamiento."""
+    trabajo = registrar_trabajo(job_id)
+    if not trabajo:
+        return jsonify({'success': False, 'message': 'Trabajo no encontrado'}), 404
+    return jsonify({'success': True, 'job': trabajo})
+
+@app.route('/api/train-route-model/<job_id>/events', methods=['GET'])
+def train_route_model_events(job_id):
+    """Progreso del trabajo como Server-Sent Events, hasta que termina."""
+    if not obtener_trabajo(job_id):
+        return jsonify({'success': False, 'message': 'Trabajo no encontrado'}), 404
+
+    def generar():
+        ultimo = int(request.headers.get('Last-Event-ID', 0) or 0)
+        while True:
+            for ev in eventos_trabajo(job_id, desde=ultimo):
+                ultimo = ev['id']
+                yield f"id: {ev['id']}\nevent: progreso\ndata: {json.dumps(ev)}\n\n"
+            trabajo = obtener_trabajo(job_id)
+            if trabajo['estado'] in ('completado', 'error'):
+                trabajo = registrar_trabajo(job_id)
+                yield f"event: fin\ndata: {json.dumps(trabajo)}\n\n"
+                return
+            time.sleep(0.5)
+
+    return Response(stream_with_context(generar()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/ml/models', methods=['GET'])
+def list_ml_models():
+    """Modelos registrados (más recientes primero) y el que sirve este worker."""
+    try:
+        modelos = ModeloML.query.order_by(ModeloML.fecha_entrenamiento.desc(), ModeloML.id.desc()).all()
+        data = [{
+            'id': m.id,
+            'nombre': m.nombre,
+            'tipo': m.tipo,
+            'version': m.version,
+            'formato': m.formato,
+            'ruta_archivo': m.ruta_archivo,
+            'esquema': m.esquema,
+            'metadatos': m.metadatos,
+            'fecha_entrenamiento': m.fecha_entrenamiento.isoformat() if m.fecha_entrenamiento else None,
+            'activo': bool(m.activo)
+        } for m in modelos]
+        load_ml_model()
+        return jsonify({'success': True, 'modelos': data, 'en_uso': REGISTRO.info})
     except Exception as e:
-        return jsonify({'success': False, 'message': f'Error al entrenar el modelo: {str(e)}'}), 500
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/ml/models/<int:mid>/activate', methods=['POST'])
+def activate_ml_model(mid):
+    """Activa un modelo registrado (p. ej. para volver a una versión anterior)."""
+    try:
+        m = ModeloML.query.get(mid)
+        if not m:
+            return jsonify({'success': False, 'message': 'Modelo no encontrado'}), 404
+        activar_modelo(db, ModeloML, m.id)
+        db.session.commit()
+        REGISTRO.verificar(forzar=True)
+        return jsonify({'success': True, 'message': f'Modelo {m.id} activado'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
 
 # =========================
 # ENDPOINTS DE DASHBOARD Y OTROS
@@ -369,27 +676,8 @@ def get_dashboard():
     if not user:
         return jsonify({'success': False, 'message': 'Usuario no encontrado'}), 404
     if user.role.nombre == 'admin':
-        dashboard_data = {
-            "on_time_delivery": random.randint(85, 98),
-            "avg_delivery_time": random.randint(25, 45),
-            "fuel_consumption": random.randint(580, 680),
-            "mileage_per_route": random.randint(300, 350),
-            "weekly_performance": [random.randint(60, 100) for _ in range(7)],
-            "route_comparison": [
-                {"name": "Ruta A", "efficiency": 85},
-                {"name": "Ruta B", "efficiency": 92},
-                {"name": "Ruta C", "efficiency": 78},
-                {"name": "Ruta D", "efficiency": 88}
-            ],
-            "delivery_status": [
-                {"route": "Ruta Norte", "status": "A tiempo", "time": "09:30 AM"},
-                {"route": "Ruta Norte", "status": "Retrasada", "time": "10:45 AM"},
-                {"route": "Ruta Norte", "status": "Retrasada", "time": "11:15 AM"},
-                {"route": "Ruta Norte", "status": "A tiempo", "time": "09:50 AM"},
-                {"route": "Ruta Norte", "status": "A tiempo", "time": "10:20 AM"},
-                {"route": "Ruta Norte", "status": "Retrasada", "time": "11:30 AM"}
-            ]
-        }
+        # indicadores desde resumen_entregas (agregados por ruta/día/vehículo)
+        dashboard_data = datos_dashboard(db.session)
         return jsonify({'success': True, 'data': dashboard_data, 'show_map': False})
     else:
         return jsonify({'success': True, 'show_map': True})
@@ -414,6 +702,98 @@ def health_check():
         'service': 'Metales Galvanizados API'
     })
 
+# -------------------------
+# Reportes (reportes.py)
+# -------------------------
+
+@app.route('/api/reportes', methods=['POST'])
+def generar_reporte():
+    """
+    Reporte agregado {tipo, filtro}; con 'nombre' además queda guardado.
+    Repetir el mismo filtro sin cambios en sus tablas responde desde el cache.
+    """
+    try:
+        payload = request.get_json() or {}
+        tipo = payload.get('tipo')
+        filtro = payload.get('filtro') or {}
+        if payload.get('nombre'):
+            registro = guardar_reporte(db.session, tipo, filtro, payload['nombre'], payload.get('creado_por'))
+            datos, desde_cache = registro.resultado_cache, False
+        else:
+            datos, desde_cache, registro = ejecutar_reporte(db.session, tipo, filtro)
+        db.session.commit()
+        return jsonify({'success': True, 'id': registro.id, 'cache': desde_cache, 'reporte': datos})
+    except ErrorReporte as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/reportes/guardados', methods=['GET'])
+def list_reportes_guardados():
+    guardados = (ReporteGuardado.query.filter(ReporteGuardado.nombre.isnot(None))
+                 .order_by(ReporteGuardado.creado_en.desc()).all())
+    return jsonify({'success': True, 'reportes': [{
+        'id': r.id,
+        'nombre': r.nombre,
+        'tipo_reporte': r.tipo_reporte,
+        'filtro': r.filtro,
+        'creado_en': r.creado_en.isoformat() if r.creado_en else None,
+        'creado_por': r.creado_por
+    } for r in guardados]})
+
+
+@app.route('/api/reportes/guardados/<int:rid>', methods=['GET'])
+def get_reporte_guardado(rid):
+    """Ejecuta un reporte guardado (desde el cache si sigue vigente)."""
+    try:
+        r = ReporteGuardado.query.get(rid)
+        if not r or r.nombre is None:
+            return jsonify({'success': False, 'message': 'Reporte no encontrado'}), 404
+        datos, desde_cache, _ = ejecutar_reporte(db.session, r.tipo_reporte, r.filtro)
+        db.session.commit()
+        return jsonify({'success': True, 'id': r.id, 'nombre': r.nombre, 'cache': desde_cache, 'reporte': datos})
+    except ErrorReporte as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# -------------------------
+# Listas paginadas (listados.py)
+# -------------------------
+
+def responder_lista(nombre):
+    """
+    Página de un recurso: {'success', nombre: [...], 'siguiente_cursor'}
+    (None en la última página; la siguiente se pide con ?cursor=). ?limit=
+    acota la página a LISTA_LIMITE_MAX. Filtros, desde/hasta y fields= según
+    LISTADOS.
+    """
+    try:
+        items, siguiente = listar(nombre, request.args)
+    except ErrorListado as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, nombre: items, 'siguiente_cursor': siguiente})
+
+@app.route('/api/export/<recurso>', methods=['GET'])
+def exportar_recurso(recurso):
+    """
+    Exporta un recurso completo en NDJSON (por defecto) o CSV (?formato=csv),
+    transmitido por lotes. Acepta los mismos filtros, desde/hasta y fields=
+    que la lista del recurso.
+    """
+    try:
+        trozos, mimetype, archivo = exportar(recurso, request.args)
+    except ErrorListado as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return Response(stream_with_context(trozos), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={archivo}',
+                             'X-Accel-Buffering': 'no'})
+
 # -------------------------
 # CRUD Cotizaciones
 # -------------------------
@@ -421,16 +801,7 @@ def health_check():
 @app.route('/api/cotizaciones', methods=['GET'])
 def list_cotizaciones():
     try:
-        cotizaciones = Cotizacion.query.order_by(Cotizacion.fecha_emitida.desc()).all()
-        data = [{
-            'id': c.id,
-            'nombre_cliente': c.nombre_cliente,
-            'producto': c.producto,
-            'color': c.color,
-            'cantidad': float(c.cantidad) if c.cantidad is not None else None,
-            'estado': c.estado,
-        } for c in cotizaciones]
-        return jsonify({'success': True, 'cotizaciones': data})
+        return responder_lista('cotizaciones')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -440,29 +811,9 @@ def get_cotizacion(cid):
     c = Cotizacion.query.get(cid)
     if not c:
         return jsonify({'success': False, 'message': 'Cotización no encontrada'}), 404
-    
-    # Se crea el diccionario base con los datos principales
-    data = {
-        'id': c.id,
-        'cliente_id': c.cliente_id,
-        'nombre_cliente': c.nombre_cliente,
-        'producto': c.producto,
-        'color': c.color,
-        'fecha_emitida': c.fecha_emitida.isoformat() if c.fecha_emitida else None,
-        'fecha_expiracion': c.fecha_expiracion.isoformat() if c.fecha_expiracion else None,
-        'precio_unitario': float(c.precio_unitario) if c.precio_unitario is not None else None,
-        'cantidad': float(c.cantidad) if c.cantidad is not None else None,
-        'estado': c.estado,
-        'usuario_id': c.usuario_id
-    }
 
-    # --- CAMBIO CLAVE ---
-    # Si existen datos en la columna 'detalles', se añaden a la respuesta.
-    # Esto "fusiona" los detalles (calaminas, cumbreras, etc.) con los datos principales.
-    if c.detalles:
-        data.update(c.detalles)
-
-    return jsonify({'success': True, 'cotizacion': data})
+    # Datos principales + detalles (calaminas, cumbreras, etc.) fusionados
+    return jsonify({'success': True, 'cotizacion': serializar(c)})
 
 # === RUTA MODIFICADA ===
 @app.route('/api/cotizaciones', methods=['POST'])
@@ -552,42 +903,18 @@ def delete_cotizacion(cid):
 @app.route('/api/pedidos', methods=['GET'])
 def list_pedidos():
     try:
-        pedidos = Pedido.query.order_by(Pedido.fecha_pedido.desc()).all()
-        data = []
-        for p in pedidos:
-            detalles = PedidoDetalle.query.filter_by(pedido_id=p.id).all()
-            detalles_list = [{'id': d.id, 'producto_id': d.producto_id, 'cantidad': int(d.cantidad), 'subtotal': float(d.subtotal)} for d in detalles]
-            data.append({
-                'id': p.id,
-                'cliente_id': p.cliente_id,
-                'fecha_pedido': p.fecha_pedido.isoformat() if p.fecha_pedido else None,
-                'estado': p.estado,
-                'prioridad': p.prioridad,
-                'total': float(p.total) if p.total else 0,
-                'vehiculo_id': p.vehiculo_id,  # 🔥 VEHÍCULO ASIGNADO
-                'detalles': detalles_list
-            })
-        return jsonify({'success': True, 'pedidos': data})
+        # detalles de todos los pedidos en una sola consulta (selectinload)
+        return responder_lista('pedidos')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
 @app.route('/api/pedidos/<int:pid>', methods=['GET'])
 def get_pedido(pid):
-    p = Pedido.query.get(pid)
+    p = obtener(Pedido, pid)
     if not p:
         return jsonify({'success': False, 'message': 'Pedido no encontrado'}), 404
-    detalles = PedidoDetalle.query.filter_by(pedido_id=p.id).all()
-    detalles_list = [{'id': d.id, 'producto_id': d.producto_id, 'cantidad': int(d.cantidad), 'subtotal': float(d.subtotal)} for d in detalles]
-    return jsonify({'success': True, 'pedido': {
-        'id': p.id,
-        'cliente_id': p.cliente_id,
-        'fecha_pedido': p.fecha_pedido.isoformat() if p.fecha_pedido else None,
-        'estado': p.estado,
-        'prioridad': p.prioridad,
-        'total': float(p.total) if p.total is not None else None,
-        'detalles': detalles_list
-    }})
+    return jsonify({'success': True, 'pedido': serializar(p)})
 
 @app.route('/api/pedidos', methods=['POST'])
 def create_pedido():
@@ -598,7 +925,9 @@ def create_pedido():
             cliente_id=payload.get('cliente_id'),
             estado=payload.get('estado', 'pendiente'),
             prioridad=payload.get('prioridad', 'normal'),
-            total=payload.get('total') or 0
+            total=payload.get('total') or 0,
+            lat=payload.get('lat'),
+            lon=payload.get('lon')
         )
         db.session.add(p)
         db.session.flush()  # obtener id
@@ -627,7 +956,7 @@ def update_pedido(pid):
             return jsonify({'success': False, 'message': 'Pedido no encontrado'}), 404
         payload = request.get_json()
         # campos simples
-        for field in ['cliente_id','estado','prioridad','total','vehiculo_id']:
+        for field in ['cliente_id','estado','prioridad','total','vehiculo_id','lat','lon']:
             if field in payload:
                 setattr(p, field, payload.get(field))
         # detalles
@@ -673,9 +1002,7 @@ def delete_pedido(pid):
 @app.route('/api/proveedores', methods=['GET'])
 def list_proveedores():
     try:
-        provs = Proveedor.query.order_by(Proveedor.nombre).all()
-        data = [{'id': p.id, 'nombre': p.nombre, 'contacto': p.contacto, 'telefono': p.telefono, 'direccion': p.direccion, 'datos_extra': p.datos_extra} for p in provs]
-        return jsonify({'success': True, 'proveedores': data})
+        return responder_lista('proveedores')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -685,7 +1012,7 @@ def get_proveedor(pid):
     p = Proveedor.query.get(pid)
     if not p:
         return jsonify({'success': False, 'message': 'Proveedor no encontrado'}), 404
-    return jsonify({'success': True, 'proveedor': {'id': p.id, 'nombre': p.nombre, 'contacto': p.contacto, 'telefono': p.telefono, 'direccion': p.direccion, 'datos_extra': p.datos_extra}})
+    return jsonify({'success': True, 'proveedor': serializar(p)})
 
 
 @app.route('/api/proveedores', methods=['POST'])
@@ -744,23 +1071,17 @@ def delete_proveedor(pid):
 @app.route('/api/ordenes-compra', methods=['GET'])
 def list_ordenes_compra():
     try:
-        ordenes = OrdenCompra.query.order_by(OrdenCompra.fecha.desc()).all()
-        data = []
-        for o in ordenes:
-            detalles = [{'id': d.id, 'producto_id': d.producto_id, 'cantidad': float(d.cantidad), 'precio_unitario': float(d.precio_unitario), 'subtotal': float(d.subtotal)} for d in o.detalles]
-            data.append({'id': o.id, 'proveedor_id': o.proveedor_id, 'referencia': o.referencia, 'fecha': o.fecha.isoformat() if o.fecha else None, 'estado': o.estado, 'total': float(o.total), 'detalles': detalles})
-        return jsonify({'success': True, 'ordenes': data})
+        return responder_lista('ordenes')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
 @app.route('/api/ordenes-compra/<int:oid>', methods=['GET'])
 def get_orden_compra(oid):
-    o = OrdenCompra.query.get(oid)
+    o = obtener(OrdenCompra, oid)
     if not o:
         return jsonify({'success': False, 'message': 'Orden no encontrada'}), 404
-    detalles = [{'id': d.id, 'producto_id': d.producto_id, 'cantidad': float(d.cantidad), 'precio_unitario': float(d.precio_unitario), 'subtotal': float(d.subtotal)} for d in o.detalles]
-    return jsonify({'success': True, 'orden': {'id': o.id, 'proveedor_id': o.proveedor_id, 'referencia': o.referencia, 'fecha': o.fecha.isoformat() if o.fecha else None, 'estado': o.estado, 'total': float(o.total), 'detalles': detalles}})
+    return jsonify({'success': True, 'orden': serializar(o)})
 
 
 @app.route('/api/ordenes-compra', methods=['POST'])
@@ -842,9 +1163,7 @@ def delete_orden_compra(oid):
 @app.route('/api/cuentas-pagar', methods=['GET'])
 def list_cuentas_pagar():
     try:
-        cuentas = CuentaPagar.query.order_by(CuentaPagar.fecha_emision.desc()).all()
-        data = [{'id': c.id, 'proveedor_id': c.proveedor_id, 'referencia': c.referencia, 'monto_total': float(c.monto_total), 'monto_pagado': float(c.monto_pagado), 'fecha_emision': c.fecha_emision.isoformat() if c.fecha_emision else None, 'fecha_vencimiento': c.fecha_vencimiento.isoformat() if c.fecha_vencimiento else None, 'estado': c.estado, 'descripcion': c.descripcion} for c in cuentas]
-        return jsonify({'success': True, 'cuentas_pagar': data})
+        return responder_lista('cuentas_pagar')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -854,7 +1173,7 @@ def get_cuenta_pagar(cid):
     c = CuentaPagar.query.get(cid)
     if not c:
         return jsonify({'success': False, 'message': 'Cuenta no encontrada'}), 404
-    return jsonify({'success': True, 'cuenta': {'id': c.id, 'proveedor_id': c.proveedor_id, 'referencia': c.referencia, 'monto_total': float(c.monto_total), 'monto_pagado': float(c.monto_pagado), 'fecha_emision': c.fecha_emision.isoformat() if c.fecha_emision else None, 'fecha_vencimiento': c.fecha_vencimiento.isoformat() if c.fecha_vencimiento else None, 'estado': c.estado, 'descripcion': c.descripcion}})
+    return jsonify({'success': True, 'cuenta': serializar(c)})
 
 
 @app.route('/api/cuentas-pagar', methods=['POST'])
@@ -913,9 +1232,7 @@ def delete_cuenta_pagar(cid):
 @app.route('/api/movimientos-pago', methods=['GET'])
 def list_movimientos_pago():
     try:
-        movs = MovimientoPago.query.order_by(MovimientoPago.fecha_pago.desc()).all()
-        data = [{'id': m.id, 'cuenta_pagar_id': m.cuenta_pagar_id, 'cuenta_cobrar_id': m.cuenta_cobrar_id, 'monto': float(m.monto), 'fecha_pago': m.fecha_pago.isoformat() if m.fecha_pago else None, 'metodo_pago_id': m.metodo_pago_id, 'referencia_pago': m.referencia_pago, 'nota': m.nota} for m in movs]
-        return jsonify({'success': True, 'movimientos': data})
+        return responder_lista('movimientos')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -966,9 +1283,7 @@ def create_movimiento_pago():
 @app.route('/api/inventario', methods=['GET'])
 def list_inventario():
     try:
-        items = InventarioSucursal.query.order_by(InventarioSucursal.id).all()
-        data = [{'id': i.id, 'producto_id': i.producto_id, 'sucursal_id': i.sucursal_id, 'cantidad': float(i.cantidad), 'estado': i.estado, 'ultimo_movimiento': i.ultimo_movimiento.isoformat() if i.ultimo_movimiento else None} for i in items]
-        return jsonify({'success': True, 'inventario': data})
+        return responder_lista('inventario')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -978,7 +1293,7 @@ def get_inventario(iid):
     i = InventarioSucursal.query.get(iid)
     if not i:
         return jsonify({'success': False, 'message': 'Registro inventario no encontrado'}), 404
-    return jsonify({'success': True, 'inventario': {'id': i.id, 'producto_id': i.producto_id, 'sucursal_id': i.sucursal_id, 'cantidad': float(i.cantidad), 'estado': i.estado, 'ultimo_movimiento': i.ultimo_movimiento.isoformat() if i.ultimo_movimiento else None}})
+    return jsonify({'success': True, 'inventario': serializar(i)})
 
 
 @app.route('/api/inventario', methods=['POST'])
@@ -1042,18 +1357,7 @@ def delete_inventario(iid):
 @app.route('/api/productos', methods=['GET'])
 def list_productos():
     try:
-        from models import Producto
-        productos = Producto.query.order_by(Producto.nombre).all()
-        data = [{
-            'id': p.id,
-            'nombre': p.nombre,
-            'descripcion': p.descripcion,
-            'categoria': p.categoria,
-            'precio': float(p.precio) if p.precio else 0,
-            'stock': p.stock,
-            'activo': p.activo
-        } for p in productos]
-        return jsonify({'success': True, 'productos': data})
+        return responder_lista('productos')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -1063,18 +1367,7 @@ def get_producto(pid):
     p = Producto.query.get(pid)
     if not p:
         return jsonify({'success': False, 'message': 'Producto no encontrado'}), 404
-    return jsonify({
-        'success': True,
-        'producto': {
-            'id': p.id,
-            'nombre': p.nombre,
-            'descripcion': p.descripcion,
-            'categoria': p.categoria,
-            'precio': float(p.precio) if p.precio else 0,
-            'stock': p.stock,
-            'activo': p.activo
-        }
-    })
+    return jsonify({'success': True, 'producto': serializar(p)})
 
 @app.route('/api/productos', methods=['POST'])
 def create_producto():
@@ -1133,16 +1426,7 @@ def delete_producto(pid):
 @app.route('/api/vehiculos', methods=['GET'])
 def list_vehiculos():
     try:
-        from models import Vehiculo
-        vehiculos = Vehiculo.query.order_by(Vehiculo.placa).all()
-        data = [{
-            'id': v.id,
-            'placa': v.placa,
-            'marca': v.marca,
-            'modelo': v.modelo,
-            'capacidad': v.capacidad
-        } for v in vehiculos]
-        return jsonify({'success': True, 'vehiculos': data})
+        return responder_lista('vehiculos')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -1152,16 +1436,7 @@ def get_vehiculo(vid):
     v = Vehiculo.query.get(vid)
     if not v:
         return jsonify({'success': False, 'message': 'Vehículo no encontrado'}), 404
-    return jsonify({
-        'success': True,
-        'vehiculo': {
-            'id': v.id,
-            'placa': v.placa,
-            'marca': v.marca,
-            'modelo': v.modelo,
-            'capacidad': v.capacidad
-        }
-    })
+    return jsonify({'success': True, 'vehiculo': serializar(v)})
 
 @app.route('/api/vehiculos', methods=['POST'])
 def create_vehiculo():
@@ -1219,40 +1494,17 @@ def delete_vehiculo(vid):
 @app.route('/api/clientes', methods=['GET'])
 def list_clientes():
     try:
-        from models import Cliente, User
-        clientes = Cliente.query.join(User).all()
-        data = [{
-            'id': c.id,
-            'usuario_id': c.usuario_id,
-            'nombre': User.query.get(c.usuario_id).nombre if c.usuario_id else '',
-            'email': User.query.get(c.usuario_id).email if c.usuario_id else '',
-            'direccion': c.direccion,
-            'telefono': c.telefono,
-            'nit': c.nit
-        } for c in clientes]
-        return jsonify({'success': True, 'clientes': data})
+        return responder_lista('clientes')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/api/clientes/<int:cid>', methods=['GET'])
 def get_cliente(cid):
-    from models import Cliente, User
-    c = Cliente.query.get(cid)
+    from models import Cliente
+    c = obtener(Cliente, cid)
     if not c:
         return jsonify({'success': False, 'message': 'Cliente no encontrado'}), 404
-    usuario = User.query.get(c.usuario_id) if c.usuario_id else None
-    return jsonify({
-        'success': True,
-        'cliente': {
-            'id': c.id,
-            'usuario_id': c.usuario_id,
-            'nombre': usuario.nombre if usuario else '',
-            'email': usuario.email if usuario else '',
-            'direccion': c.direccion,
-            'telefono': c.telefono,
-            'nit': c.nit
-        }
-    })
+    return jsonify({'success': True, 'cliente': serializar(c)})
 
 @app.route('/api/clientes', methods=['POST'])
 def create_cliente():
@@ -1340,6 +1592,54 @@ def delete_cliente(cid):
 # ENDPOINTS DE ML Y RUTAS OPTIMIZADO PARA MÚLTIPLES PUNTOS
 # =========================
 
+def calcular_ruta(motor, waypoint_points, dia, data):
+    """Matriz, tour y geometría de una ruta (lo que se guarda en CACHE_RUTAS)."""
+    # Matriz de distancias entre todos los puntos: los pares ya guardados se
+    # leen del almacén y para el resto un Dijkstra uno-a-muchos por origen;
+    # los tramos del tour se reconstruyen desde sus predecesores
+    matriz = route_matrix(motor, waypoint_points, dia=dia, pares=PARES_DISTANCIA)
+
+    # El primer punto es el origen/depósito
+    # Si solo hay 2 puntos, ruta directa de ida y vuelta
+    if len(waypoint_points) == 2:
+        optimal_tour = [0, 1, 0]
+    else:
+        # Para 3 o más puntos: exacto (Held-Karp) si n <= 12; si no,
+        # vecino más cercano mejorado con 2-opt / Or-opt
+        budget_s = presupuesto_s(data.get('tsp_time_budget_s'), TSP_TIME_BUDGET_S, TSP_TIME_BUDGET_MAX_S)
+        optimal_tour, _ = solve_tsp(matriz.distancia, depot=0, time_budget_s=budget_s)
+
+    # Construir la ruta completa conectando los segmentos (sin nuevas búsquedas)
+    route_coords = []
+    total_distance = 0
+    total_time = 0
+
+    for i in range(len(optimal_tour) - 1):
+        start_idx = optimal_tour[i]
+        end_idx = optimal_tour[i + 1]
+
+        segment_coords = matriz.coordenadas(start_idx, end_idx)
+        if segment_coords is None:
+            raise ValueError(f'No existe ruta entre los puntos {start_idx + 1} y {end_idx + 1}')
+
+        # Para evitar duplicar puntos, omitir el primero en segmentos subsiguientes
+        if route_coords:
+            route_coords.extend(segment_coords[1:])
+        else:
+            route_coords.extend(segment_coords)
+
+        total_distance += float(matriz.distancia[start_idx, end_idx])
+        total_time += float(matriz.tiempo[start_idx, end_idx])
+
+    return {
+        'tour': [int(k) for k in optimal_tour],
+        'coordinates': route_coords,
+        'distance_meters': total_distance,
+        'base_time_sec': total_time,
+        # features del camino elegido (mismas que en el entrenamiento)
+        'features': matriz.caracteristicas(zip(optimal_tour[:-1], optimal_tour[1:])),
+    }
+
 @app.route('/api/find-route', methods=['POST'])
 def find_route():
     """Endpoint para encontrar la mejor ruta entre múltiples puntos (TSP)."""
@@ -1355,104 +1655,40 @@ def find_route():
                 'message': 'Se requieren al menos 2 puntos de ruta'
             }), 400
 
-        # Usar grafo cacheado
-        G = init_graph()
+        # Usar el motor CSR cacheado (snapshot mmap); el día de la ruta decide
+        # qué calles están cerradas (ferias)
+        fecha = fecha_de_ruta(data)
+        if fecha is None:
+            return jsonify({'success': False, 'message': FECHA_INVALIDA}), 400
+        motor = init_motor()
+        dia = fecha.weekday()
+
+        # Ajustar todos los waypoints al punto proyectado sobre la calle más
+        # cercana (nodos virtuales, sin copiar el grafo) en una sola consulta
+        waypoint_points, snap_dist = init_indice().snap(waypoints)
+        max_snap_m = float(data.get('max_snap_m', MAX_SNAP_M))
+        lejanos = [i + 1 for i, d in enumerate(snap_dist) if d > max_snap_m]
+        if lejanos:
+            return jsonify({
+                'success': False,
+                'message': f'Puntos fuera de la red vial (a más de {max_snap_m:.0f} m): {lejanos}',
+                'snap_distances_m': [round(float(d), 1) for d in snap_dist]
+            }), 400
 
-        # Encontrar nodos más cercanos para todos los waypoints
-        waypoint_nodes = []
-        for waypoint in waypoints:
-            node = ox.nearest_nodes(G, waypoint[1], waypoint[0])
-            waypoint_nodes.append(node)
-
-        # El primer punto es el origen/depósito
-        depot_node = waypoint_nodes[0]
-        
-        # Si solo hay 2 puntos, calcular ruta directa
-        if len(waypoint_nodes) == 2:
-            path, total_distance, total_time = shortest_route_stats(G, waypoint_nodes[0], waypoint_nodes[1])
-            # Para volver al punto inicial en caso de 2 puntos
-            return_path, return_distance, return_time = shortest_route_stats(G, waypoint_nodes[1], waypoint_nodes[0])
-            
-            # Combinar rutas (ida y vuelta)
-            full_path = path + return_path[1:]  # Evitar duplicar el nodo final
-            total_distance += return_distance
-            total_time += return_time
-            
-        else:
-            # Para 3 o más puntos, resolver TSP
-            # Calcular matriz de distancias entre todos los puntos
-            distance_matrix = []
-            for i in range(len(waypoint_nodes)):
-                row = []
-                for j in range(len(waypoint_nodes)):
-                    if i == j:
-                        row.append(0)
-                    else:
-                        try:
-                            _, dist, _ = shortest_route_stats(G, waypoint_nodes[i], waypoint_nodes[j])
-                            row.append(dist)
-                        except:
-                            # Si no hay ruta, usar una distancia grande
-                            row.append(float('inf'))
-                distance_matrix.append(row)
-
-            # Resolver TSP (algoritmo simple - nearest neighbor)
-            def solve_tsp_nearest_neighbor(distance_matrix, depot=0):
-                n = len(distance_matrix)
-                unvisited = set(range(n))
-                unvisited.remove(depot)
-                tour = [depot]
-                current = depot
-                total_distance = 0
-
-                while unvisited:
-                    next_node = min(unvisited, key=lambda x: distance_matrix[current][x])
-                    total_distance += distance_matrix[current][next_node]
-                    tour.append(next_node)
-                    unvisited.remove(next_node)
-                    current = next_node
-
-                # Volver al depósito
-                total_distance += distance_matrix[current][depot]
-                tour.append(depot)
-                
-                return tour, total_distance
-
-            # Obtener tour óptimo
-            optimal_tour, total_distance = solve_tsp_nearest_neighbor(distance_matrix)
-
-            # Construir la ruta completa conectando los segmentos
-            full_path = []
-            total_time = 0
-            
-            for i in range(len(optimal_tour) - 1):
-                start_idx = optimal_tour[i]
-                end_idx = optimal_tour[i + 1]
-                
-                segment_path, segment_dist, segment_time = shortest_route_stats(
-                    G, waypoint_nodes[start_idx], waypoint_nodes[end_idx]
-                )
-                
-                # Para evitar duplicar nodos, omitir el primero en segmentos subsiguientes
-                if full_path:
-                    full_path.extend(segment_path[1:])
-                else:
-                    full_path.extend(segment_path)
-                
-                total_time += segment_time
-
-        # Extraer coordenadas de la ruta completa
-        route_coords = []
-        for node in full_path:
-            route_coords.append([float(G.nodes[node]['y']), float(G.nodes[node]['x'])])
-
-        # Predecir tiempo total con ML
-        is_thursday = datetime.datetime.now().weekday() == 3
-        pred_time = predict_route_time_ml({
-            'dist_m': total_distance,
-            'base_time_sec': total_time,
-            'is_thursday': int(is_thursday)
-        })
+        # Rutas repetidas (mismo depósito y clientes habituales): cache por
+        # versión del grafo, cierres del día y puntos ajustados
+        clave = clave_ruta(motor.version, motor.modo(dia), waypoint_points)
+        ruta, nivel_cache = CACHE_RUTAS.obtener(clave)
+        if ruta is None:
+            ruta = calcular_ruta(motor, waypoint_points, dia, data)
+            CACHE_RUTAS.guardar(clave, ruta)
+        route_coords = ruta['coordinates']
+        total_distance = ruta['distance_meters']
+        total_time = ruta['base_time_sec']
+
+        # Predecir tiempo total con ML (fuera del cache: el modelo vigente puede cambiar)
+        features = dict(ruta['features'], dist_m=total_distance, base_time_sec=total_time, is_thursday=int(dia == 3))
+        pred_time = predict_route_time_ml(features)
 
         end_time = datetime.datetime.now()
         processing_time = (end_time - start_time).total_seconds() * 1000
@@ -1463,7 +1699,10 @@ def find_route():
                 'coordinates': route_coords,
                 'distance_meters': round(total_distance, 2),
                 'base_time_sec': round(total_time, 2),
-                'predicted_time_min': round(pred_time['predicted_time_min'], 2)
+                'predicted_time_min': round(pred_time['predicted_time_min'], 2),
+                'snap_distances_m': [round(float(d), 1) for d in snap_dist],
+                'feria_restrictions': bool(motor.modo(dia)),
+                'cached': nivel_cache is not None
             },
             'processing_time_ms': round(processing_time, 2)
         })
@@ -1477,6 +1716,135 @@ def find_route():
             'message': f'Error al calcular ruta: {str(e)}'
         }), 500
 
+@app.route('/api/plan-fleet', methods=['POST'])
+def plan_fleet():
+    """
+    Reparte los pedidos pendientes de un día entre los vehículos disponibles
+    (CVRP: ahorros + búsqueda local sobre una sola matriz de distancias) y
+    guarda una Ruta por conductor con sus RutaDetalle en bloque. Los pedidos
+    planificados pasan a estado 'asignado'.
+    """
+    start_time = datetime.datetime.now()
+    try:
+        from models import Vehiculo, Conductor, Ruta, RutaDetalle
+        data = request.get_json() or {}
+
+        fecha = fecha_de_ruta(data)
+        if fecha is None:
+            return jsonify({'success': False, 'message': FECHA_INVALIDA}), 400
+        fecha = fecha.date()
+        limite = datetime.datetime.combine(fecha + datetime.timedelta(days=1), datetime.time.min)
+        deposito = data.get('deposito') or ([float(os.getenv('DEPOSITO_LAT')), float(os.getenv('DEPOSITO_LON'))]
+                                            if os.getenv('DEPOSITO_LAT') and os.getenv('DEPOSITO_LON') else None)
+        if not deposito:
+            return jsonify({'success': False, 'message': 'Se requiere el punto de depósito [lat, lon]'}), 400
+
+        # Flota: conductores con vehículo asignado
+        q = db.session.query(Conductor, Vehiculo).join(Vehiculo, Conductor.vehiculo_id == Vehiculo.id)
+        if data.get('conductor_ids'):
+            q = q.filter(Conductor.id.in_(data['conductor_ids']))
+        flota = q.order_by(Conductor.id).all()
+        if not flota:
+            return jsonify({'success': False, 'message': 'No hay conductores con vehículo asignado'}), 400
+
+        # Pedidos pendientes hasta el día indicado y su carga (suma de cantidades).
+        # Los que ya están en alguna ruta no se vuelven a planificar.
+        pedidos = (Pedido.query
+                   .filter(Pedido.estado == 'pendiente', Pedido.fecha_pedido < limite,
+                           ~db.exists().where(RutaDetalle.pedido_id == Pedido.id))
+                   .order_by(Pedido.id).all())
+        ubicaciones = {int(k): v for k, v in (data.get('ubicaciones') or {}).items()}
+        carga = dict(db.session.query(PedidoDetalle.pedido_id, db.func.sum(PedidoDetalle.cantidad))
+                     .filter(PedidoDetalle.pedido_id.in_([p.id for p in pedidos]))
+                     .group_by(PedidoDetalle.pedido_id).all()) if pedidos else {}
+
+        sin_asignar = []
+        paradas = []
+        for p in pedidos:
+            ubic = ubicaciones.get(p.id) or ([float(p.lat), float(p.lon)] if p.lat is not None and p.lon is not None else None)
+            if ubic is None:
+                sin_asignar.append({'pedido_id': p.id, 'motivo': 'sin ubicación'})
+            else:
+                paradas.append((p, ubic))
+        if not paradas:
+            return jsonify({'success': True, 'rutas': [], 'sin_asignar': sin_asignar})
+
+        motor = init_motor()
+        puntos, snap_dist = init_indice().snap([deposito] + [u for _, u in paradas])
+        max_snap_m = float(data.get('max_snap_m', MAX_SNAP_M))
+        if snap_dist[0] > max_snap_m:
+            return jsonify({'success': False, 'message': f'El depósito está fuera de la red vial (a {snap_dist[0]:.0f} m)'}), 400
+        lejanos = {i for i in range(1, len(puntos)) if snap_dist[i] > max_snap_m}
+        for i in sorted(lejanos):
+            sin_asignar.append({'pedido_id': paradas[i - 1][0].id, 'motivo': 'fuera de la red vial'})
+        validos = [0] + [i for i in range(1, len(puntos)) if i not in lejanos]
+        puntos = [puntos[i] for i in validos]
+        paradas = [paradas[i - 1] for i in validos[1:]]
+
+        # solo costos: el reparto no devuelve la geometría de los tramos
+        matriz = route_matrix(motor, puntos, dia=fecha.weekday(), pares=PARES_DISTANCIA, caminos=False)
+        demandas = [0] + [float(carga.get(p.id) or 0) for p, _ in paradas]
+        prioridades = [0] + [PRIORIDADES_PEDIDO.get(p.prioridad, 1) for p, _ in paradas]
+        capacidades = [v.capacidad for _, v in flota]
+        budget_s = presupuesto_s(data.get('time_budget_s'), VRP_TIME_BUDGET_S, VRP_TIME_BUDGET_MAX_S)
+        rutas, fuera = solve_cvrp(matriz.distancia, demandas, capacidades, prioridades, depot=0, time_budget_s=budget_s)
+        for i in fuera:
+            sin_asignar.append({'pedido_id': paradas[i - 1][0].id, 'motivo': 'sin capacidad'})
+
+        # Resumen por vehículo (índices de la matriz -> pedidos)
+        resultado = []
+        for (conductor, vehiculo), ruta in zip(flota, rutas):
+            if not ruta:
+                continue
+            tour = [0] + ruta + [0]
+            resultado.append({
+                'conductor_id': conductor.id,
+                'vehiculo_id': vehiculo.id,
+                'placa': vehiculo.placa,
+                'capacidad': vehiculo.capacidad,
+                'carga': sum(demandas[i] for i in ruta),
+                'pedidos': [paradas[i - 1][0].id for i in ruta],
+                'paradas': [deposito] + [paradas[i - 1][1] for i in ruta] + [deposito],
+                'distance_meters': round(float(sum(matriz.distancia[a, b] for a, b in zip(tour, tour[1:]))), 2),
+                'base_time_sec': round(float(sum(matriz.tiempo[a, b] for a, b in zip(tour, tour[1:]))), 2)
+            })
+
+        # Guardar Ruta / RutaDetalle en bloque (una inserción por tabla)
+        if data.get('guardar', True) and resultado:
+            fecha_programada = datetime.datetime.combine(fecha, datetime.time.min)
+            nuevas = [Ruta(conductor_id=r['conductor_id'], fecha_programada=fecha_programada, estado='pendiente') for r in resultado]
+            db.session.add_all(nuevas)
+            db.session.flush()  # obtener ids
+            detalles = []
+            asignaciones = []
+            for ruta, r in zip(nuevas, resultado):
+                r['ruta_id'] = ruta.id
+                pedidos_tour = [None] + r['pedidos'] + [None]
+                for orden, ((lat, lon), pid) in enumerate(zip(r['paradas'], pedidos_tour)):
+                    detalles.append({'ruta_id': ruta.id, 'pedido_id': pid, 'lat': lat, 'lon': lon, 'orden': orden})
+                asignaciones.extend({'id': pid, 'vehiculo_id': r['vehiculo_id'], 'estado': 'asignado'} for pid in r['pedidos'])
+            db.session.bulk_insert_mappings(RutaDetalle, detalles)
+            db.session.bulk_update_mappings(Pedido, asignaciones)
+            # el bloque no pasa por el flush: resumen con pedidos y distancia planificada
+            registrar_rutas(db.session, {r['ruta_id']: r['distance_meters'] for r in resultado})
+            db.session.commit()
+
+        processing_time = (datetime.datetime.now() - start_time).total_seconds() * 1000
+        return jsonify({
+            'success': True,
+            'fecha': fecha.isoformat(),
+            'rutas': resultado,
+            'sin_asignar': sin_asignar,
+            'distance_meters': round(sum(r['distance_meters'] for r in resultado), 2),
+            'processing_time_ms': round(processing_time, 2)
+        })
+    except Exception as e:
+        db.session.rollback()
+        import traceback
+        print(f"Error: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({'success': False, 'message': f'Error al planificar flota: {str(e)}'}), 500
+
 # =========================
 # INICIO DE LA APP
 # =========================
@@ -0,0 +1,89 @@
+"""
+exportaciones.py
+
+- Exportación de tablas completas en NDJSON o CSV sin armar la lista en
+  memoria: la consulta corre con yield_per (cursor del lado del servidor) y
+  cada lote se serializa y se entrega como un trozo de la respuesta.
+- Usa los mismos filtros, orden y fields= que los listados (listados.py) y
+  los mismos serializadores que los endpoints (serializadores.py).
+"""
+
+import io
+import os
+import csv
+import json
+from itertools import islice
+
+from listados import LISTADOS, consulta_filtrada, ErrorListado
+from serializadores import serializar, campos_disponibles
+
+EXPORT_LOTE = int(os.getenv("EXPORT_LOTE", 1000))
+
+# Recursos exportables (nombre de la URL -> recurso de LISTADOS)
+EXPORTABLES = {
+    "movimientos-pago": "movimientos",
+    "inventario": "inventario",
+    "nota-venta": "notas_venta",
+    "pedidos": "pedidos",
+    "cuentas-pagar": "cuentas_pagar",
+    "ordenes-compra": "ordenes",
+}
+
+FORMATOS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _lotes(q):
+    """Objetos de la consulta en lotes de EXPORT_LOTE, leídos con yield_per."""
+    filas = iter(q.yield_per(EXPORT_LOTE))
+    while True:
+        lote = list(islice(filas, EXPORT_LOTE))
+        if not lote:
+            return
+        yield lote
+
+
+def _ndjson(q, campos):
+    for lote in _lotes(q):
+        yield "".join(json.dumps(serializar(o, campos), ensure_ascii=False, default=str) + "\n"
+                      for o in lote)
+
+
+def _csv(q, campos, columnas):
+    buf = io.StringIO()
+    escritor = csv.writer(buf)
+    escritor.writerow(columnas)
+    for lote in _lotes(q):
+        for o in lote:
+            fila = serializar(o, campos)
+            # hijos y JSON (detalles, datos_extra) van como texto JSON en su celda
+            escritor.writerow([json.dumps(v, ensure_ascii=False, default=str) if isinstance(v, (list, dict)) else v
+                               for v in (fila.get(c) for c in columnas)])
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def exportar(recurso, args):
+    """
+    (generador de trozos, mimetype, nombre de archivo) de un recurso. Valida
+    los parámetros antes de empezar a transmitir (ErrorListado -> 400).
+    """
+    if recurso not in EXPORTABLES:
+        raise ErrorListado(f"Recurso no exportable: {recurso}")
+    formato = (args.get("formato") or "ndjson").lower()
+    if formato not in FORMATOS:
+        raise ErrorListado(f"Formato no soportado: {formato} (use {' o '.join(FORMATOS)})")
+    nombre = EXPORTABLES[recurso]
+    q, campos = consulta_filtrada(nombre, args)
+    if formato == "csv":
+        modelo = LISTADOS[nombre]["modelo"]
+        columnas = campos or campos_disponibles(modelo)
+        trozos = _csv(q, campos, columnas)
+    else:
+        trozos = _ndjson(q, campos)
+    return trozos, FORMATOS[formato], f"{recurso}.{formato}"
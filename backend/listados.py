@@ -0,0 +1,189 @@
+"""
+listados.py
+
+- Listas de los endpoints GET con paginación por cursor (keyset) sobre su
+  orden de siempre: la página siguiente se pide con el último (orden, id)
+  visto, así el costo no crece con el historial como con OFFSET.
+- Filtros del lado del servidor: columnas por igualdad (valores separados
+  por coma = IN) y rango de fechas (desde / hasta) sobre la fecha del recurso.
+- fields=a,b,c: proyección; solo se leen esas columnas y los hijos que usan.
+- Toda respuesta es una página (como mucho LISTA_LIMITE_MAX filas, también
+  sin limit): la lista completa se arma siguiendo 'siguiente_cursor'.
+"""
+
+import os
+import json
+import base64
+import datetime
+
+from sqlalchemy import or_, and_, tuple_
+
+import models as m
+from serializadores import consulta, serializar_lista, campos_disponibles, CAMPOS_COTIZACION_LISTA
+
+LISTA_LIMITE_MAX = int(os.getenv("LISTA_LIMITE_MAX", 500))
+
+
+class ErrorListado(ValueError):
+    """Parámetro de lista inválido (se responde 400)."""
+
+
+# -------------------------
+# Recursos listables: modelo, orden, columna de fecha y filtros permitidos
+# -------------------------
+LISTADOS = {
+    "cotizaciones": dict(modelo=m.Cotizacion, orden="fecha_emitida", desc=True, fecha="fecha_emitida",
+                         filtros=("estado", "cliente_id", "usuario_id"), campos=CAMPOS_COTIZACION_LISTA),
+    "pedidos": dict(modelo=m.Pedido, orden="fecha_pedido", desc=True, fecha="fecha_pedido",
+                    filtros=("estado", "prioridad", "cliente_id", "vehiculo_id")),
+    "proveedores": dict(modelo=m.Proveedor, orden="nombre", desc=False),
+    "ordenes": dict(modelo=m.OrdenCompra, orden="fecha", desc=True, fecha="fecha",
+                    filtros=("estado", "proveedor_id")),
+    "cuentas_pagar": dict(modelo=m.CuentaPagar, orden="fecha_emision", desc=True, fecha="fecha_emision",
+                          filtros=("estado", "proveedor_id", "moneda")),
+    "movimientos": dict(modelo=m.MovimientoPago, orden="fecha_pago", desc=True, fecha="fecha_pago",
+                        filtros=("cuenta_pagar_id", "cuenta_cobrar_id", "metodo_pago_id")),
+    "inventario": dict(modelo=m.InventarioSucursal, orden="id", desc=False, fecha="ultimo_movimiento",
+                       filtros=("estado", "producto_id", "sucursal_id")),
+    "productos": dict(modelo=m.Producto, orden="nombre", desc=False, filtros=("categoria", "activo")),
+    "vehiculos": dict(modelo=m.Vehiculo, orden="placa", desc=False),
+    # igual que el join con usuarios de antes: solo clientes con usuario
+    "clientes": dict(modelo=m.Cliente, orden="id", desc=False, filtros=("nit",),
+                     base=lambda q: q.filter(m.Cliente.usuario_id.isnot(None))),
+    "notas_venta": dict(modelo=m.NotaVenta, orden="fecha", desc=True, fecha="fecha",
+                        filtros=("vendedor", "nro_proforma", "producto")),
+}
+
+
+# -------------------------
+# Cursor: base64 de [valor de orden, id] de la última fila entregada
+# -------------------------
+def codificar_cursor(valor, id_):
+    if isinstance(valor, (datetime.datetime, datetime.date)):
+        valor = valor.isoformat()
+    crudo = json.dumps([valor, id_], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor, columna):
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valor, id_ = json.loads(crudo)
+        return convertir(columna, valor), int(id_)
+    except (ValueError, TypeError) as e:
+        raise ErrorListado(f"Cursor inválido: {e}")
+
+
+def convertir(columna, texto):
+    """Texto de la URL (o del cursor) -> valor del tipo de la columna."""
+    if texto is None:
+        return None
+    tipo = columna.type.python_type
+    if tipo is datetime.datetime:
+        return datetime.datetime.fromisoformat(texto)
+    if tipo is bool:
+        if str(texto).lower() not in ("true", "false", "1", "0"):
+            raise ErrorListado(f"Valor booleano inválido para {columna.key}: {texto}")
+        return str(texto).lower() in ("true", "1")
+    return tipo(texto)
+
+
+def fecha_limite(texto, nombre, fin=False):
+    """ISO fecha u hora; una fecha sola como `hasta` incluye todo ese día."""
+    try:
+        if len(texto) == 10:
+            dia = datetime.datetime.fromisoformat(texto)
+            return dia + datetime.timedelta(days=1) if fin else dia
+        return datetime.datetime.fromisoformat(texto)
+    except ValueError:
+        raise ErrorListado(f"Fecha inválida en '{nombre}': {texto}")
+
+
+def _despues_de(columna, id_col, valor, id_, desc):
+    """Filas que van después de (valor, id) con NULLs al final."""
+    if valor is None:
+        return and_(columna.is_(None), id_col < id_ if desc else id_col > id_)
+    if desc:
+        return or_(tuple_(columna, id_col) < tuple_(valor, id_), columna.is_(None))
+    return or_(tuple_(columna, id_col) > tuple_(valor, id_), columna.is_(None))
+
+
+def consulta_filtrada(nombre, args):
+    """
+    Query ordenada de un recurso con fields, filtros y desde/hasta de la URL
+    aplicados. Retorna (query, campos de la proyección o None).
+    """
+    spec = LISTADOS[nombre]
+    modelo = spec["modelo"]
+    columna = getattr(modelo, spec["orden"])
+    id_col = modelo.id
+    desc = spec["desc"]
+
+    campos = spec.get("campos")
+    if args.get("fields"):
+        pedidos = [c.strip() for c in args["fields"].split(",") if c.strip()]
+        desconocidos = [c for c in pedidos if c not in campos_disponibles(modelo)]
+        if desconocidos:
+            raise ErrorListado(f"Campos desconocidos: {', '.join(desconocidos)}")
+        campos = ["id"] + [c for c in pedidos if c != "id"]
+
+    q = consulta(modelo, campos, extra=(spec["orden"],))
+    if spec.get("base"):
+        q = spec["base"](q)
+
+    for filtro in spec.get("filtros", ()):
+        if args.get(filtro) not in (None, ""):
+            col = getattr(modelo, filtro)
+            try:
+                valores = [convertir(col, v.strip()) for v in args[filtro].split(",")]
+            except ValueError as e:
+                raise ErrorListado(f"Filtro '{filtro}' inválido: {e}")
+            q = q.filter(col.in_(valores)) if len(valores) > 1 else q.filter(col == valores[0])
+    if spec.get("fecha"):
+        col = getattr(modelo, spec["fecha"])
+        if args.get("desde"):
+            q = q.filter(col >= fecha_limite(args["desde"], "desde"))
+        if args.get("hasta"):
+            q = q.filter(col < fecha_limite(args["hasta"], "hasta", fin=True))
+
+    if columna is id_col:
+        orden = [id_col.desc() if desc else id_col.asc()]
+    else:
+        orden = [(columna.desc() if desc else columna.asc()).nullslast(),
+                 id_col.desc() if desc else id_col.asc()]
+    return q.order_by(*orden), campos
+
+
+def listar(nombre, args):
+    """
+    Página de un recurso según los parámetros de la URL (limit, cursor,
+    fields, desde, hasta y los filtros del recurso). Sin limit, la página es
+    de LISTA_LIMITE_MAX filas. Retorna (items, cursor siguiente o None).
+    """
+    spec = LISTADOS[nombre]
+    modelo = spec["modelo"]
+    columna = getattr(modelo, spec["orden"])
+    id_col = modelo.id
+    desc = spec["desc"]
+    q, campos = consulta_filtrada(nombre, args)
+
+    try:
+        limite = int(args.get("limit") or LISTA_LIMITE_MAX)
+    except ValueError:
+        raise ErrorListado("limit debe ser un entero")
+    limite = max(1, min(limite, LISTA_LIMITE_MAX))
+    if args.get("cursor"):
+        valor, id_ = decodificar_cursor(args["cursor"], columna)
+        if columna is id_col:
+            q = q.filter(id_col < id_ if desc else id_col > id_)
+        else:
+            q = q.filter(_despues_de(columna, id_col, valor, id_, desc))
+
+    # una fila de más dice si hay otra página
+    filas = q.limit(limite + 1).all()
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        ultima = filas[-1]
+        siguiente = codificar_cursor(getattr(ultima, spec["orden"]), ultima.id)
+    return serializar_lista(filas, campos), siguiente
@@ -0,0 +1,40 @@
+"""Ubicación y vehículo en pedidos, pedido en ruta_detalles
+
+Revision ID: 4c1d2a7e9b30
+Revises: 93e28bf0629d
+Create Date: 2026-10-17 10:12:31.402211
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1d2a7e9b30'
+down_revision = '93e28bf0629d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pedidos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('vehiculo_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('lat', sa.Numeric(precision=9, scale=6), nullable=True))
+        batch_op.add_column(sa.Column('lon', sa.Numeric(precision=9, scale=6), nullable=True))
+        batch_op.create_foreign_key('fk_pedidos_vehiculo_id', 'vehiculos', ['vehiculo_id'], ['id'])
+
+    with op.batch_alter_table('ruta_detalles', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('pedido_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_ruta_detalles_pedido_id', 'pedidos', ['pedido_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('ruta_detalles', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_ruta_detalles_pedido_id', type_='foreignkey')
+        batch_op.drop_column('pedido_id')
+
+    with op.batch_alter_table('pedidos', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_pedidos_vehiculo_id', type_='foreignkey')
+        batch_op.drop_column('lon')
+        batch_op.drop_column('lat')
+        batch_op.drop_column('vehiculo_id')
@@ -0,0 +1,32 @@
+"""Registro de modelos: versión, formato, esquema y metadatos en modelo_ml
+
+Revision ID: b7e3f91c2d45
+Revises: 4c1d2a7e9b30
+Create Date: 2026-10-17 11:02:47.118530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3f91c2d45'
+down_revision = '4c1d2a7e9b30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('modelo_ml', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.String(length=40), nullable=True))
+        batch_op.add_column(sa.Column('formato', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('esquema', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('metadatos', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('modelo_ml', schema=None) as batch_op:
+        batch_op.drop_column('metadatos')
+        batch_op.drop_column('esquema')
+        batch_op.drop_column('formato')
+        batch_op.drop_column('version')
@@ -0,0 +1,37 @@
+"""Índices (orden, id) para la paginación por cursor de los listados
+
+Revision ID: d5a8c3e1f604
+Revises: b7e3f91c2d45
+Create Date: 2026-10-17 15:40:12.553904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a8c3e1f604'
+down_revision = 'b7e3f91c2d45'
+branch_labels = None
+depends_on = None
+
+INDICES = [
+    ('ix_pedidos_fecha_pedido_id', 'pedidos', ['fecha_pedido', 'id']),
+    ('ix_pedidos_estado', 'pedidos', ['estado']),
+    ('ix_productos_nombre_id', 'productos', ['nombre', 'id']),
+    ('ix_proveedores_nombre_id', 'proveedores', ['nombre', 'id']),
+    ('ix_ordenes_compra_fecha_id', 'ordenes_compra', ['fecha', 'id']),
+    ('ix_cuentas_pagar_fecha_emision_id', 'cuentas_pagar', ['fecha_emision', 'id']),
+    ('ix_movimientos_pago_fecha_pago_id', 'movimientos_pago', ['fecha_pago', 'id']),
+    ('ix_cotizaciones_fecha_emitida_id', 'cotizaciones', ['fecha_emitida', 'id']),
+]
+
+
+def upgrade():
+    for nombre, tabla, columnas in INDICES:
+        op.create_index(nombre, tabla, columnas, unique=False)
+
+
+def downgrade():
+    for nombre, tabla, _ in reversed(INDICES):
+        op.drop_index(nombre, table_name=tabla)
@@ -0,0 +1,63 @@
+"""Resumen de entregas por ruta/día/vehículo para el dashboard
+
+Revision ID: e2b6f7a9c418
+Revises: d5a8c3e1f604
+Create Date: 2026-10-17 17:05:38.210467
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b6f7a9c418'
+down_revision = 'd5a8c3e1f604'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resumen_entregas',
+        sa.Column('ruta_id', sa.Integer(), nullable=False),
+        sa.Column('fecha', sa.Date(), nullable=False),
+        sa.Column('vehiculo_id', sa.Integer(), nullable=True),
+        sa.Column('pedidos', sa.Integer(), nullable=False),
+        sa.Column('entregas', sa.Integer(), nullable=False),
+        sa.Column('retrasadas', sa.Integer(), nullable=False),
+        sa.Column('con_tiempo', sa.Integer(), nullable=False),
+        sa.Column('tiempo_total_min', sa.Integer(), nullable=False),
+        sa.Column('combustible_total', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('distancia_m', sa.Numeric(precision=12, scale=2), nullable=True),
+        sa.ForeignKeyConstraint(['ruta_id'], ['rutas.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['vehiculo_id'], ['vehiculos.id'], ),
+        sa.PrimaryKeyConstraint('ruta_id')
+    )
+    with op.batch_alter_table('resumen_entregas', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_resumen_entregas_fecha'), ['fecha'], unique=False)
+        batch_op.create_index(batch_op.f('ix_resumen_entregas_vehiculo_id'), ['vehiculo_id'], unique=False)
+
+    # carga inicial con el historial existente (después se mantiene en cada flush)
+    op.execute("""
+        INSERT INTO resumen_entregas (ruta_id, fecha, vehiculo_id, pedidos, entregas, retrasadas,
+                                      con_tiempo, tiempo_total_min, combustible_total)
+        SELECT r.id, date(r.fecha_programada), c.vehiculo_id,
+               (SELECT count(*) FROM ruta_detalles d WHERE d.ruta_id = r.id AND d.pedido_id IS NOT NULL),
+               count(m.id),
+               coalesce(sum(CASE WHEN m.retraso THEN 1 ELSE 0 END), 0),
+               count(m.tiempo_entrega),
+               coalesce(sum(m.tiempo_entrega), 0),
+               coalesce(sum(m.combustible_usado), 0)
+        FROM rutas r
+        LEFT JOIN conductores c ON c.id = r.conductor_id
+        LEFT JOIN metricas_entregas m ON m.ruta_id = r.id
+        WHERE r.fecha_programada IS NOT NULL
+        GROUP BY r.id, r.fecha_programada, c.vehiculo_id
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('resumen_entregas', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_resumen_entregas_vehiculo_id'))
+        batch_op.drop_index(batch_op.f('ix_resumen_entregas_fecha'))
+
+    op.drop_table('resumen_entregas')
@@ -0,0 +1,46 @@
+"""Cache de reportes: clave y versiones en reportes_guardados, contadores por tabla
+
+Revision ID: f41c9d2e7b83
+Revises: e2b6f7a9c418
+Create Date: 2026-10-17 18:22:09.674120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f41c9d2e7b83'
+down_revision = 'e2b6f7a9c418'
+branch_labels = None
+depends_on = None
+
+TABLAS_VERSIONADAS = (
+    'presupuestos_compra', 'proveedores', 'movimientos_pago', 'cuentas_pagar',
+    'metodos_pago', 'historial_precios', 'productos',
+)
+
+
+def upgrade():
+    with op.batch_alter_table('reportes_guardados', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('clave_filtro', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('versiones', sa.JSON(), nullable=True))
+        batch_op.add_column(sa.Column('actualizado_en', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_reportes_guardados_clave_filtro'), ['clave_filtro'], unique=False)
+
+    versiones = op.create_table('versiones_tabla',
+        sa.Column('tabla', sa.String(length=100), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('tabla')
+    )
+    op.bulk_insert(versiones, [{'tabla': t, 'version': 0} for t in TABLAS_VERSIONADAS])
+
+
+def downgrade():
+    op.drop_table('versiones_tabla')
+
+    with op.batch_alter_table('reportes_guardados', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_reportes_guardados_clave_filtro'))
+        batch_op.drop_column('actualizado_en')
+        batch_op.drop_column('versiones')
+        batch_op.drop_column('clave_filtro')
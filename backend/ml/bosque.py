@@ -0,0 +1,78 @@
+"""
+bosque.py
+
+- Aplana un RandomForestRegressor de sklearn en arreglos contiguos
+  (feature / umbral / hijo izquierdo / hijo derecho / valor) de todos los árboles.
+- Evaluador vectorizado: recorre todos los árboles a la vez, nivel por nivel.
+- Guarda / carga en .npz; para predecir no hace falta importar sklearn.
+"""
+
+import numpy as np
+
+
+class BosquePlano:
+    """Ensamble de árboles de regresión en arreglos planos (predicción = promedio)."""
+
+    def __init__(self, feature, umbral, izq, der, valor, raices, profundidad, n_features):
+        self.feature = np.asarray(feature, dtype=np.int32)  # -1 en hojas
+        self.umbral = np.asarray(umbral, dtype=np.float64)
+        # en las hojas izq = der = el propio nodo, así el recorrido se queda quieto
+        self.izq = np.asarray(izq, dtype=np.int32)
+        self.der = np.asarray(der, dtype=np.int32)
+        self.valor = np.asarray(valor, dtype=np.float64)
+        self.raices = np.asarray(raices, dtype=np.int32)
+        self.profundidad = int(profundidad)
+        self.n_features = int(n_features)
+        self._hijos = None
+
+    @classmethod
+    def desde_sklearn(cls, modelo):
+        """Aplana los estimadores de un RandomForestRegressor / ExtraTreesRegressor."""
+        feature, umbral, izq, der, valor, raices = [], [], [], [], [], []
+        base = 0
+        profundidad = 0
+        for est in modelo.estimators_:
+            t = est.tree_
+            n = t.node_count
+            hoja = t.children_left < 0
+            propios = np.arange(base, base + n)
+            feature.append(np.where(hoja, -1, t.feature))
+            umbral.append(np.where(hoja, 0.0, t.threshold))
+            izq.append(np.where(hoja, propios, t.children_left + base))
+            der.append(np.where(hoja, propios, t.children_right + base))
+            valor.append(t.value[:, 0, 0])
+            raices.append(base)
+            profundidad = max(profundidad, t.max_depth)
+            base += n
+        return cls(np.concatenate(feature), np.concatenate(umbral), np.concatenate(izq),
+                   np.concatenate(der), np.concatenate(valor), raices, profundidad,
+                   modelo.n_features_in_)
+
+    def guardar(self, path):
+        np.savez(
+            path, feature=self.feature, umbral=self.umbral, izq=self.izq, der=self.der,
+            valor=self.valor, raices=self.raices, profundidad=np.array(self.profundidad),
+            n_features=np.array(self.n_features),
+        )
+
+    @classmethod
+    def cargar(cls, path):
+        with np.load(path) as z:
+            datos = {k: z[k] for k in z.files}
+        return cls(**datos)
+
+    def predict(self, X):
+        """Predicción para un lote (n, n_features); mismo resultado que sklearn."""
+        # sklearn compara en float32 (X <= umbral); se replica para coincidir en los bordes
+        X = np.asarray(X, dtype=np.float32).astype(np.float64).reshape(-1, self.n_features)
+        if self._hijos is None:
+            self._hijos = np.column_stack((self.izq, self.der))
+        filas = np.arange(len(X))[:, None]
+        nodos = np.broadcast_to(self.raices, (len(X), len(self.raices)))
+        for nivel in range(self.profundidad):
+            f = self.feature[nodos]
+            if nivel % 4 == 3 and (f < 0).all():
+                break  # todos los recorridos llegaron a una hoja
+            # en hojas f = -1 lee cualquier columna: ambos hijos son el mismo nodo
+            nodos = self._hijos[nodos, (X[filas, f] > self.umbral[nodos]).astype(np.intp)]
+        return self.valor[nodos].mean(axis=1)
@@ -0,0 +1,128 @@
+"""
+cache_distancias.py
+
+- Distancias / tiempos entre pares de puntos de la red ya calculados, en una
+  tabla SQLite compartida por los workers (sobrevive reinicios).
+- Clave (u, v, modo): u y v identifican el punto ajustado (nodo o posición
+  sobre una arista); modo = versión del grafo + peso + cierres del día.
+- Expulsión LFU: cada acierto suma un uso; al pasar el máximo de filas se
+  borran las menos usadas.
+"""
+
+import os
+import time
+import sqlite3
+import numpy as np
+
+PARES_DB = os.path.join(os.path.dirname(__file__), "cache_distancias.db")
+
+
+def clave_punto(p):
+    """Identificador estable de un PuntoRed."""
+    return f"a{p.arista}:{p.fraccion:.6f}" if p.virtual else f"n{p.nodo}"
+
+
+def modo_busqueda(motor, weight, dia):
+    """Parte de la clave que cambia con la red, el peso y los cierres vigentes."""
+    return f"{motor.version}:{weight}:{motor.modo(dia)}"
+
+
+class DistanciasPares:
+    """Almacén (u, v, modo) -> (distancia, tiempo) con expulsión LFU."""
+
+    def __init__(self, db_path=PARES_DB, max_filas=500000):
+        self.db_path = db_path
+        self.max_filas = int(max_filas)
+        self._escrituras = 0
+        con = self._conectar()
+        con.close()
+
+    def _conectar(self):
+        con = sqlite3.connect(self.db_path, timeout=5)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS pares (
+                u TEXT NOT NULL,
+                v TEXT NOT NULL,
+                modo TEXT NOT NULL,
+                distancia REAL NOT NULL,
+                tiempo REAL NOT NULL,
+                usos INTEGER NOT NULL DEFAULT 0,
+                actualizado REAL NOT NULL,
+                PRIMARY KEY (modo, u, v)
+            ) WITHOUT ROWID""")
+        con.execute("CREATE INDEX IF NOT EXISTS ix_pares_usos ON pares (usos)")
+        return con
+
+    def conocidas(self, claves, modo):
+        """Matrices (distancia, tiempo) n x n con NaN donde el par no está guardado."""
+        n = len(claves)
+        distancia = np.full((n, n), np.nan)
+        tiempo = np.full((n, n), np.nan)
+        if n == 0:
+            return distancia, tiempo
+        pos = {}
+        for k, c in enumerate(claves):
+            pos.setdefault(c, []).append(k)
+        try:
+            con = self._conectar()
+            try:
+                # los puntos pedidos van a una tabla temporal: el join usa la clave primaria
+                con.execute("CREATE TEMP TABLE IF NOT EXISTS consulta (c TEXT PRIMARY KEY)")
+                con.execute("DELETE FROM consulta")
+                con.executemany("INSERT INTO consulta (c) VALUES (?)", [(c,) for c in pos])
+                filas = con.execute("""
+                    SELECT p.u, p.v, p.distancia, p.tiempo FROM consulta a
+                    JOIN pares p ON p.modo = ? AND p.u = a.c
+                    JOIN consulta b ON b.c = p.v""", (modo,)).fetchall()
+                usados = []
+                for u, v, d, t in filas:
+                    for i in pos[u]:
+                        distancia[i, pos[v]] = d
+                        tiempo[i, pos[v]] = t
+                    usados.append((modo, u, v))
+                if usados:
+                    con.executemany("UPDATE pares SET usos = usos + 1 WHERE modo = ? AND u = ? AND v = ?", usados)
+                    con.commit()
+            finally:
+                con.close()
+        except sqlite3.Error as e:
+            print(f"Cache de distancias no disponible: {e}")
+        return distancia, tiempo
+
+    def guardar(self, claves, modo, distancia, tiempo, celdas=None):
+        """Guarda las celdas finitas (i != j) de las matrices; `celdas` = bool n x n para limitar."""
+        finitas = np.isfinite(distancia) & np.isfinite(tiempo)
+        np.fill_diagonal(finitas, False)
+        if celdas is not None:
+            finitas &= celdas
+        ii, jj = np.nonzero(finitas)
+        if len(ii) == 0:
+            return
+        ahora = time.time()
+        filas = [(claves[i], claves[j], modo, float(distancia[i, j]), float(tiempo[i, j]), ahora)
+                 for i, j in zip(ii.tolist(), jj.tolist()) if claves[i] != claves[j]]
+        try:
+            con = self._conectar()
+            try:
+                con.executemany("""
+                    INSERT INTO pares (u, v, modo, distancia, tiempo, usos, actualizado) VALUES (?, ?, ?, ?, ?, 0, ?)
+                    ON CONFLICT (modo, u, v) DO UPDATE SET distancia = excluded.distancia,
+                        tiempo = excluded.tiempo, actualizado = excluded.actualizado""", filas)
+                self._escrituras += 1
+                if self._escrituras % 50 == 0:
+                    self._podar(con)
+                con.commit()
+            finally:
+                con.close()
+        except sqlite3.Error as e:
+            print(f"Cache de distancias no disponible: {e}")
+
+    def _podar(self, con):
+        """LFU: si hay más de max_filas, borra las menos usadas (las más viejas primero en empate)."""
+        total = con.execute("SELECT COUNT(*) FROM pares").fetchone()[0]
+        exceso = total - self.max_filas
+        if exceso > 0:
+            con.execute("""DELETE FROM pares WHERE (modo, u, v) IN (
+                               SELECT modo, u, v FROM pares ORDER BY usos, actualizado LIMIT ?)""", (exceso,))
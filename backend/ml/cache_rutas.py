@@ -0,0 +1,146 @@
+"""
+cache_rutas.py
+
+- Cache de resultados de /api/find-route: clave = (versión del grafo, patrón
+  de cierres del día, secuencia de puntos ajustados a la red).
+- Nivel 1: LRU acotado con TTL en el proceso.
+- Nivel 2 (opcional): tabla SQLite compartida por todos los workers de gunicorn.
+- La versión del grafo incluye los cierres por feria: si cambia la red o las
+  restricciones, las claves viejas dejan de coincidir y expiran solas.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+CACHE_DB = os.path.join(os.path.dirname(__file__), "cache_rutas.db")
+
+
+def clave_ruta(version, modo, puntos, weight="length"):
+    """Clave estable de una consulta: puntos como (nodo, arista, fracción) ya ajustados."""
+    partes = [version, modo, weight]
+    partes += [(p.nodo, p.arista, round(p.fraccion, 6)) for p in puntos]
+    return hashlib.sha1(json.dumps(partes).encode()).hexdigest()
+
+
+class CacheRutas:
+    """LRU + TTL en memoria con respaldo opcional en SQLite."""
+
+    def __init__(self, max_entradas=1024, ttl_s=3600.0, db_path=None, max_filas_db=50000):
+        self.max_entradas = int(max_entradas)
+        self.ttl_s = float(ttl_s)
+        self.db_path = db_path
+        self.max_filas_db = int(max_filas_db)
+        self._memoria = OrderedDict()  # clave -> (vence, valor)
+        self._lock = threading.Lock()
+        self._escrituras = 0
+        self.aciertos = {"memoria": 0, "disco": 0}
+        self.fallos = 0
+        if db_path:
+            con = self._conectar()
+            con.close()
+
+    def _conectar(self):
+        con = sqlite3.connect(self.db_path, timeout=5)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS rutas (
+                clave TEXT PRIMARY KEY,
+                valor TEXT NOT NULL,
+                vence REAL NOT NULL,
+                usado REAL NOT NULL
+            )""")
+        return con
+
+    def obtener(self, clave):
+        """(valor, nivel) si la clave está vigente; (None, None) si no."""
+        ahora = time.time()
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is not None:
+                if entrada[0] > ahora:
+                    self._memoria.move_to_end(clave)
+                    self.aciertos["memoria"] += 1
+                    return entrada[1], "memoria"
+                del self._memoria[clave]
+        if self.db_path:
+            try:
+                con = self._conectar()
+                try:
+                    fila = con.execute("SELECT valor, vence FROM rutas WHERE clave = ? AND vence > ?",
+                                       (clave, ahora)).fetchone()
+                    if fila is not None:
+                        con.execute("UPDATE rutas SET usado = ? WHERE clave = ?", (ahora, clave))
+                        con.commit()
+                finally:
+                    con.close()
+                if fila is not None:
+                    valor = json.loads(fila[0])
+                    self._recordar(clave, valor, fila[1])
+                    with self._lock:
+                        self.aciertos["disco"] += 1
+                    return valor, "disco"
+            except sqlite3.Error as e:
+                print(f"Cache de rutas (SQLite) no disponible: {e}")
+        with self._lock:
+            self.fallos += 1
+        return None, None
+
+    def guardar(self, clave, valor):
+        """Guarda un resultado serializable a JSON en ambos niveles."""
+        vence = time.time() + self.ttl_s
+        self._recordar(clave, valor, vence)
+        if not self.db_path:
+            return
+        try:
+            con = self._conectar()
+            try:
+                con.execute("INSERT OR REPLACE INTO rutas (clave, valor, vence, usado) VALUES (?, ?, ?, ?)",
+                            (clave, json.dumps(valor), vence, time.time()))
+                self._escrituras += 1
+                # poda periódica: vencidas y, si sobra, las menos usadas recientemente
+                if self._escrituras % 100 == 0:
+                    con.execute("DELETE FROM rutas WHERE vence <= ?", (time.time(),))
+                    con.execute("""DELETE FROM rutas WHERE clave IN (
+                                       SELECT clave FROM rutas ORDER BY usado DESC LIMIT -1 OFFSET ?)""",
+                                (self.max_filas_db,))
+                con.commit()
+            finally:
+                con.close()
+        except sqlite3.Error as e:
+            print(f"Cache de rutas (SQLite) no disponible: {e}")
+
+    def _recordar(self, clave, valor, vence):
+        with self._lock:
+            self._memoria[clave] = (vence, valor)
+            self._memoria.move_to_end(clave)
+            while len(self._memoria) > self.max_entradas:
+                self._memoria.popitem(last=False)
+
+    def limpiar(self):
+        """Vacía ambos niveles (p. ej. tras regenerar el snapshot)."""
+        with self._lock:
+            self._memoria.clear()
+        if self.db_path:
+            con = self._conectar()
+            try:
+                con.execute("DELETE FROM rutas")
+                con.commit()
+            finally:
+                con.close()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "entradas_memoria": len(self._memoria),
+                "max_entradas": self.max_entradas,
+                "ttl_s": self.ttl_s,
+                "aciertos": dict(self.aciertos),
+                "fallos": self.fallos,
+                "compartida": bool(self.db_path),
+            }
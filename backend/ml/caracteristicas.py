@@ -0,0 +1,156 @@
+"""
+caracteristicas.py
+
+- Features de ruta calculadas junto al camino: cantidad de aristas y de giros,
+  mezcla de clases de vía (fracción del largo) y aristas en zona de feria.
+- Los atributos por arista se precalculan una vez en arreglos (rumbos de
+  entrada/salida, columnas aditivas); un camino o un árbol de búsqueda se
+  agregan con indexación vectorizada, sin dicts por arista.
+- Lo usan la simulación de entrenamiento, el historial real y find_route, así
+  que entrenamiento y servicio calculan exactamente lo mismo.
+"""
+
+import numpy as np
+
+from ml.motor_rutas import CLASES_VIA
+
+# Esquema de los modelos anteriores (sin esquema registrado)
+ESQUEMA_LEGADO = ["dist_m", "base_time_sec", "is_thursday"]
+
+# Features agregadas sobre el camino, en orden
+FEATURES_CAMINO = ["n_aristas", "n_giros", "frac_principal", "frac_secundaria", "frac_local", "aristas_feria"]
+
+MODEL_FEATURES = ESQUEMA_LEGADO + FEATURES_CAMINO
+
+# Grupos de clase de vía para la mezcla (el resto cuenta solo en el total)
+GRUPOS_VIA = {
+    "principal": ("motorway", "trunk", "primary"),
+    "secundaria": ("secondary", "tertiary"),
+    "local": ("unclassified", "residential", "living_street", "service"),
+}
+
+# Cambio de rumbo (grados) a partir del cual se cuenta un giro
+GIRO_MIN_GRADOS = 45.0
+
+# Columnas de los agregados crudos: n_aristas, n_giros, largo total, largo por grupo, aristas de feria
+_N_CRUDAS = 4 + len(GRUPOS_VIA)
+
+
+def vector(features, esquema=None):
+    """Fila de entrada del modelo según su esquema (lista de nombres)."""
+    return [float(features[c]) for c in (esquema or ESQUEMA_LEGADO)]
+
+
+def faltantes(features, esquema=None):
+    """Nombres del esquema que no vienen en `features`."""
+    return [c for c in (esquema or ESQUEMA_LEGADO) if features.get(c) is None]
+
+
+class ExtractorCaracteristicas:
+    """Agregados por arista de un MotorRutas para calcular features de caminos."""
+
+    def __init__(self, motor):
+        self.motor = motor
+        n_aristas = len(motor.indices)
+        largo = motor.pesos["length"]["length"].astype(np.float64)
+        clase = np.asarray(motor.clase_via)
+
+        # columnas que se suman a lo largo del camino (el giro va aparte: depende del par de aristas)
+        aditivas = np.zeros((n_aristas, _N_CRUDAS), dtype=np.float64)
+        aditivas[:, 0] = 1.0
+        aditivas[:, 2] = largo
+        for k, clases in enumerate(GRUPOS_VIA.values()):
+            codigos = [CLASES_VIA.index(c) for c in clases]
+            aditivas[:, 3 + k] = np.where(np.isin(clase, codigos), largo, 0.0)
+        aditivas[:, -1] = np.asarray(motor.cierres) != 0
+        self.aditivas = aditivas
+
+        # rumbo (rad) del primer y del último segmento de la geometría de cada arista
+        px, py = motor.proyectar(motor.geom_x, motor.geom_y)
+        ini = motor.geom_ptr[:-1]
+        fin = motor.geom_ptr[1:] - 1
+        self.rumbo_ini = np.arctan2(px[ini + 1] - px[ini], py[ini + 1] - py[ini])
+        self.rumbo_fin = np.arctan2(px[fin] - px[fin - 1], py[fin] - py[fin - 1])
+
+        # clave u * n + v creciente en el orden CSR (filas por u, columnas ordenadas por v)
+        origen = np.repeat(np.arange(motor.n_nodos, dtype=np.int64), np.diff(motor.indptr))
+        self._claves = origen * motor.n_nodos + motor.indices
+        self._origen = origen
+
+    def giros(self, previas, siguientes):
+        """1.0 donde pasar de la arista `previas` a `siguientes` es un giro."""
+        delta = np.abs(self.rumbo_ini[siguientes] - self.rumbo_fin[previas])
+        delta = np.minimum(delta, 2 * np.pi - delta)
+        return (np.degrees(delta) >= GIRO_MIN_GRADOS).astype(np.float64)
+
+    def aristas(self, nodos):
+        """Aristas CSR de un camino dado como índices internos de nodo consecutivos."""
+        nodos = np.asarray(nodos, dtype=np.int64)
+        if len(nodos) < 2:
+            return np.zeros(0, dtype=np.int64)
+        claves = nodos[:-1] * self.motor.n_nodos + nodos[1:]
+        pos = np.searchsorted(self._claves, claves)
+        pos = np.minimum(pos, len(self._claves) - 1)
+        return pos[self._claves[pos] == claves]
+
+    def agregar_camino(self, aristas):
+        """Agregados crudos de un camino (secuencia de aristas CSR)."""
+        aristas = np.asarray(aristas, dtype=np.int64)
+        crudos = self.aditivas[aristas].sum(axis=0)
+        if len(aristas) > 1:
+            crudos[1] = self.giros(aristas[:-1], aristas[1:]).sum()
+        return crudos
+
+    def agregar_arbol(self, pred):
+        """
+        Agregados crudos desde la raíz de un árbol de búsqueda hasta cada nodo
+        alcanzado. `pred` = {nodo: arista entrante} (las raíces no aparecen).
+        Suma por duplicación de punteros: O(n log profundidad), todo en NumPy.
+        Retorna (nodos, crudos[len(nodos), columnas]).
+        """
+        if not pred:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, _N_CRUDAS))
+        nodos = np.fromiter(pred.keys(), dtype=np.int64, count=len(pred))
+        entrantes = np.fromiter(pred.values(), dtype=np.int64, count=len(pred))
+        m = len(nodos)
+        # índice local de cada nodo; m = raíz ficticia (valor 0, padre de sí misma)
+        local = np.full(self.motor.n_nodos, m, dtype=np.int64)
+        local[nodos] = np.arange(m)
+        padre = np.append(local[self._origen[entrantes]], m)
+
+        valor = np.zeros((m + 1, _N_CRUDAS))
+        valor[:m] = self.aditivas[entrantes]
+        con_previa = padre[:m] < m
+        previas = entrantes[padre[:m][con_previa]]
+        valor[:m][con_previa, 1] = self.giros(previas, entrantes[con_previa])
+
+        ancestro = padre
+        while (ancestro[:m] < m).any():
+            valor = valor + valor[ancestro]
+            ancestro = ancestro[ancestro]
+        return nodos, valor[:m]
+
+    @staticmethod
+    def finalizar(crudos):
+        """Agregados crudos (..., columnas) -> dict de FEATURES_CAMINO (arreglos o escalares)."""
+        crudos = np.asarray(crudos, dtype=np.float64)
+        total = np.maximum(crudos[..., 2], 1e-9)
+        features = {"n_aristas": crudos[..., 0], "n_giros": crudos[..., 1]}
+        for k, grupo in enumerate(GRUPOS_VIA):
+            features[f"frac_{grupo}"] = crudos[..., 3 + k] / total
+        features["aristas_feria"] = crudos[..., -1]
+        return features
+
+    def de_tramos(self, tramos):
+        """Features de camino de una ruta armada por tramos (listas de nodos internos)."""
+        crudos = np.zeros(_N_CRUDAS)
+        previa = None
+        for nodos in tramos:
+            aristas = self.aristas(nodos)
+            if len(aristas) == 0:
+                continue
+            crudos += self.agregar_camino(aristas)
+            if previa is not None:
+                crudos[1] += self.giros(np.array([previa]), aristas[:1])[0]
+            previa = aristas[-1]
+        return {k: float(v) for k, v in self.finalizar(crudos).items()}
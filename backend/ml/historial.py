@@ -0,0 +1,290 @@
+"""
+historial.py
+
+- Extrae rutas reales ya completadas (Ruta + RutaDetalle) con el tiempo total
+  de sus entregas (suma de MetricaEntrega) en lotes con cursores del lado del
+  servidor (yield_per); cada ruta entra una sola vez al almacén.
+- Recalcula las features de cada ruta con el motor (ml/caracteristicas.py,
+  las mismas que la simulación y find_route), buscando solo sus tramos
+  consecutivos.
+- Las agrega a un almacén columnar de entrenamiento (partes .npz + meta.json).
+- Reentrena de forma incremental: árboles nuevos (warm_start) solo sobre las
+  partes aún no entrenadas, con un tope de árboles para que el costo no crezca.
+"""
+
+import os
+import json
+import datetime
+import numpy as np
+
+from ml.motor_rutas import MotorRutas
+from ml.indice_espacial import IndiceAristas
+from ml.bosque import BosquePlano
+from ml.registro import MODELOS_DIR, guardar_descriptor
+from ml.caracteristicas import MODEL_FEATURES, ESQUEMA_LEGADO
+
+HISTORIAL_DIR = os.path.join(os.path.dirname(__file__), "historial")
+
+# MetricaEntrega.tiempo_entrega se registra en minutos
+TIEMPO_ENTREGA_UNIDAD_S = float(os.getenv("TIEMPO_ENTREGA_UNIDAD_S", 60))
+
+# Ruta.estado de las rutas terminadas (las únicas que entran al entrenamiento)
+RUTA_ESTADOS_COMPLETOS = [e.strip() for e in os.getenv(
+    "RUTA_ESTADOS_COMPLETOS", "completada,completado,finalizada,entregada").split(",") if e.strip()]
+
+# Árboles nuevos por reentrenamiento y tope del bosque (se descartan los más viejos)
+ARBOLES_INCREMENTO = int(os.getenv("ARBOLES_INCREMENTO", 50))
+ARBOLES_MAX = int(os.getenv("ARBOLES_MAX", 400))
+
+# Una fila por ruta: su objetivo es el tiempo total de sus entregas
+COLUMNAS = ("ruta_id", *MODEL_FEATURES, "time_real_sec", "n_entregas", "retraso")
+
+# Versión de las columnas; un almacén de otra versión se empieza de nuevo
+FORMATO_ALMACEN = 2
+
+
+class AlmacenEntrenamiento:
+    """Almacén columnar por partes: cada parte es un .npz con las mismas columnas."""
+
+    def __init__(self, directorio=HISTORIAL_DIR):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._meta_path = os.path.join(directorio, "meta.json")
+        self.meta = None
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self.meta = json.load(f)
+        if not self.meta or self.meta.get("formato") != FORMATO_ALMACEN:
+            # watermark: último Ruta.id extraído; entrenado_hasta: partes ya usadas en un fit
+            self.meta = {"formato": FORMATO_ALMACEN, "watermark": 0, "partes": 0, "filas": 0,
+                         "entrenado_hasta": 0}
+
+    @property
+    def watermark(self):
+        return self.meta["watermark"]
+
+    def _guardar_meta(self):
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._meta_path)
+
+    def agregar(self, columnas):
+        """Escribe una parte nueva (si trae filas) y avanza la marca de agua."""
+        n = len(columnas["ruta_id"])
+        if not n:
+            return
+        parte = self.meta["partes"] + 1
+        np.savez(os.path.join(self.directorio, f"parte_{parte:06d}.npz"),
+                 **{c: np.asarray(columnas[c]) for c in COLUMNAS})
+        self.meta["partes"] = parte
+        self.meta["filas"] += n
+        self.meta["watermark"] = max(self.meta["watermark"], int(max(columnas["ruta_id"])))
+        self._guardar_meta()
+
+    def rutas(self):
+        """ids de las rutas ya extraídas (las rutas completan en desorden: no alcanza la marca de agua)."""
+        ids = set()
+        for parte in range(1, self.meta["partes"] + 1):
+            with np.load(os.path.join(self.directorio, f"parte_{parte:06d}.npz")) as z:
+                ids.update(z["ruta_id"].tolist())
+        return ids
+
+    def leer(self, desde_parte=0):
+        """Concatena las columnas de las partes > desde_parte (NaN si una parte no tiene la columna)."""
+        datos = {c: [] for c in COLUMNAS}
+        for parte in range(desde_parte + 1, self.meta["partes"] + 1):
+            with np.load(os.path.join(self.directorio, f"parte_{parte:06d}.npz")) as z:
+                n = len(z["ruta_id"])
+                for c in COLUMNAS:
+                    datos[c].append(z[c] if c in z.files else np.full(n, np.nan))
+        return {c: np.concatenate(v) if v else np.array([]) for c, v in datos.items()}
+
+    def marcar_entrenado(self):
+        self.meta["entrenado_hasta"] = self.meta["partes"]
+        self._guardar_meta()
+
+
+def features_ruta(motor, indice, puntos, dia):
+    """MODEL_FEATURES de recorrer los puntos [(lat, lon)] en orden, el día `dia` (None si no hay ruta)."""
+    if len(puntos) < 2:
+        return None
+    snap, _ = indice.snap(puntos)
+    tramos = [(k, k + 1) for k in range(len(puntos) - 1)]
+    # solo los tramos consecutivos: la ruta ya viene ordenada
+    matriz = motor.matriz(snap, dia=dia, pares=tramos)
+    k = np.arange(len(puntos) - 1)
+    dist = matriz.distancia[k, k + 1]
+    tiempo = matriz.tiempo[k, k + 1]
+    if not (np.isfinite(dist).all() and np.isfinite(tiempo).all()):
+        return None
+    features = matriz.caracteristicas(tramos)
+    features.update(dist_m=float(dist.sum()), base_time_sec=float(tiempo.sum()), is_thursday=int(dia == 3))
+    return features
+
+
+def extraer_observaciones(db, motor, indice, extraidas=(), tam_lote=1000):
+    """
+    Genera dicts columnares (uno por lote) con una fila por ruta completada
+    (Ruta.estado en RUTA_ESTADOS_COMPLETOS) que no esté en `extraidas`. El
+    objetivo es el tiempo total de la ruta: la suma de sus MetricaEntrega,
+    agregada en la base (solo rutas con tiempo en todas sus entregas). La
+    consulta usa yield_per (cursor del servidor); los puntos de cada lote se
+    traen en una sola consulta IN.
+    """
+    from sqlalchemy import select, func, case
+    from models import MetricaEntrega, Ruta, RutaDetalle
+
+    consulta = (
+        select(Ruta.id, Ruta.fecha_programada,
+               func.sum(MetricaEntrega.tiempo_entrega), func.count(MetricaEntrega.id),
+               func.max(case((MetricaEntrega.retraso.is_(True), 1), else_=0)))
+        .join(MetricaEntrega, MetricaEntrega.ruta_id == Ruta.id)
+        .where(Ruta.estado.in_(RUTA_ESTADOS_COMPLETOS))
+        .group_by(Ruta.id, Ruta.fecha_programada)
+        .having(func.count(MetricaEntrega.tiempo_entrega) == func.count(MetricaEntrega.id))
+        .order_by(Ruta.id)
+        .execution_options(yield_per=tam_lote)
+    )
+    for filas in db.session.execute(consulta).partitions():
+        filas = [f for f in filas if f[0] not in extraidas]
+        if not filas:
+            continue
+        puntos = {}
+        for ruta_id, lat, lon in db.session.execute(
+                select(RutaDetalle.ruta_id, RutaDetalle.lat, RutaDetalle.lon)
+                .where(RutaDetalle.ruta_id.in_([f[0] for f in filas]))
+                .order_by(RutaDetalle.ruta_id, RutaDetalle.orden)):
+            if lat is not None and lon is not None:
+                puntos.setdefault(ruta_id, []).append((float(lat), float(lon)))
+
+        columnas = {c: [] for c in COLUMNAS}
+        for ruta_id, fecha, tiempo_total, n_entregas, retraso in filas:
+            dia = fecha.weekday() if fecha else None
+            feats = features_ruta(motor, indice, puntos.get(ruta_id, []), dia)
+            if feats is None:
+                continue
+            columnas["ruta_id"].append(ruta_id)
+            for c in MODEL_FEATURES:
+                columnas[c].append(feats[c])
+            columnas["time_real_sec"].append(float(tiempo_total) * TIEMPO_ENTREGA_UNIDAD_S)
+            columnas["n_entregas"].append(int(n_entregas))
+            columnas["retraso"].append(bool(retraso))
+        yield columnas
+
+
+def _app_datos():
+    """App Flask mínima (solo la base) para procesos de trabajo fuera del servidor."""
+    from flask import Flask
+    from dotenv import load_dotenv
+    from models import db
+    load_dotenv()
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app, db
+
+
+def _continuar(pkl, X, y):
+    """Agrega ARBOLES_INCREMENTO árboles (warm_start) al bosque de `pkl`, con tope ARBOLES_MAX."""
+    import joblib
+    model = joblib.load(pkl)
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + ARBOLES_INCREMENTO, n_jobs=-1)
+    model.fit(X, y)
+    if len(model.estimators_) > ARBOLES_MAX:
+        model.estimators_ = model.estimators_[-ARBOLES_MAX:]
+        model.n_estimators = ARBOLES_MAX
+    return model
+
+
+def reentrenar_incremental(progreso=None, tam_lote=1000):
+    """
+    Extrae las rutas completadas nuevas, las agrega al almacén y entrena
+    árboles nuevos solo con las partes no entrenadas sobre el modelo activo
+    (warm_start).
+    Retorna el artefacto para el registro o None si no hay datos nuevos.
+    """
+    import joblib
+    from ml.ruta_modelo import SNAPSHOT_DIR, load_contraction_hierarchies
+    from models import ModeloML
+
+    def etapa(nombre, mensaje):
+        print(mensaje)
+        if progreso is not None:
+            progreso(nombre, mensaje)
+
+    app, db = _app_datos()
+    with app.app_context():
+        base = (ModeloML.query.filter_by(activo=True)
+                .order_by(ModeloML.fecha_entrenamiento.desc(), ModeloML.id.desc()).first())
+        base_pkl = (base.metadatos or {}).get("respaldo_joblib") if base else None
+        if not base_pkl or not os.path.exists(base_pkl):
+            raise ValueError("No hay un modelo activo con respaldo joblib para continuar el entrenamiento")
+
+        etapa("extract", "Extrayendo rutas completadas nuevas...")
+        motor = MotorRutas.cargar(SNAPSHOT_DIR, mmap_mode="r")
+        load_contraction_hierarchies(motor)
+        indice = IndiceAristas(motor)
+        almacen = AlmacenEntrenamiento()
+        for columnas in extraer_observaciones(db, motor, indice, almacen.rutas(), tam_lote):
+            almacen.agregar(columnas)
+            etapa("extract", f"Rutas acumuladas: {almacen.meta['filas']}")
+
+        # el bosque base fija las columnas de entrada: se entrena con su esquema
+        esquema = base.esquema or ESQUEMA_LEGADO
+        nuevos = almacen.leer(almacen.meta["entrenado_hasta"])
+        completas = np.isfinite(np.column_stack([nuevos[c] for c in esquema]).astype(np.float64)).all(axis=1) \
+            if len(nuevos["ruta_id"]) else np.zeros(0, dtype=bool)
+        nuevos = {c: v[completas] for c, v in nuevos.items()}
+        if len(nuevos["ruta_id"]) == 0:
+            etapa("export", "Sin rutas completadas nuevas; el modelo activo se mantiene")
+            return None
+
+        etapa("fit", f"Agregando {ARBOLES_INCREMENTO} árboles con {len(nuevos['ruta_id'])} rutas nuevas...")
+        y = nuevos["time_real_sec"].astype(np.float64)
+        model = _continuar(base_pkl, np.column_stack([nuevos[c] for c in esquema]).astype(np.float64), y)
+        # el modelo de servicio de 3 features (si el base lo tiene) sigue a la par
+        legado = (base.metadatos or {}).get("legado")
+        model_legado = None
+        if legado and os.path.exists(legado.get("respaldo_joblib") or ""):
+            X_legado = np.column_stack([nuevos[c] for c in legado["esquema"]]).astype(np.float64)
+            model_legado = _continuar(legado["respaldo_joblib"], X_legado, y)
+
+        etapa("export", "Exportando artefactos...")
+        version = datetime.datetime.now().strftime("%Y%m%d%H%M%S") + "-" + os.urandom(3).hex()
+        out_dir = os.path.join(MODELOS_DIR, version)
+        os.makedirs(out_dir, exist_ok=True)
+        model_path = os.path.join(out_dir, "model_rf.pkl")
+        forest_path = os.path.join(out_dir, "model_rf.npz")
+        joblib.dump(model, model_path)
+        BosquePlano.desde_sklearn(model).guardar(forest_path)
+        if model_legado is not None:
+            legado = dict(legado, ruta_archivo=os.path.join(out_dir, "model_rf_legado.npz"),
+                          respaldo_joblib=os.path.join(out_dir, "model_rf_legado.pkl"))
+            joblib.dump(model_legado, legado["respaldo_joblib"])
+            BosquePlano.desde_sklearn(model_legado).guardar(legado["ruta_archivo"])
+        almacen.marcar_entrenado()
+
+        artefacto = {
+            "nombre": "tiempo_ruta",
+            "tipo": type(model).__name__,
+            "version": version,
+            "ruta_archivo": forest_path,
+            "formato": "bosque_npz",
+            "esquema": list(esquema),
+            "metadatos": {
+                "base_modelo_id": base.id,
+                "incremental": True,
+                "n_filas_nuevas": int(len(y)),
+                "n_filas_historial": int(almacen.meta["filas"]),
+                "watermark": int(almacen.watermark),
+                "n_estimators": int(len(model.estimators_)),
+                "grafo_version": motor.version,
+                "respaldo_joblib": model_path,
+            },
+        }
+        if model_legado is not None:
+            artefacto["metadatos"]["legado"] = legado
+        guardar_descriptor(out_dir, artefacto)
+        return artefacto
@@ -0,0 +1,43 @@
+"""
+indice_espacial.py
+
+- STRtree sobre las geometrías de las aristas para ajustar waypoints al punto
+  proyectado sobre la calle más cercana (nodos virtuales del motor).
+"""
+
+import numpy as np
+import shapely
+from shapely.strtree import STRtree
+
+
+class IndiceAristas:
+    """STRtree sobre las geometrías proyectadas (metros) de las aristas del motor."""
+
+    def __init__(self, motor):
+        self.motor = motor
+        gx, gy = motor.proyectar(motor.geom_x, motor.geom_y)
+        conteo = np.diff(motor.geom_ptr)
+        self.lineas = shapely.linestrings(
+            np.column_stack((gx, gy)), indices=np.repeat(np.arange(len(conteo)), conteo)
+        )
+        self.arbol = STRtree(self.lineas)
+
+    def snap(self, puntos):
+        """
+        Ajusta todos los puntos [(lat, lon), ...] a su arista más cercana en una
+        sola consulta. Retorna (PuntoRed[], distancias_m: float64[]).
+        """
+        puntos = np.asarray(puntos, dtype=np.float64).reshape(-1, 2)
+        qx, qy = self.motor.proyectar(puntos[:, 1], puntos[:, 0])
+        geoms = shapely.points(qx, qy)
+        entrada, aristas = self.arbol.query_nearest(geoms, all_matches=False)
+        aristas = aristas[np.argsort(entrada)]
+        lineas = self.lineas[aristas]
+        distancias = shapely.distance(geoms, lineas)
+        fracciones = shapely.line_locate_point(lineas, geoms, normalized=True)
+        proyectados = shapely.line_interpolate_point(lineas, fracciones, normalized=True)
+        lons, lats = self.motor.desproyectar(shapely.get_x(proyectados), shapely.get_y(proyectados))
+        return [
+            self.motor.punto_arista(e, f, lat, lon)
+            for e, f, lat, lon in zip(aristas.tolist(), fracciones.tolist(), lats.tolist(), lons.tolist())
+        ], distancias
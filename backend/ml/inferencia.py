@@ -0,0 +1,146 @@
+"""
+inferencia.py
+
+- Micro-batching de predicciones en el proceso: las llamadas concurrentes de
+  una sola fila se encolan y se resuelven juntas en un solo model.predict.
+- Se vacía la cola cada `espera_ms` o al juntar `max_lote` filas; cada
+  llamador espera su propio Future.
+- Cada fila viaja con el esquema con que se armó; el lote toma una sola vez
+  los modelos vigentes por esquema y predice cada grupo con el suyo, así un
+  cambio de modelo en caliente nunca mezcla filas de esquemas distintos.
+- Contadores de latencia, tamaño de lote y profundidad de cola.
+"""
+
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from ml.caracteristicas import ESQUEMA_LEGADO
+
+
+class LoteadorInferencia:
+    """Agrupa filas de varias solicitudes en lotes para el modelo."""
+
+    def __init__(self, obtener_modelos, max_lote=64, espera_ms=2.0, ventana=1000):
+        # obtener_modelos() -> {esquema (tupla): modelo}; se evalúa una vez por lote
+        # (el modelo puede cambiar en caliente)
+        self.obtener_modelos = obtener_modelos
+        self.max_lote = int(max_lote)
+        self.espera_s = float(espera_ms) / 1000.0
+        self._cola = queue.Queue()
+        self._lock = threading.Lock()
+        self._hilo = None
+        # contadores
+        self._solicitudes = 0
+        self._lotes = 0
+        self._filas = 0
+        self._errores = 0
+        self._max_lote_visto = 0
+        self._max_cola = 0
+        self._latencias = deque(maxlen=ventana)  # seg, encolado -> resultado
+        self._tamanos = deque(maxlen=ventana)
+
+    def _iniciar(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name="lote-inferencia", daemon=True)
+                self._hilo.start()
+
+    def enviar(self, fila, esquema=None):
+        """Encola una fila armada con `esquema`; retorna un Future con la predicción (float)."""
+        self._iniciar()
+        futuro = Future()
+        esquema = tuple(esquema or ESQUEMA_LEGADO)
+        self._cola.put((np.asarray(fila, dtype=np.float64), esquema, futuro, time.perf_counter()))
+        with self._lock:
+            self._solicitudes += 1
+            self._max_cola = max(self._max_cola, self._cola.qsize())
+        return futuro
+
+    def predecir(self, fila, esquema=None, timeout=5.0):
+        """Atajo bloqueante de enviar(fila, esquema).result()."""
+        return self.enviar(fila, esquema).result(timeout=timeout)
+
+    def _bucle(self):
+        while True:
+            lote = [self._cola.get()]
+            limite = time.perf_counter() + self.espera_s
+            while len(lote) < self.max_lote:
+                restante = limite - time.perf_counter()
+                if restante <= 0:
+                    break
+                try:
+                    lote.append(self._cola.get(timeout=restante))
+                except queue.Empty:
+                    break
+            try:
+                self._procesar(lote)
+            except Exception as e:
+                # el hilo no puede morir: nadie quedaría resolviendo la cola
+                self._fallar(lote, e)
+
+    def _fallar(self, lote, error):
+        pendientes = [futuro for _, _, futuro, _ in lote if not futuro.done()]
+        with self._lock:
+            self._errores += len(pendientes)
+        for futuro in pendientes:
+            futuro.set_exception(error)
+
+    def _procesar(self, lote):
+        # modelos vigentes tomados una sola vez: todo el lote ve el mismo par (modelo, esquema)
+        try:
+            modelos = self.obtener_modelos() or {}
+        except Exception as e:
+            self._fallar(lote, e)
+            return
+        grupos = {}
+        for item in lote:
+            grupos.setdefault(item[1], []).append(item)
+        for esquema, grupo in grupos.items():
+            try:
+                modelo = modelos.get(esquema)
+                if modelo is None:
+                    raise RuntimeError(f"Modelo no disponible para el esquema {list(esquema)}")
+                X = np.vstack([fila for fila, _, _, _ in grupo])
+                pred = np.asarray(modelo.predict(X), dtype=np.float64).reshape(-1)
+                if len(pred) != len(grupo):
+                    raise RuntimeError(f"El modelo devolvió {len(pred)} predicciones para {len(grupo)} filas")
+            except Exception as e:
+                self._fallar(grupo, e)
+                continue
+            fin = time.perf_counter()
+            for (_, _, futuro, _), valor in zip(grupo, pred.tolist()):
+                futuro.set_result(valor)
+            with self._lock:
+                self._lotes += 1
+                self._filas += len(grupo)
+                self._max_lote_visto = max(self._max_lote_visto, len(grupo))
+                self._tamanos.append(len(grupo))
+                self._latencias.extend(fin - inicio for _, _, _, inicio in grupo)
+
+    def estadisticas(self):
+        """Contadores acumulados y percentiles de latencia (ms) de la ventana reciente."""
+        with self._lock:
+            latencias = np.array(self._latencias) * 1000.0
+            tamanos = np.array(self._tamanos)
+            return {
+                'solicitudes': self._solicitudes,
+                'lotes': self._lotes,
+                'filas': self._filas,
+                'errores': self._errores,
+                'cola_actual': self._cola.qsize(),
+                'cola_maxima': self._max_cola,
+                'lote_promedio': round(float(tamanos.mean()), 2) if len(tamanos) else 0.0,
+                'lote_maximo': self._max_lote_visto,
+                'latencia_ms': {
+                    'p50': round(float(np.percentile(latencias, 50)), 3) if len(latencias) else None,
+                    'p95': round(float(np.percentile(latencias, 95)), 3) if len(latencias) else None,
+                    'max': round(float(latencias.max()), 3) if len(latencias) else None,
+                },
+                'max_lote': self.max_lote,
+                'espera_ms': self.espera_s * 1000.0,
+            }
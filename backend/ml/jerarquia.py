@@ -0,0 +1,369 @@
+"""
+jerarquia.py
+
+- Preprocesamiento offline de una jerarquía de contracción (CH) sobre el MotorRutas:
+  orden de nodos por diferencia de aristas + atajos (shortcuts) con búsqueda de testigos.
+- Guarda / carga la jerarquía en .npz junto al modelo.
+- Consultas bidireccionales punto a punto y matrices muchos-a-muchos (buckets).
+"""
+
+import os
+import math
+import heapq
+import numpy as np
+
+from ml.motor_rutas import huella_cierres
+
+
+class JerarquiaContraccion:
+    """Jerarquía de contracción para un peso (length / travel_time) del motor."""
+
+    def __init__(self, node_ids, rango, cola, cabeza, peso, largo, tiempo,
+                 hijo1, hijo2, sube_ptr, sube_ids, baja_ptr, baja_ids, weight="length", cierre="",
+                 grafo_version=""):
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.rango = np.asarray(rango, dtype=np.int32)
+        self.cola = np.asarray(cola, dtype=np.int32)
+        self.cabeza = np.asarray(cabeza, dtype=np.int32)
+        self.peso = np.asarray(peso, dtype=np.float64)
+        self.largo = np.asarray(largo, dtype=np.float64)
+        self.tiempo = np.asarray(tiempo, dtype=np.float64)
+        self.hijo1 = np.asarray(hijo1, dtype=np.int32)  # -1 en aristas originales
+        self.hijo2 = np.asarray(hijo2, dtype=np.int32)
+        self.sube_ptr = np.asarray(sube_ptr, dtype=np.int32)  # aristas hacia nodos de mayor rango, por cola
+        self.sube_ids = np.asarray(sube_ids, dtype=np.int32)
+        self.baja_ptr = np.asarray(baja_ptr, dtype=np.int32)  # aristas desde nodos de mayor rango, por cabeza
+        self.baja_ids = np.asarray(baja_ids, dtype=np.int32)
+        self.weight = str(weight)
+        self.cierre = str(cierre)  # huella de las aristas excluidas ('' = red completa)
+        self.grafo_version = str(grafo_version)  # MotorRutas.version sobre la que se construyó
+        self._idx = {int(n): i for i, n in enumerate(self.node_ids.tolist())}
+        self._listas = None
+
+    # --------------------------
+    # PREPROCESAMIENTO
+    # --------------------------
+
+    @classmethod
+    def construir(cls, motor, weight="length", cerradas=None, max_asentados=60):
+        """Contrae todos los nodos del motor; `cerradas` excluye aristas CSR (bool[])."""
+        indptr, indices, w, largo, tiempo = motor._csr(weight)
+        n = motor.n_nodos
+
+        cola, cabeza, peso, lg, tt, h1, h2 = [], [], [], [], [], [], []
+        salida = [dict() for _ in range(n)]   # u -> {v: arista}
+        entrada = [dict() for _ in range(n)]  # v -> {u: arista}
+
+        def agregar(u, v, p, l, t, a, b):
+            actual = salida[u].get(v)
+            if actual is not None and peso[actual] <= p:
+                return
+            eid = len(cola)
+            cola.append(u)
+            cabeza.append(v)
+            peso.append(p)
+            lg.append(l)
+            tt.append(t)
+            h1.append(a)
+            h2.append(b)
+            salida[u][v] = eid
+            entrada[v][u] = eid
+
+        for u in range(n):
+            for e in range(indptr[u], indptr[u + 1]):
+                if cerradas is not None and cerradas[e]:
+                    continue
+                if math.isfinite(w[e]):
+                    agregar(u, indices[e], w[e], largo[e], tiempo[e], -1, -1)
+
+        def testigos(origen, excluido, limite, objetivos):
+            dist = {origen: 0.0}
+            heap = [(0.0, origen)]
+            restantes = set(objetivos)
+            asentados = 0
+            while heap and restantes and asentados < max_asentados:
+                d, u = heapq.heappop(heap)
+                if d > dist[u]:
+                    continue
+                if d > limite:
+                    break
+                asentados += 1
+                restantes.discard(u)
+                for v, eid in salida[u].items():
+                    if v == excluido:
+                        continue
+                    nd = d + peso[eid]
+                    if nd < dist.get(v, math.inf):
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+            return dist
+
+        def atajos(v):
+            res = []
+            for u, e_in in entrada[v].items():
+                p_in = peso[e_in]
+                objetivos = {x: p_in + peso[e_out] for x, e_out in salida[v].items() if x != u}
+                if not objetivos:
+                    continue
+                dist = testigos(u, v, max(objetivos.values()), objetivos)
+                for x, c in objetivos.items():
+                    if dist.get(x, math.inf) > c:
+                        res.append((u, x, c, e_in, salida[v][x]))
+            return res
+
+        contraidos = [0] * n
+
+        def prioridad(v):
+            res = atajos(v)
+            return len(res) - len(entrada[v]) - len(salida[v]) + contraidos[v], res
+
+        heap = [(prioridad(v)[0], v) for v in range(n)]
+        heapq.heapify(heap)
+        rango = np.zeros(n, dtype=np.int32)
+        finales = []
+        nivel = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            prio, res = prioridad(v)
+            if heap and prio > heap[0][0]:
+                heapq.heappush(heap, (prio, v))  # actualización perezosa
+                continue
+            rango[v] = nivel
+            nivel += 1
+            for u, x, c, e_in, e_out in res:
+                agregar(u, x, c, lg[e_in] + lg[e_out], tt[e_in] + tt[e_out], e_in, e_out)
+            # las aristas incidentes a v en este momento forman la jerarquía
+            finales.extend(entrada[v].values())
+            finales.extend(salida[v].values())
+            for u in entrada[v]:
+                del salida[u][v]
+                contraidos[u] += 1
+            for x in salida[v]:
+                del entrada[x][v]
+                contraidos[x] += 1
+            entrada[v] = {}
+            salida[v] = {}
+
+        # compactar: sólo aristas finales, con hijos reindexados
+        finales = np.array(sorted(set(finales)), dtype=np.int64)
+        remap = np.full(len(cola), -1, dtype=np.int64)
+        remap[finales] = np.arange(len(finales))
+        cola = np.array(cola, dtype=np.int64)[finales]
+        cabeza = np.array(cabeza, dtype=np.int64)[finales]
+        hijo1 = np.array(h1, dtype=np.int64)[finales]
+        hijo2 = np.array(h2, dtype=np.int64)[finales]
+        hijo1 = np.where(hijo1 >= 0, remap[np.maximum(hijo1, 0)], -1)
+        hijo2 = np.where(hijo2 >= 0, remap[np.maximum(hijo2, 0)], -1)
+
+        sube = rango[cabeza] > rango[cola]
+        sube_ids = np.flatnonzero(sube)
+        sube_ids = sube_ids[np.argsort(cola[sube_ids], kind="stable")]
+        sube_ptr = np.concatenate(([0], np.cumsum(np.bincount(cola[sube_ids], minlength=n))))
+        baja_ids = np.flatnonzero(~sube)
+        baja_ids = baja_ids[np.argsort(cabeza[baja_ids], kind="stable")]
+        baja_ptr = np.concatenate(([0], np.cumsum(np.bincount(cabeza[baja_ids], minlength=n))))
+
+        return cls(
+            motor.node_ids, rango, cola, cabeza,
+            np.array(peso)[finales], np.array(lg)[finales], np.array(tt)[finales],
+            hijo1, hijo2, sube_ptr, sube_ids, baja_ptr, baja_ids, weight=weight,
+            cierre=huella_cierres(cerradas), grafo_version=motor.version,
+        )
+
+    # --------------------------
+    # PERSISTENCIA
+    # --------------------------
+
+    def guardar(self, path):
+        """Escribe el .npz en un temporal y lo reemplaza de una vez (los lectores nunca ven uno a medias)."""
+        tmp = path[:-len(".npz")] if path.endswith(".npz") else path
+        tmp = f"{tmp}.tmp{os.getpid()}.npz"
+        np.savez(
+            tmp, node_ids=self.node_ids, rango=self.rango, cola=self.cola, cabeza=self.cabeza,
+            peso=self.peso, largo=self.largo, tiempo=self.tiempo, hijo1=self.hijo1, hijo2=self.hijo2,
+            sube_ptr=self.sube_ptr, sube_ids=self.sube_ids, baja_ptr=self.baja_ptr, baja_ids=self.baja_ids,
+            weight=np.array(self.weight), cierre=np.array(self.cierre),
+            grafo_version=np.array(self.grafo_version),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def cargar(cls, path):
+        with np.load(path) as z:
+            datos = {k: z[k] for k in z.files}
+        datos["weight"] = str(datos["weight"])
+        datos["cierre"] = str(datos.get("cierre", ""))
+        datos["grafo_version"] = str(datos.get("grafo_version", ""))
+        return cls(**datos)
+
+    # --------------------------
+    # CONSULTAS
+    # --------------------------
+
+    def _csr(self):
+        if self._listas is None:
+            self._listas = (
+                self.sube_ptr.tolist(), self.sube_ids.tolist(),
+                self.baja_ptr.tolist(), self.baja_ids.tolist(),
+                self.cola.tolist(), self.cabeza.tolist(), self.peso.tolist(),
+                self.largo.tolist(), self.tiempo.tolist(),
+                self.hijo1.tolist(), self.hijo2.tolist(),
+            )
+        return self._listas
+
+    def _busqueda(self, semillas, hacia_arriba):
+        """Dijkstra completo en el grafo ascendente (o descendente invertido).
+
+        `semillas` son tuplas (nodo, peso, length, travel_time) iniciales.
+        Retorna {nodo: (peso, length, travel_time)} del espacio de búsqueda.
+        """
+        sube_ptr, sube_ids, baja_ptr, baja_ids, cola, cabeza, peso, largo, tiempo = self._csr()[:9]
+        ptr, ids, otro = (sube_ptr, sube_ids, cabeza) if hacia_arriba else (baja_ptr, baja_ids, cola)
+        dist = {}
+        acum = {}
+        heap = []
+        for n, w0, l0, t0 in semillas:
+            if w0 < dist.get(n, math.inf):
+                dist[n] = w0
+                acum[n] = (l0, t0)
+                heapq.heappush(heap, (w0, n))
+        asentados = {}
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in asentados:
+                continue
+            lu, tu = acum[u]
+            asentados[u] = (d, lu, tu)
+            for k in range(ptr[u], ptr[u + 1]):
+                eid = ids[k]
+                v = otro[eid]
+                nd = d + peso[eid]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    acum[v] = (lu + largo[eid], tu + tiempo[eid])
+                    heapq.heappush(heap, (nd, v))
+        return asentados
+
+    def _desempacar(self, eid, nodos):
+        """Agrega a `nodos` las cabezas de las aristas originales bajo `eid`."""
+        listas = self._csr()
+        cabeza, hijo1, hijo2 = listas[5], listas[9], listas[10]
+        pila = [eid]
+        while pila:
+            e = pila.pop()
+            if hijo1[e] < 0:
+                nodos.append(cabeza[e])
+            else:
+                pila.append(hijo2[e])
+                pila.append(hijo1[e])
+
+    def ruta(self, orig_node, dest_node):
+        """Búsqueda CH bidireccional; retorna path (osmids), dist (m), t (seg)."""
+        s = self._idx.get(int(orig_node))
+        t = self._idx.get(int(dest_node))
+        if s is None or t is None:
+            return None, np.nan, np.nan
+        nodos, _, total_m, total_s = self.ruta_semillas([(s, 0.0, 0.0, 0.0)], [(t, 0.0, 0.0, 0.0)])
+        if nodos is None:
+            return None, np.nan, np.nan
+        ids = self.node_ids
+        return [int(ids[i]) for i in nodos], total_m, total_s
+
+    def ruta_semillas(self, salidas, llegadas):
+        """
+        Búsqueda CH bidireccional entre conjuntos de semillas (nodo, peso,
+        length, travel_time). Retorna (nodos internos, peso, dist (m), t (seg)).
+        """
+        sube_ptr, sube_ids, baja_ptr, baja_ids, cola, cabeza, peso, largo, tiempo = self._csr()[:9]
+        dist = ({}, {})
+        inicio = ({}, {})
+        heaps = ([], [])
+        for lado, semillas in enumerate((salidas, llegadas)):
+            for n, w0, l0, t0 in semillas:
+                if w0 < dist[lado].get(n, math.inf):
+                    dist[lado][n] = w0
+                    inicio[lado][n] = (l0, t0)
+                    heapq.heappush(heaps[lado], (w0, n))
+        pred = ({}, {})
+        asentados = (set(), set())
+        mejor = math.inf
+        encuentro = None
+        while heaps[0] or heaps[1]:
+            tope_f = heaps[0][0][0] if heaps[0] else math.inf
+            tope_b = heaps[1][0][0] if heaps[1] else math.inf
+            if min(tope_f, tope_b) >= mejor:
+                break
+            lado = 0 if tope_f <= tope_b else 1
+            d, u = heapq.heappop(heaps[lado])
+            if u in asentados[lado]:
+                continue
+            asentados[lado].add(u)
+            otro_d = dist[1 - lado].get(u)
+            if otro_d is not None and d + otro_d < mejor:
+                mejor = d + otro_d
+                encuentro = u
+            ptr, ids, dest = (sube_ptr, sube_ids, cabeza) if lado == 0 else (baja_ptr, baja_ids, cola)
+            for k in range(ptr[u], ptr[u + 1]):
+                eid = ids[k]
+                v = dest[eid]
+                nd = d + peso[eid]
+                if nd < dist[lado].get(v, math.inf):
+                    dist[lado][v] = nd
+                    pred[lado][v] = eid
+                    heapq.heappush(heaps[lado], (nd, v))
+        if encuentro is None:
+            return None, math.inf, np.nan, np.nan
+
+        # aristas CH de la semilla de salida -> encuentro -> semilla de llegada
+        adelante = []
+        v = encuentro
+        while v in pred[0]:
+            eid = pred[0][v]
+            adelante.append(eid)
+            v = cola[eid]
+        s = v
+        adelante.reverse()
+        v = encuentro
+        while v in pred[1]:
+            eid = pred[1][v]
+            adelante.append(eid)
+            v = cabeza[eid]
+        t = v
+
+        nodos = [s]
+        total_m = inicio[0][s][0] + inicio[1][t][0]
+        total_s = inicio[0][s][1] + inicio[1][t][1]
+        for eid in adelante:
+            self._desempacar(eid, nodos)
+            total_m += largo[eid]
+            total_s += tiempo[eid]
+        return nodos, mejor, float(total_m), float(total_s)
+
+    def matriz_semillas(self, salidas, llegadas):
+        """
+        Matriz muchos-a-muchos con buckets sobre los espacios de búsqueda CH.
+        `salidas[i]` / `llegadas[j]` son listas de semillas de cada punto.
+        Retorna arreglos (peso, dist (m), t (seg)).
+        """
+        n_o, n_d = len(salidas), len(llegadas)
+        mejor = np.full((n_o, n_d), np.inf)
+        distancia = np.full((n_o, n_d), np.inf)
+        tiempo = np.full((n_o, n_d), np.inf)
+
+        buckets = {}
+        for j, semillas in enumerate(llegadas):
+            if not semillas:
+                continue
+            for x, val in self._busqueda(semillas, hacia_arriba=False).items():
+                buckets.setdefault(x, []).append((j, val))
+
+        for i, semillas in enumerate(salidas):
+            if not semillas:
+                continue
+            for x, (d, l, t) in self._busqueda(semillas, hacia_arriba=True).items():
+                for j, (db, lb, tb) in buckets.get(x, ()):
+                    if d + db < mejor[i, j]:
+                        mejor[i, j] = d + db
+                        distancia[i, j] = l + lb
+                        tiempo[i, j] = t + tb
+        return mejor, distancia, tiempo
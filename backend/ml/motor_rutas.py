@@ -0,0 +1,796 @@
+"""
+motor_rutas.py
+
+- Compila la red vial (MultiDiGraph de osmnx) a arreglos CSR de NumPy.
+- Elige de antemano la mejor arista paralela para cada peso (length / travel_time).
+- Resuelve rutas punto a punto con A* sobre los arreglos (sin dicts de networkx).
+- Calcula matrices origen-destino con un Dijkstra uno-a-muchos por origen.
+- Delega en una jerarquía de contracción (ml/jerarquia.py) si hay una adjunta.
+- Cierres por día de la semana (ferias): máscara de bits por arista; las
+  consultas con `dia` usan pesos infinitos en las calles cerradas ese día.
+- Atributos por arista (clase de vía) para las features de ruta (ml/caracteristicas.py).
+- Exporta / carga un snapshot binario (.npy) que los workers abren con mmap.
+"""
+
+import os
+import json
+import math
+import heapq
+import shutil
+import hashlib
+import numpy as np
+
+# Pesos soportados por el motor
+PESOS = ("length", "travel_time")
+
+RADIO_TIERRA_M = 6371008.8
+
+# Versión del formato del snapshot binario (cambiar si cambian los arreglos)
+FORMATO_SNAPSHOT = 4
+
+# Clases de vía de OSM (tag highway); clase_via[e] es el índice (los *_link
+# cuentan como su vía) y len(CLASES_VIA) = sin dato / otra
+CLASES_VIA = ("motorway", "trunk", "primary", "secondary", "tertiary",
+              "unclassified", "residential", "living_street", "service")
+
+
+def codigo_clase_via(highway):
+    """Índice en CLASES_VIA del tag highway (str o lista de osmnx)."""
+    if isinstance(highway, (list, tuple)):
+        highway = highway[0] if highway else None
+    if not isinstance(highway, str):
+        return len(CLASES_VIA)
+    highway = highway[:-5] if highway.endswith("_link") else highway
+    return CLASES_VIA.index(highway) if highway in CLASES_VIA else len(CLASES_VIA)
+
+
+def huella_cierres(cerradas):
+    """Identificador de un conjunto de aristas cerradas ('' = sin cierres)."""
+    if cerradas is None or not np.any(cerradas):
+        return ""
+    return hashlib.sha1(np.packbits(np.asarray(cerradas, dtype=bool)).tobytes()).hexdigest()[:16]
+
+
+class MotorRutas:
+    """Red vial compilada en arreglos CSR para búsquedas rápidas."""
+
+    def __init__(self, node_ids, x, y, indptr, indices, pesos, version=None,
+                 geom_ptr=None, geom_x=None, geom_y=None, cierres=None, clase_via=None):
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.x = np.asarray(x, dtype=np.float64)  # lon
+        self.y = np.asarray(y, dtype=np.float64)  # lat
+        self.indptr = np.asarray(indptr, dtype=np.int32)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        # pesos[weight] = {"length": float32[], "travel_time": float32[], "speed_kph": float32[]}
+        # (valores de la arista paralela elegida minimizando `weight`)
+        self.pesos = pesos
+        self._version = version
+        # Geometría (lon/lat) de cada arista CSR: puntos geom_ptr[e]:geom_ptr[e+1]
+        # (si no se provee, cada arista es el segmento recto entre sus nodos)
+        if geom_ptr is None:
+            origen = np.repeat(np.arange(len(self.node_ids)), np.diff(self.indptr))
+            geom_ptr = np.arange(0, 2 * len(self.indices) + 1, 2, dtype=np.int64)
+            geom_x = np.column_stack((self.x[origen], self.x[self.indices])).ravel()
+            geom_y = np.column_stack((self.y[origen], self.y[self.indices])).ravel()
+        self.geom_ptr = np.asarray(geom_ptr, dtype=np.int64)
+        self.geom_x = np.asarray(geom_x, dtype=np.float64)
+        self.geom_y = np.asarray(geom_y, dtype=np.float64)
+        # cierres[e]: bit d encendido = arista cerrada el día d (0 = lunes ... 6 = domingo)
+        if cierres is None:
+            cierres = np.zeros(len(self.indices), dtype=np.uint8)
+        self.cierres = np.asarray(cierres, dtype=np.uint8)
+        # clase_via[e]: índice en CLASES_VIA de la arista elegida por length
+        if clase_via is None:
+            clase_via = np.full(len(self.indices), len(CLASES_VIA), dtype=np.uint8)
+        self.clase_via = np.asarray(clase_via, dtype=np.uint8)
+        self._caracteristicas = None
+        self._idx = {int(n): i for i, n in enumerate(self.node_ids.tolist())}
+        self._listas = {}
+        self._huellas = {}
+        self.jerarquias = {}  # (weight, huella de cierres) -> JerarquiaContraccion
+
+        # Proyección equirectangular local (metros) para la heurística de A*
+        self._lat0 = math.radians(float(np.mean(self.y))) if len(self.y) else 0.0
+        px, py = self.proyectar(self.x, self.y)
+        self._px = px.tolist()
+        self._py = py.tolist()
+
+        # Velocidad máxima (m/s) para acotar la heurística por tiempo
+        largo = self.pesos["travel_time"]["length"].astype(np.float64)
+        tiempo = self.pesos["travel_time"]["travel_time"].astype(np.float64)
+        validos = tiempo > 0
+        self._vmax = float((largo[validos] / tiempo[validos]).max()) if validos.any() else 1.0
+
+    # --------------------------
+    # CONSTRUCCIÓN
+    # --------------------------
+
+    @classmethod
+    def desde_grafo(cls, G):
+        """Compila un grafo osmnx (con length y travel_time) a CSR."""
+        node_ids = np.fromiter(G.nodes, dtype=np.int64, count=G.number_of_nodes())
+        idx = {int(n): i for i, n in enumerate(node_ids.tolist())}
+        x = np.array([G.nodes[n]["x"] for n in G.nodes], dtype=np.float64)
+        y = np.array([G.nodes[n]["y"] for n in G.nodes], dtype=np.float64)
+
+        us, vs, largos, tiempos, velocidades, geometrias, clases = [], [], [], [], [], [], []
+        for u, v, data in G.edges(data=True):
+            if u == v:
+                continue  # los bucles nunca forman parte de una ruta más corta
+            us.append(idx[int(u)])
+            vs.append(idx[int(v)])
+            largos.append(data.get("length", 1.0))
+            tiempos.append(data.get("travel_time", 1.0))
+            velocidades.append(data.get("speed_kph", 0.0))
+            geometrias.append(data.get("geometry"))
+            clases.append(codigo_clase_via(data.get("highway")))
+        us = np.array(us, dtype=np.int64)
+        vs = np.array(vs, dtype=np.int64)
+        largos = np.array(largos, dtype=np.float64)
+        tiempos = np.array(tiempos, dtype=np.float64)
+        velocidades = np.array(velocidades, dtype=np.float64)
+        clases = np.array(clases, dtype=np.uint8)
+
+        pesos = {}
+        indptr = indices = None
+        for weight in PESOS:
+            w = largos if weight == "length" else tiempos
+            # ordenar por (u, v, peso) y quedarse con la primera arista de cada par
+            orden = np.lexsort((w, vs, us))
+            u_ord, v_ord = us[orden], vs[orden]
+            primera = np.ones(len(orden), dtype=bool)
+            primera[1:] = (u_ord[1:] != u_ord[:-1]) | (v_ord[1:] != v_ord[:-1])
+            elegidas = orden[primera]
+            pesos[weight] = {
+                "length": largos[elegidas].astype(np.float32),
+                "travel_time": tiempos[elegidas].astype(np.float32),
+                "speed_kph": velocidades[elegidas].astype(np.float32),
+            }
+            if indptr is None:
+                conteo = np.bincount(us[elegidas], minlength=len(node_ids))
+                indptr = np.concatenate(([0], np.cumsum(conteo))).astype(np.int32)
+                indices = vs[elegidas].astype(np.int32)
+                clase_via = clases[elegidas]
+                # geometría de la arista elegida por longitud (u -> v)
+                coords = []
+                for e in elegidas.tolist():
+                    geom = geometrias[e]
+                    if geom is None:
+                        coords.append(((x[us[e]], y[us[e]]), (x[vs[e]], y[vs[e]])))
+                    else:
+                        coords.append(tuple(geom.coords))
+                geom_ptr = np.concatenate(([0], np.cumsum([len(c) for c in coords]))).astype(np.int64)
+                planos = np.array([p for c in coords for p in c], dtype=np.float64).reshape(-1, 2)
+
+        return cls(node_ids, x, y, indptr, indices, pesos,
+                   geom_ptr=geom_ptr, geom_x=planos[:, 0], geom_y=planos[:, 1], clase_via=clase_via)
+
+    # --------------------------
+    # SNAPSHOT BINARIO
+    # --------------------------
+
+    def _arreglos(self):
+        """Arreglos que componen el snapshot: nombre de archivo -> ndarray."""
+        arreglos = {
+            "node_ids": self.node_ids, "x": self.x, "y": self.y,
+            "indptr": self.indptr, "indices": self.indices,
+            "geom_ptr": self.geom_ptr, "geom_x": self.geom_x, "geom_y": self.geom_y,
+            "cierres": self.cierres, "clase_via": self.clase_via,
+        }
+        for weight, columnas in self.pesos.items():
+            for columna, valores in columnas.items():
+                arreglos[f"{weight}__{columna}"] = valores
+        return arreglos
+
+    @property
+    def version(self):
+        """Huella de la red (estructura + pesos) para validar caches y jerarquías."""
+        if self._version is None:
+            h = hashlib.sha1()
+            for nombre, arr in sorted(self._arreglos().items()):
+                h.update(nombre.encode())
+                h.update(np.ascontiguousarray(arr).tobytes())
+            self._version = h.hexdigest()[:16]
+        return self._version
+
+    def guardar(self, directorio):
+        """
+        Escribe el snapshot (.npy + meta.json); reemplaza el directorio al final.
+        Si otro proceso deja su snapshot entre el borrado y el renombre, se
+        conserva el suyo cuando es de la misma red.
+        """
+        tmp = directorio.rstrip(os.sep) + f".tmp{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for nombre, arr in self._arreglos().items():
+            np.save(os.path.join(tmp, nombre + ".npy"), np.ascontiguousarray(arr))
+        meta = {
+            "formato": FORMATO_SNAPSHOT,
+            "version": self.version,
+            "n_nodos": int(self.n_nodos),
+            "n_aristas": int(len(self.indices)),
+            "pesos": {w: sorted(c) for w, c in self.pesos.items()},
+        }
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        shutil.rmtree(directorio, ignore_errors=True)
+        try:
+            os.rename(tmp, directorio)
+        except OSError:
+            try:
+                with open(os.path.join(directorio, "meta.json")) as f:
+                    ajeno = json.load(f)
+            except (OSError, ValueError):
+                ajeno = {}
+            shutil.rmtree(tmp, ignore_errors=True)
+            if ajeno.get("formato") != FORMATO_SNAPSHOT or ajeno.get("version") != self.version:
+                raise
+
+    @classmethod
+    def cargar(cls, directorio, mmap_mode="r"):
+        """Abre un snapshot; con mmap_mode los workers comparten las páginas del archivo."""
+        with open(os.path.join(directorio, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("formato") != FORMATO_SNAPSHOT:
+            raise ValueError(f"Formato de snapshot no soportado: {meta.get('formato')}")
+
+        def leer(nombre):
+            return np.load(os.path.join(directorio, nombre + ".npy"), mmap_mode=mmap_mode)
+
+        pesos = {w: {c: leer(f"{w}__{c}") for c in columnas} for w, columnas in meta["pesos"].items()}
+        return cls(
+            leer("node_ids"), leer("x"), leer("y"), leer("indptr"), leer("indices"),
+            pesos, version=meta["version"],
+            geom_ptr=leer("geom_ptr"), geom_x=leer("geom_x"), geom_y=leer("geom_y"),
+            cierres=leer("cierres"), clase_via=leer("clase_via"),
+        )
+
+    # --------------------------
+    # CONSULTAS
+    # --------------------------
+
+    @property
+    def n_nodos(self):
+        return len(self.node_ids)
+
+    def proyectar(self, lons, lats):
+        """Proyección equirectangular local (metros) alrededor de la red."""
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        return (np.radians(lons) * math.cos(self._lat0) * RADIO_TIERRA_M,
+                np.radians(lats) * RADIO_TIERRA_M)
+
+    def desproyectar(self, px, py):
+        """Inversa de proyectar: metros locales -> (lon, lat)."""
+        px = np.asarray(px, dtype=np.float64)
+        py = np.asarray(py, dtype=np.float64)
+        return (np.degrees(px / (math.cos(self._lat0) * RADIO_TIERRA_M)),
+                np.degrees(py / RADIO_TIERRA_M))
+
+    def adjuntar_jerarquia(self, jerarquia):
+        """
+        Usa una jerarquía de contracción preprocesada para su peso y sus cierres.
+        Se rechaza si se construyó sobre otra versión de la red (otros pesos o
+        cierres con los mismos nodos) o para un patrón de cierres que no existe.
+        """
+        if not np.array_equal(jerarquia.node_ids, self.node_ids):
+            raise ValueError("La jerarquía no corresponde a este grafo")
+        if jerarquia.grafo_version != self.version:
+            raise ValueError(f"La jerarquía es de otra versión de la red "
+                             f"({jerarquia.grafo_version or 'sin versión'} != {self.version})")
+        if jerarquia.cierre and jerarquia.cierre not in self.patrones_cierre():
+            raise ValueError(f"La jerarquía es para cierres que esta red no tiene ({jerarquia.cierre})")
+        self.jerarquias[(jerarquia.weight, jerarquia.cierre)] = jerarquia
+
+    # --------------------------
+    # CIERRES POR DÍA (FERIAS)
+    # --------------------------
+
+    def cerrar(self, mascara, dias):
+        """Marca como cerradas las aristas de `mascara` (bool[]) en los días dados."""
+        bits = np.uint8(sum(1 << int(d) for d in dias))
+        self.cierres = np.where(np.asarray(mascara, dtype=bool), self.cierres | bits, self.cierres).astype(np.uint8)
+        self._version = None
+        self._huellas = {}
+        self._caracteristicas = None
+        self._listas = {k: v for k, v in self._listas.items() if not isinstance(k, tuple)}
+
+    def cerradas(self, dia):
+        """bool[] de aristas cerradas el día `dia` (None = sin restricción)."""
+        if dia is None:
+            return np.zeros(len(self.indices), dtype=bool)
+        return (self.cierres >> np.uint8(int(dia) % 7)) & 1 == 1
+
+    def modo(self, dia):
+        """Huella de los cierres vigentes el día `dia` ('' si no hay)."""
+        if dia not in self._huellas:
+            self._huellas[dia] = huella_cierres(self.cerradas(dia))
+        return self._huellas[dia]
+
+    def patrones_cierre(self):
+        """{huella: (bool[] cerradas, [días])} de los distintos patrones de cierre de la semana."""
+        patrones = {}
+        for dia in range(7):
+            huella = self.modo(dia)
+            if huella:
+                patrones.setdefault(huella, (self.cerradas(dia), []))[1].append(dia)
+        return patrones
+
+    def _jerarquia(self, weight, dia):
+        return self.jerarquias.get((weight, self.modo(dia)))
+
+    def aristas_en(self, G):
+        """bool[] por arista CSR: True si el par (u, v) existe en el grafo G."""
+        origen = self.node_ids[self._origen_arista()]
+        destino = self.node_ids[self.indices]
+        return np.fromiter(
+            (G.has_edge(u, v) for u, v in zip(origen.tolist(), destino.tolist())),
+            dtype=bool, count=len(self.indices),
+        )
+
+    def indice(self, nodo):
+        """Índice interno de un osmid (None si no existe)."""
+        return self._idx.get(int(nodo))
+
+    def caracteristicas(self):
+        """Extractor de features de ruta con los agregados por arista precalculados."""
+        if self._caracteristicas is None:
+            from ml.caracteristicas import ExtractorCaracteristicas
+            self._caracteristicas = ExtractorCaracteristicas(self)
+        return self._caracteristicas
+
+    def coordenadas(self, path):
+        """Lista [[lat, lon], ...] para una lista de osmids."""
+        ids = np.fromiter((self._idx[int(n)] for n in path), dtype=np.int64, count=len(path))
+        return np.column_stack((self.y[ids], self.x[ids])).tolist()
+
+    def _csr(self, weight, dia=None):
+        """Arreglos CSR como listas de Python (indexación escalar rápida).
+
+        Con `dia`, el peso de las aristas cerradas ese día es infinito (las
+        listas se comparten entre los días con el mismo patrón de cierres).
+        """
+        if weight not in self._listas:
+            p = self.pesos[weight]
+            self._listas[weight] = (
+                self.indptr.tolist(),
+                self.indices.tolist(),
+                p[weight].astype(np.float64).tolist(),
+                p["length"].astype(np.float64).tolist(),
+                p["travel_time"].astype(np.float64).tolist(),
+            )
+        huella = self.modo(dia)
+        if not huella:
+            return self._listas[weight]
+        clave = (weight, huella)
+        if clave not in self._listas:
+            indptr, indices, w, largo, tiempo = self._listas[weight]
+            w = np.where(self.cerradas(dia), np.inf, self.pesos[weight][weight].astype(np.float64)).tolist()
+            self._listas[clave] = (indptr, indices, w, largo, tiempo)
+        return self._listas[clave]
+
+    def _heuristica(self, destino, weight):
+        """Cota inferior admisible (distancia recta, o recta / vmax)."""
+        px, py = self._px, self._py
+        tx, ty = px[destino], py[destino]
+        escala = 0.99 if weight == "length" else 0.99 / self._vmax
+
+        def h(n):
+            return math.hypot(px[n] - tx, py[n] - ty) * escala
+        return h
+
+    def ruta(self, orig_node, dest_node, weight="length", dia=None):
+        """A* punto a punto (con los cierres de `dia`); retorna path (osmids), dist (m), t (seg)."""
+        jerarquia = self._jerarquia(weight, dia)
+        if jerarquia is not None:
+            return jerarquia.ruta(orig_node, dest_node)
+        s = self.indice(orig_node)
+        t = self.indice(dest_node)
+        if s is None or t is None:
+            return None, np.nan, np.nan
+        if s == t:
+            return [int(orig_node)], 0.0, 0.0
+
+        indptr, indices, w, largo, tiempo = self._csr(weight, dia)
+        h = self._heuristica(t, weight)
+        dist = {s: 0.0}
+        pred = {s: -1}  # nodo -> índice de arista entrante
+        cerrados = set()
+        heap = [(h(s), 0.0, s)]
+        while heap:
+            _, d, u = heapq.heappop(heap)
+            if u in cerrados:
+                continue
+            if u == t:
+                break
+            cerrados.add(u)
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                nd = d + w[e]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    pred[v] = e
+                    heapq.heappush(heap, (nd + h(v), nd, v))
+        else:
+            return None, np.nan, np.nan
+
+        # reconstruir camino sumando length y travel_time de las aristas elegidas
+        path = [t]
+        total_m = 0.0
+        total_s = 0.0
+        v = t
+        origenes = self._origen_arista()
+        while v != s:
+            e = pred[v]
+            total_m += largo[e]
+            total_s += tiempo[e]
+            v = origenes[e]
+            path.append(v)
+        path.reverse()
+        ids = self.node_ids
+        return [int(ids[i]) for i in path], float(total_m), float(total_s)
+
+    # --------------------------
+    # PUNTOS SOBRE ARISTAS (NODOS VIRTUALES)
+    # --------------------------
+
+    def punto_nodo(self, nodo):
+        """PuntoRed para un osmid (None si no existe)."""
+        i = self.indice(nodo)
+        return None if i is None else PuntoRed(nodo=i, lat=float(self.y[i]), lon=float(self.x[i]))
+
+    def punto_arista(self, arista, fraccion, lat, lon):
+        """PuntoRed virtual a `fraccion` (0..1) de la arista CSR `arista`."""
+        return PuntoRed(arista=int(arista), reversa=self._reversa(int(arista)),
+                        fraccion=min(max(float(fraccion), 0.0), 1.0), lat=float(lat), lon=float(lon))
+
+    def _reversa(self, e):
+        """Arista v -> u de la arista e = u -> v (-1 si la calle es de un sentido)."""
+        u = self._origen_arista()[e]
+        v = int(self.indices[e])
+        fila = self.indices[self.indptr[v]:self.indptr[v + 1]]
+        pos = np.flatnonzero(fila == u)
+        return int(self.indptr[v] + pos[0]) if len(pos) else -1
+
+    def semillas(self, punto, weight, salida, dia=None):
+        """
+        Nodos reales desde los que se sale (salida=True) o a los que se llega
+        para alcanzar el punto, con el costo parcial (peso, length, travel_time)
+        del tramo de arista entre el punto virtual y ese nodo.
+        """
+        if not punto.virtual:
+            return [(punto.nodo, 0.0, 0.0, 0.0)]
+        _, indices, w, largo, tiempo = self._csr(weight, dia)
+        origenes = self._origen_arista()
+        e, r, f = punto.arista, punto.reversa, punto.fraccion
+        # sobre e = u -> v el punto está a f; sobre la reversa v -> u, a (1 - f)
+        if salida:
+            tramos = [(indices[e], e, 1 - f), (indices[r], r, f)] if r >= 0 else [(indices[e], e, 1 - f)]
+        else:
+            tramos = [(origenes[e], e, f), (origenes[r], r, 1 - f)] if r >= 0 else [(origenes[e], e, f)]
+        # una arista cerrada ese día no da acceso al punto, salvo que el punto
+        # esté sobre una calle cerrada: entonces se llega igual por su tramo
+        abiertos = [(n, a, k) for n, a, k in tramos if math.isfinite(w[a])]
+        if not abiertos:
+            _, _, w, _, _ = self._csr(weight)
+            abiertos = tramos
+        return [(n, k * w[a], k * largo[a], k * tiempo[a]) for n, a, k in abiertos]
+
+    def directo(self, a, b, weight, dia=None):
+        """Costo (peso, length, travel_time) de ir de a a b sin salir de su arista común."""
+        if not (a.virtual and b.virtual):
+            return None
+        _, _, w, largo, tiempo = self._csr(weight, dia)
+        pos_a = a.posiciones()
+        mejor = None
+        for e, fb in b.posiciones().items():
+            fa = pos_a.get(e)
+            if fa is not None and fa <= fb and math.isfinite(w[e]):
+                costo = ((fb - fa) * w[e], (fb - fa) * largo[e], (fb - fa) * tiempo[e])
+                if mejor is None or costo[0] < mejor[0]:
+                    mejor = costo
+        return mejor
+
+    def _dijkstra(self, semillas, objetivos, weight, dia=None):
+        """Dijkstra uno-a-muchos desde las semillas; se detiene al asentar todos los objetivos.
+
+        Retorna {nodo: (peso, length, travel_time)} de los nodos asentados y
+        {nodo: arista entrante} de los nodos alcanzados (las semillas no tienen).
+        """
+        indptr, indices, w, largo, tiempo = self._csr(weight, dia)
+        pendientes = set(objetivos)
+        dist = {}
+        acum = {}
+        heap = []
+        for n, w0, l0, t0 in semillas:
+            if w0 < dist.get(n, math.inf):
+                dist[n] = w0
+                acum[n] = (l0, t0)
+                heapq.heappush(heap, (w0, n))
+        pred = {}
+        asentados = {}
+        while heap and pendientes:
+            d, u = heapq.heappop(heap)
+            if u in asentados:
+                continue
+            lu, tu = acum[u]
+            asentados[u] = (d, lu, tu)
+            pendientes.discard(u)
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                nd = d + w[e]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    acum[v] = (lu + largo[e], tu + tiempo[e])
+                    pred[v] = e
+                    heapq.heappush(heap, (nd, v))
+        return asentados, pred
+
+    def matriz(self, puntos, weight="length", dia=None, conocidas=None, pares=None, caminos=True):
+        """
+        Matriz origen-destino entre osmids o PuntoRed: una búsqueda por origen
+        (o buckets CH si hay jerarquía para el peso y los cierres de `dia`).
+
+        `conocidas` = (distancia, tiempo) n x n con NaN en los pares sin dato:
+        los pares conocidos no se buscan (sin jerarquía, cada búsqueda apunta
+        solo a los destinos que faltan y se saltean las filas completas).
+        `pares` = [(i, j), ...]: solo se buscan esos pares (p. ej. los tramos
+        consecutivos de una ruta ya ordenada); el resto queda en infinito.
+        `caminos=False`: no se guardan los árboles de predecesores (solo costos,
+        p. ej. para el CVRP); un tramo pedido después se busca puntualmente.
+        """
+        puntos = [p if isinstance(p, PuntoRed) else self.punto_nodo(p) for p in puntos]
+        n = len(puntos)
+        salidas = [self.semillas(p, weight, True, dia) if p else [] for p in puntos]
+        llegadas = [self.semillas(p, weight, False, dia) if p else [] for p in puntos]
+        distancia = np.full((n, n), np.inf)
+        tiempo = np.full((n, n), np.inf)
+        mejor = np.full((n, n), np.inf)
+        llegada = np.full((n, n), -1, dtype=np.int64)  # nodo real de llegada; -2 = directo; -3 = conocido
+
+        faltan = np.ones((n, n), dtype=bool)
+        if pares is not None:
+            pares = [(int(i), int(j)) for i, j in pares]
+            faltan[:] = False
+            for i, j in pares:
+                faltan[i, j] = True
+        if conocidas is not None:
+            faltan &= ~np.isfinite(conocidas[0])
+            if pares is None:
+                np.fill_diagonal(faltan, True)
+
+        jerarquia = self._jerarquia(weight, dia)
+        predecesores = None
+        if jerarquia is not None and pares is not None:
+            for i, j in pares:
+                m, d, t = jerarquia.matriz_semillas([salidas[i]], [llegadas[j]])
+                mejor[i, j], distancia[i, j], tiempo[i, j] = m[0, 0], d[0, 0], t[0, 0]
+        elif jerarquia is not None:
+            mejor, distancia, tiempo = jerarquia.matriz_semillas(salidas, llegadas)
+        else:
+            predecesores = [{} for _ in range(n)] if caminos else None
+            for i in range(n):
+                columnas = np.flatnonzero(faltan[i]).tolist()
+                if not salidas[i] or not columnas or columnas == [i]:
+                    continue
+                objetivos = {nodo for j in columnas for nodo, *_ in llegadas[j]}
+                asentados, pred = self._dijkstra(salidas[i], objetivos, weight, dia)
+                if caminos:
+                    predecesores[i] = pred
+                for j in columnas:
+                    for nodo, w0, l0, t0 in llegadas[j]:
+                        if nodo in asentados:
+                            d, l, t = asentados[nodo]
+                            if d + w0 < mejor[i, j]:
+                                mejor[i, j] = d + w0
+                                distancia[i, j] = l + l0
+                                tiempo[i, j] = t + t0
+                                llegada[i, j] = nodo
+
+            # pares ya conocidos: el camino se reconstruye solo si se pide (MatrizRutas._nodos)
+            if conocidas is not None:
+                ii, jj = np.nonzero(~faltan & np.isfinite(conocidas[0]))
+                distancia[ii, jj] = conocidas[0][ii, jj]
+                tiempo[ii, jj] = conocidas[1][ii, jj]
+                mejor[ii, jj] = distancia[ii, jj] if weight == "length" else tiempo[ii, jj]
+                llegada[ii, jj] = -3
+
+        # tramos que no salen de la arista común (p. ej. dos clics en la misma cuadra)
+        for i, j in pares if pares is not None else ((i, j) for i in range(n) for j in range(n)):
+            if puntos[i] is None or puntos[j] is None:
+                continue
+            directo = self.directo(puntos[i], puntos[j], weight, dia)
+            if directo is not None and directo[0] <= mejor[i, j]:
+                mejor[i, j] = directo[0]
+                distancia[i, j], tiempo[i, j] = directo[1], directo[2]
+                llegada[i, j] = -2
+        return MatrizRutas(self, puntos, distancia, tiempo, predecesores, llegada,
+                           salidas=salidas, llegadas=llegadas, weight=weight, dia=dia)
+
+    def distancias(self, origenes, destinos, weight="length", dia=None):
+        """
+        Distancias (m) y tiempos (seg) de cada osmid de `origenes` a cada osmid
+        de `destinos`, sin predecesores: una búsqueda uno-a-muchos por origen
+        (o buckets CH). Pensado para lotes grandes de pares O-D.
+        """
+        def semilla(nodo):
+            i = self.indice(nodo)
+            return [] if i is None else [(i, 0.0, 0.0, 0.0)]
+        salidas = [semilla(o) for o in origenes]
+        llegadas = [semilla(d) for d in destinos]
+
+        jerarquia = self._jerarquia(weight, dia)
+        if jerarquia is not None:
+            _, distancia, tiempo = jerarquia.matriz_semillas(salidas, llegadas)
+            return distancia, tiempo
+
+        distancia = np.full((len(salidas), len(llegadas)), np.inf)
+        tiempo = np.full((len(salidas), len(llegadas)), np.inf)
+        columnas = {}
+        for j, ll in enumerate(llegadas):
+            for nodo, *_ in ll:
+                columnas.setdefault(nodo, []).append(j)
+        for i, ss in enumerate(salidas):
+            if not ss:
+                continue
+            asentados, _ = self._dijkstra(ss, columnas.keys(), weight, dia)
+            for nodo, js in columnas.items():
+                if nodo in asentados:
+                    _, l, t = asentados[nodo]
+                    distancia[i, js] = l
+                    tiempo[i, js] = t
+        return distancia, tiempo
+
+    def caracteristicas_od(self, origenes, destinos, weight="length", dia=None):
+        """
+        Como distancias(), más las features de camino (FEATURES_CAMINO) de cada
+        par: una búsqueda uno-a-muchos por origen y los agregados sobre su árbol
+        de predecesores (sin jerarquía: los atajos no conservan el camino).
+        Retorna (distancia, tiempo, {feature: arreglo (orígenes, destinos)}).
+        """
+        extractor = self.caracteristicas()
+        destinos_idx = np.array([-1 if self.indice(d) is None else self.indice(d) for d in destinos], dtype=np.int64)
+        objetivos = set(destinos_idx[destinos_idx >= 0].tolist())
+        distancia = np.full((len(origenes), len(destinos)), np.inf)
+        tiempo = np.full((len(origenes), len(destinos)), np.inf)
+        crudos = np.full((len(origenes), len(destinos), extractor.aditivas.shape[1]), np.nan)
+        local = np.full(self.n_nodos, -1, dtype=np.int64)
+        for i, o in enumerate(origenes):
+            s = self.indice(o)
+            if s is None:
+                continue
+            asentados, pred = self._dijkstra([(s, 0.0, 0.0, 0.0)], objetivos, weight, dia)
+            nodos, valores = extractor.agregar_arbol(pred)
+            local[nodos] = np.arange(len(nodos))
+            for j, t in enumerate(destinos_idx.tolist()):
+                if t in asentados:
+                    _, distancia[i, j], tiempo[i, j] = asentados[t]
+                    crudos[i, j] = valores[local[t]] if t != s else 0.0
+            local[nodos] = -1
+        return distancia, tiempo, extractor.finalizar(crudos)
+
+    def _origen_arista(self):
+        """Nodo de origen de cada arista CSR (lista cacheada)."""
+        if "_origen" not in self._listas:
+            conteo = np.diff(self.indptr)
+            self._listas["_origen"] = np.repeat(
+                np.arange(self.n_nodos, dtype=np.int64), conteo
+            ).tolist()
+        return self._listas["_origen"]
+
+
+class PuntoRed:
+    """Punto de la red: un nodo real o una posición sobre una arista (nodo virtual)."""
+
+    __slots__ = ("nodo", "arista", "reversa", "fraccion", "lat", "lon")
+
+    def __init__(self, nodo=-1, arista=-1, reversa=-1, fraccion=0.0, lat=None, lon=None):
+        self.nodo = nodo
+        self.arista = arista
+        self.reversa = reversa
+        self.fraccion = fraccion
+        self.lat = lat
+        self.lon = lon
+
+    @property
+    def virtual(self):
+        return self.arista >= 0
+
+    def posiciones(self):
+        """{arista: fracción} del punto sobre su arista y su reversa."""
+        pos = {self.arista: self.fraccion}
+        if self.reversa >= 0:
+            pos[self.reversa] = 1.0 - self.fraccion
+        return pos
+
+
+class MatrizRutas:
+    """Resultado de MotorRutas.matriz: distancias (m), tiempos (seg) y predecesores.
+
+    predecesores[i] es un dict {nodo interno v: arista CSR por la que se llega
+    a v} de la búsqueda desde el origen i (solo los nodos alcanzados; las
+    semillas no están); llegada[i, j] es el nodo real por el que se entra al
+    punto j (-2 si el tramo no sale de la arista común, -3 si el costo vino de
+    un cache). Con jerarquía no hay predecesores y los tramos se resuelven con
+    una consulta CH puntual; los tramos de cache o de una matriz sin caminos,
+    con una búsqueda puntual.
+    """
+
+    def __init__(self, motor, puntos, distancia, tiempo, predecesores, llegada,
+                 salidas=None, llegadas=None, weight="length", dia=None):
+        self.motor = motor
+        self.puntos = puntos
+        self.distancia = distancia
+        self.tiempo = tiempo
+        self.predecesores = predecesores
+        self.llegada = llegada
+        self.salidas = salidas
+        self.llegadas = llegadas
+        self.weight = weight
+        self.dia = dia
+        self._tramos = {}
+
+    def _nodos(self, i, j):
+        """Nodos internos del tramo i -> j."""
+        if self.llegada[i, j] == -2:
+            return []
+        jerarquia = self.motor._jerarquia(self.weight, self.dia)
+        if self.predecesores is None and jerarquia is not None:
+            return jerarquia.ruta_semillas(self.salidas[i], self.llegadas[j])[0]
+        if self.predecesores is None or self.llegada[i, j] == -3:
+            return self._buscar_tramo(i, j)
+        origenes = self.motor._origen_arista()
+        fila = self.predecesores[i]
+        v = int(self.llegada[i, j])
+        nodos = [v]
+        while v in fila:
+            v = origenes[fila[v]]
+            nodos.append(v)
+        nodos.reverse()
+        return nodos
+
+    def _buscar_tramo(self, i, j):
+        """Búsqueda puntual de un tramo sin predecesores (costo de `conocidas` o caminos=False)."""
+        if (i, j) not in self._tramos:
+            objetivos = {nodo for nodo, *_ in self.llegadas[j]}
+            asentados, pred = self.motor._dijkstra(self.salidas[i], objetivos, self.weight, self.dia)
+            # mismo desempate que en MotorRutas.matriz: la primera llegada de menor costo
+            mejor, v = math.inf, None
+            for nodo, w0, _, _ in self.llegadas[j]:
+                if nodo in asentados and asentados[nodo][0] + w0 < mejor:
+                    mejor, v = asentados[nodo][0] + w0, nodo
+            nodos = []
+            if v is not None:
+                origenes = self.motor._origen_arista()
+                nodos = [v]
+                while v in pred:
+                    v = origenes[pred[v]]
+                    nodos.append(v)
+                nodos.reverse()
+            self._tramos[(i, j)] = nodos
+        return self._tramos[(i, j)]
+
+    def camino(self, i, j):
+        """Reconstruye el tramo i -> j sin volver a buscar; retorna path (osmids), dist, t."""
+        if not np.isfinite(self.distancia[i, j]):
+            return None, np.nan, np.nan
+        ids = self.motor.node_ids
+        return ([int(ids[k]) for k in self._nodos(i, j)],
+                float(self.distancia[i, j]), float(self.tiempo[i, j]))
+
+    def caracteristicas(self, tramos):
+        """Features de camino (FEATURES_CAMINO) de recorrer los tramos [(i, j), ...] en orden."""
+        return self.motor.caracteristicas().de_tramos(self._nodos(i, j) for i, j in tramos)
+
+    def coordenadas(self, i, j):
+        """[[lat, lon], ...] del tramo i -> j, incluyendo los puntos virtuales."""
+        if not np.isfinite(self.distancia[i, j]):
+            return None
+        nodos = self._nodos(i, j)
+        coords = np.column_stack((self.motor.y[nodos], self.motor.x[nodos])).tolist() if nodos else []
+        a, b = self.puntos[i], self.puntos[j]
+        if a.virtual:
+            coords.insert(0, [a.lat, a.lon])
+        if b.virtual:
+            coords.append([b.lat, b.lon])
+        return coords
@@ -0,0 +1,224 @@
+"""
+registro.py
+
+- Registro de artefactos de modelos en la tabla ModeloML (versión, formato,
+  esquema de features y metadatos).
+- Cada worker carga de forma perezosa el modelo `activo` y lo reemplaza en
+  caliente cuando se activa otro: el nuevo se carga en un hilo y recién al
+  terminar sustituye al anterior (que sigue sirviendo mientras tanto).
+- Cada artefacto de ml/modelos/<version>/ lleva su descriptor (artefacto.json)
+  con el esquema: sin la tabla, el respaldo sabe qué columnas espera.
+- Junto al modelo principal se carga su modelo de servicio de 3 features
+  (metadatos['legado']): las solicitudes que solo traen dist_m,
+  base_time_sec e is_thursday se responden con ése.
+"""
+
+import os
+import json
+import time
+import glob
+import threading
+
+from ml.bosque import BosquePlano
+from ml.caracteristicas import ESQUEMA_LEGADO
+
+MODELOS_DIR = os.path.join(os.path.dirname(__file__), "modelos")
+
+# Artefactos previos al registro (se usan si la tabla no tiene modelo activo)
+LEGADO_NPZ = os.path.join(os.path.dirname(__file__), "model_rf.npz")
+LEGADO_PKL = os.path.join(os.path.dirname(__file__), "model_rf.pkl")
+
+# Descripción (esquema, formato, metadatos) junto a cada artefacto de ml/modelos/<version>/
+DESCRIPTOR = "artefacto.json"
+
+
+def guardar_descriptor(directorio, artefacto):
+    """Escribe el dict del artefacto junto a sus archivos (se lee sin la base)."""
+    ruta = os.path.join(directorio, DESCRIPTOR)
+    with open(ruta + ".tmp", "w") as f:
+        json.dump(artefacto, f)
+    os.replace(ruta + ".tmp", ruta)
+
+
+def leer_descriptor(directorio):
+    """Dict del artefacto de un directorio versionado (None si no tiene descriptor)."""
+    ruta = os.path.join(directorio, DESCRIPTOR)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta) as f:
+        return json.load(f)
+
+
+def cargar_artefacto(ruta_archivo, formato):
+    """Abre un artefacto según su formato ('bosque_npz' o 'joblib')."""
+    if formato == "bosque_npz":
+        return BosquePlano.cargar(ruta_archivo)
+    import joblib
+    modelo = joblib.load(ruta_archivo)
+    # Inferencia en lotes chicos: un hilo por predict (n_jobs=-1) cuesta más que el cálculo
+    if hasattr(modelo, "n_jobs"):
+        modelo.n_jobs = 1
+    return modelo
+
+
+def registrar_modelo(db, ModeloML, artefacto, activar=True):
+    """
+    Inserta una fila ModeloML para un artefacto entrenado (dict devuelto por
+    ruta_modelo.main) y, si `activar`, la deja como único modelo activo.
+    """
+    fila = ModeloML(
+        nombre=artefacto.get("nombre", "tiempo_ruta"),
+        tipo=artefacto.get("tipo", "RandomForest"),
+        ruta_archivo=artefacto["ruta_archivo"],
+        formato=artefacto.get("formato", "bosque_npz"),
+        version=artefacto["version"],
+        esquema=artefacto.get("esquema"),
+        metadatos=artefacto.get("metadatos"),
+        activo=False,
+    )
+    db.session.add(fila)
+    db.session.flush()
+    if activar:
+        activar_modelo(db, ModeloML, fila.id)
+    db.session.commit()
+    return fila
+
+
+def activar_modelo(db, ModeloML, modelo_id):
+    """Deja activo solo el modelo `modelo_id` (no hace commit)."""
+    ModeloML.query.filter(ModeloML.id != modelo_id, ModeloML.activo.is_(True)).update(
+        {"activo": False}, synchronize_session=False)
+    ModeloML.query.filter_by(id=modelo_id).update({"activo": True}, synchronize_session=False)
+
+
+class RegistroModelos:
+    """Modelo vigente de este proceso, sincronizado con la fila activa de ModeloML."""
+
+    def __init__(self, ModeloML, intervalo_s=10.0):
+        self.ModeloML = ModeloML
+        self.intervalo_s = float(intervalo_s)
+        # (modelo, info, {esquema: modelo}) se reemplaza entero: la asignación es atómica
+        self._vigente = (None, None, {})
+        self._cargando = None
+        self._ultima_revision = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def modelo(self):
+        return self._vigente[0]
+
+    @property
+    def info(self):
+        return self._vigente[1]
+
+    def por_esquema(self):
+        """{esquema (tupla): modelo} vigentes, el principal primero (leídos de una sola vez)."""
+        return self._vigente[2]
+
+    def elegir(self, features):
+        """
+        (modelo, esquema) vigente para `features`: el primero cuyo esquema
+        viene completo (el principal antes que el de servicio). Si ninguno
+        está completo, el principal (faltantes() dice qué falta);
+        (None, ESQUEMA_LEGADO) si no hay modelo.
+        """
+        modelos = self.por_esquema()
+        for esquema, modelo in modelos.items():
+            if all(features.get(c) is not None for c in esquema):
+                return modelo, list(esquema)
+        for esquema, modelo in modelos.items():
+            return modelo, list(esquema)
+        return None, list(ESQUEMA_LEGADO)
+
+    def verificar(self, forzar=False):
+        """
+        Consulta (como mucho cada `intervalo_s`) la fila activa; si cambió,
+        carga la nueva en segundo plano. Requiere contexto de aplicación.
+        La primera carga es síncrona para no responder sin modelo. Si la base
+        no responde, se sigue con el modelo cargado; los archivos de
+        ml/modelos/ solo se usan cuando todavía no hay ninguno.
+        """
+        ahora = time.monotonic()
+        if not forzar and self.modelo is not None and ahora - self._ultima_revision < self.intervalo_s:
+            return self.modelo
+        self._ultima_revision = ahora
+        try:
+            fila = (self.ModeloML.query.filter_by(activo=True)
+                    .order_by(self.ModeloML.fecha_entrenamiento.desc(), self.ModeloML.id.desc()).first())
+        except Exception as e:
+            print(f"Registro de modelos no disponible: {e}")
+            self.ModeloML.query.session.rollback()
+            if self.modelo is not None:
+                return self.modelo
+            fila = None
+
+        info = self._info_fila(fila) if fila is not None and fila.ruta_archivo else self._info_legado()
+        if info is None or (self.info is not None and info["clave"] == self.info["clave"]):
+            return self.modelo
+        if self.modelo is None:
+            self._cargar(info)
+        else:
+            with self._lock:
+                if self._cargando == info["clave"]:
+                    return self.modelo
+                self._cargando = info["clave"]
+            threading.Thread(target=self._cargar, args=(info,), daemon=True).start()
+        return self.modelo
+
+    def _cargar(self, info):
+        try:
+            modelo = cargar_artefacto(info["ruta_archivo"], info["formato"])
+            modelos = {tuple(info["esquema"]): modelo}
+            servicio = info.get("servicio")
+            if servicio and tuple(servicio["esquema"]) not in modelos:
+                try:
+                    modelos[tuple(servicio["esquema"])] = cargar_artefacto(
+                        servicio["ruta_archivo"], servicio.get("formato", "bosque_npz"))
+                except Exception as e:
+                    print(f"Modelo de servicio de {info['clave']} no disponible: {e}")
+            self._vigente = (modelo, info, modelos)
+            print(f"Modelo ML cargado: {info['clave']}")
+        except Exception as e:
+            print(f"Error cargando modelo ML {info['clave']}: {e}")
+        finally:
+            with self._lock:
+                if self._cargando == info["clave"]:
+                    self._cargando = None
+
+    @staticmethod
+    def _info_fila(fila):
+        return {
+            "clave": f"modelo_ml:{fila.id}",
+            "id": fila.id,
+            "version": fila.version,
+            "ruta_archivo": fila.ruta_archivo,
+            "formato": fila.formato or ("bosque_npz" if fila.ruta_archivo.endswith(".npz") else "joblib"),
+            "esquema": fila.esquema or ESQUEMA_LEGADO,
+            "servicio": (fila.metadatos or {}).get("legado"),
+        }
+
+    @staticmethod
+    def _info_legado():
+        """
+        Último artefacto de ml/modelos/ con descriptor (su esquema viene de
+        ahí) o, si no hay, los archivos sueltos de antes (esquema legado).
+        """
+        for directorio in sorted(glob.glob(os.path.join(MODELOS_DIR, "*")), reverse=True):
+            try:
+                artefacto = leer_descriptor(directorio)
+            except (OSError, ValueError) as e:
+                print(f"Descriptor ignorado ({directorio}): {e}")
+                continue
+            if not artefacto or not os.path.exists(artefacto.get("ruta_archivo", "")):
+                continue
+            return {"clave": f"archivo:{artefacto['ruta_archivo']}", "id": None,
+                    "version": artefacto.get("version"), "ruta_archivo": artefacto["ruta_archivo"],
+                    "formato": artefacto.get("formato", "bosque_npz"),
+                    "esquema": artefacto.get("esquema") or ESQUEMA_LEGADO,
+                    "servicio": (artefacto.get("metadatos") or {}).get("legado")}
+        for ruta, formato in ((LEGADO_NPZ, "bosque_npz"), (LEGADO_PKL, "joblib")):
+            if os.path.exists(ruta):
+                return {"clave": f"archivo:{ruta}", "id": None, "version": None,
+                        "ruta_archivo": ruta, "formato": formato, "esquema": ESQUEMA_LEGADO,
+                        "servicio": None}
+        return None
@@ -3,26 +3,59 @@ ruta_modelo.py
 
 - Construye / descarga la red vial (zona El Alto).
 - Aplica restricciones (cerrado parcial) alrededor de una lista de ferias.
-- Genera dataset O-D simulado (normal vs. feria).
-- Entrena RandomForest y guarda el modelo (joblib).
+- Exporta un snapshot binario (CSR .npy) del grafo preparado para los workers,
+  con las calles cerradas por ferias como máscara por día de la semana.
+- Preprocesa jerarquías de contracción (normal y una por patrón de cierres).
+- Genera dataset O-D simulado (normal vs. feria) con búsquedas uno-a-muchos en
+  paralelo, con las features de camino de ml/caracteristicas.py.
+- Entrena RandomForest y guarda el modelo (joblib) y su versión aplanada (.npz),
+  más uno de servicio con las 3 features de siempre para los clientes que no
+  mandan features de camino.
 - Exporta opcionalmente geojson con puntos de ferias.
 """
 
 import os
+import sys
+import glob
 import joblib
+import datetime
 import numpy as np
 import pandas as pd
 import geopandas as gpd
-import networkx as nx
 import osmnx as ox
+import shapely
 from shapely.geometry import Point
+from shapely.strtree import STRtree
+
+if __name__ == "__main__" and not __package__:
+    # `python ml/ruta_modelo.py` desde backend/: el paquete ml se resuelve desde ahí
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ml.motor_rutas import MotorRutas, PuntoRed
+from ml.cache_distancias import clave_punto, modo_busqueda
+from ml.caracteristicas import MODEL_FEATURES, FEATURES_CAMINO, ESQUEMA_LEGADO
+from ml.jerarquia import JerarquiaContraccion
+from ml.bosque import BosquePlano
+from ml.registro import MODELOS_DIR, guardar_descriptor
 
 # --------------------------
 # CONFIG
 # --------------------------
 MODEL_DIR = os.path.join(os.path.dirname(__file__), "")
 MODEL_PATH = os.path.join(MODEL_DIR, "model_rf.pkl")
+FOREST_PATH = os.path.join(MODEL_DIR, "model_rf.npz")  # bosque aplanado para servir sin sklearn
+
 G_CACHE_PATH = os.path.join(MODEL_DIR, "graph_gpkg.gpkg")  # opcional cache
+SNAPSHOT_DIR = os.path.join(MODEL_DIR, "grafo_snapshot")
+CH_NORMAL_PATH = os.path.join(MODEL_DIR, "ch_normal.npz")
+CH_CIERRE_PATH = os.path.join(MODEL_DIR, "ch_cierre_{}.npz")  # {} = huella de los cierres
+
+# Tamaño y semilla del dataset simulado
+SIM_N_PAIRS = int(os.getenv("SIM_N_PAIRS", 100000))
+SIM_SEED = int(os.getenv("SIM_SEED", 42))
+
+# Días de feria (0 = lunes ... 6 = domingo): las calles cercanas se cierran el jueves
+FERIA_DIAS = (3,)
 
 # Lista de 14 ferias (usar tus coordenadas georreferenciadas reales si las tienes)
 # Formato: (lat, lon)
@@ -103,151 +136,295 @@ def ensure_edge_speeds(G, fallback_kph=30.0):
         speed_mps = data["speed_kph"] * 1000.0 / 3600.0
         data["travel_time"] = data["length"] / max(speed_mps, 1e-3)
 
-def graph_with_ferias_restrictions(G, feria_points, buffer_m=500):
+def _normalizar_ferias(ferias, buffer_m=500, dias=FERIA_DIAS):
     """
-    Crea una copia del grafo y elimina aristas cuyo midpoint cae dentro de
-    cualquiera de los buffers alrededor de las ferias (lista de (lat,lon)).
-    Devuelve grafo modificado.
+    Acepta ferias como (lat, lon), (lat, lon, radio_m, dias) o dicts con
+    lat/lon/radio_m/dias. Retorna arreglos (lat, lon, radio_m, bits de días).
     """
-    # Proyectar
-    G_proj = ox.projection.project_graph(G)
-    nodes_proj, edges_proj = ox.graph_to_gdfs(G_proj, nodes=True, edges=True)
-
-    # Construir buffer combinado (CRS proyectado)
-    pts_proj = []
-    for lat, lon in feria_points:
-        pt = gpd.GeoSeries([Point(lon, lat)], crs="EPSG:4326").to_crs(nodes_proj.crs).geometry.values[0]
-        pts_proj.append(pt)
-    combined = gpd.GeoSeries(pts_proj, crs=nodes_proj.crs).unary_union.buffer(buffer_m)
-
-    edges_proj = edges_proj.copy()
-    edges_proj["midpoint"] = edges_proj.geometry.interpolate(0.5, normalized=True)
-    to_remove = edges_proj[edges_proj["midpoint"].within(combined)].reset_index()
-
-    G_mod = G_proj.copy()
-    for idx, row in to_remove.iterrows():
-        u, v, k = row["u"], row["v"], row["key"]
-        if G_mod.has_edge(u, v, k):
-            try:
-                G_mod.remove_edge(u, v, k)
-            except Exception:
-                pass
-
-    # reproyectar a WGS84 y devolver
-    G_mod_wgs = ox.projection.project_graph(G_mod, to_crs="EPSG:4326")
-    if G_mod_wgs.number_of_edges() > 0:
-        G_mod_wgs = ox.utils_graph.get_largest_component(G_mod_wgs, strongly=False)
-    return G_mod_wgs
-
-def shortest_route_stats(G, orig_node, dest_node, weight="length"):
-    """Calcula ruta más corta entre nodos; retorna path, dist (m), t (seg)."""
-    try:
-        path = nx.shortest_path(G, orig_node, dest_node, weight=weight)
-        dist = 0.0
-        tsec = 0.0
-        for i in range(len(path)-1):
-            u, v = path[i], path[i+1]
-            # elegir la mejor key (menor weight)
-            best = None
-            bestw = float("inf")
-            for k in G[u][v]:
-                w = G[u][v][k].get(weight, float("inf"))
-                if w < bestw:
-                    bestw = w
-                    best = G[u][v][k]
-            if best:
-                dist += best.get("length", 0.0)
-                tsec += best.get("travel_time", 0.0)
-        return path, float(dist), float(tsec)
-    except (nx.NetworkXNoPath, nx.NodeNotFound):
-        return None, np.nan, np.nan
-
-def pick_random_nodes(G, center=None, max_nodes=200, radius_m=1200):
-    """Elige hasta max_nodes nodos aleatorios dentro de radius_m del centro."""
-    nodes_gdf, edges = ox.graph_to_gdfs(G, nodes=True, edges=True)
-    
-    # proyectar automáticamente a UTM correcto
-    nodes_proj = ox.projection.project_gdf(nodes_gdf)
-    utm_crs = nodes_proj.crs
-    
+    lats, lons, radios, bits = [], [], [], []
+    for f in ferias:
+        if isinstance(f, dict):
+            lat, lon, radio, d = f["lat"], f["lon"], f.get("radio_m", buffer_m), f.get("dias", dias)
+        else:
+            lat, lon = f[0], f[1]
+            radio = f[2] if len(f) > 2 else buffer_m
+            d = f[3] if len(f) > 3 else dias
+        lats.append(lat)
+        lons.append(lon)
+        radios.append(radio)
+        bits.append(sum(1 << int(x) for x in d))
+    return (np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64),
+            np.asarray(radios, dtype=np.float64), np.asarray(bits, dtype=np.uint8))
+
+def feria_closures(motor, ferias, buffer_m=500, dias=FERIA_DIAS):
+    """
+    Máscara de cierres por arista del motor: uint8[] donde el bit d indica que
+    el punto medio de la arista cae en el buffer de alguna feria del día d.
+    Proyecta todas las ferias y todas las aristas de una vez (proyección local
+    del motor) y consulta los puntos medios contra un STRtree de buffers.
+    """
+    lats, lons, radios, bits = _normalizar_ferias(ferias, buffer_m, dias)
+    cierres = np.zeros(len(motor.indices), dtype=np.uint8)
+    if len(lats) == 0:
+        return cierres
+
+    fx, fy = motor.proyectar(lons, lats)
+    buffers = shapely.buffer(shapely.points(fx, fy), radios)
+
+    gx, gy = motor.proyectar(motor.geom_x, motor.geom_y)
+    conteo = np.diff(motor.geom_ptr)
+    lineas = shapely.linestrings(np.column_stack((gx, gy)), indices=np.repeat(np.arange(len(conteo)), conteo))
+    medios = shapely.line_interpolate_point(lineas, 0.5, normalized=True)
+
+    aristas, ferias_idx = STRtree(buffers).query(medios, predicate="within")
+    np.bitwise_or.at(cierres, aristas, bits[ferias_idx])
+    return cierres
+
+def route_matrix(G, nodes, weight="length", dia=None, pares=None, caminos=True):
+    """Matriz O-D entre nodos (osmids o PuntoRed) con un Dijkstra uno-a-muchos por origen.
+
+    Con `dia` (0 = lunes ... 6 = domingo) se evitan las calles cerradas ese día.
+    Con `pares` (DistanciasPares) los pares ya guardados no se buscan y los
+    nuevos se agregan al almacén.
+    Con `caminos=False` no se guardan predecesores (solo se necesitan costos).
+    Retorna un MatrizRutas con .distancia (m), .tiempo (seg), .predecesores
+    y .camino(i, j) para reconstruir tramos sin buscar de nuevo.
+    """
+    motor = G if isinstance(G, MotorRutas) else MotorRutas.desde_grafo(G)
+    if pares is None:
+        return motor.matriz(nodes, weight=weight, dia=dia, caminos=caminos)
+    puntos = [p if isinstance(p, PuntoRed) else motor.punto_nodo(p) for p in nodes]
+    claves = [clave_punto(p) if p is not None else f"?{k}" for k, p in enumerate(puntos)]
+    modo = modo_busqueda(motor, weight, dia)
+    conocidas = pares.conocidas(claves, modo)
+    matriz = motor.matriz(puntos, weight=weight, dia=dia, conocidas=conocidas, caminos=caminos)
+    pares.guardar(claves, modo, matriz.distancia, matriz.tiempo, celdas=~np.isfinite(conocidas[0]))
+    return matriz
+
+def export_graph_snapshot(G, snapshot_dir=SNAPSHOT_DIR, ferias=None, buffer_m=500):
+    """
+    Compila el grafo preparado (con ensure_edge_speeds aplicado) y lo guarda
+    como snapshot binario: CSR, coordenadas, longitudes, velocidades y tiempos.
+    Las aristas cercanas a `ferias` quedan cerradas en los días de cada feria.
+    Retorna el MotorRutas compilado.
+    """
+    motor = MotorRutas.desde_grafo(G)
+    if ferias:
+        cierres = feria_closures(motor, ferias, buffer_m)
+        for dia in range(7):
+            mascara = (cierres >> dia) & 1 == 1
+            if mascara.any():
+                motor.cerrar(mascara, (dia,))
+                print(f"Aristas cerradas el día {dia}:", int(mascara.sum()))
+    motor.guardar(snapshot_dir)
+    print("Snapshot del grafo guardado en:", snapshot_dir)
+    return motor
+
+def build_contraction_hierarchies(motor, weight="length"):
+    """
+    Preprocesa y guarda la jerarquía de contracción de la red completa y una
+    por cada patrón de cierres de la semana (p. ej. jueves de feria). Todas
+    usan la numeración de nodos del motor, así éste elige según el día sin
+    reindexar.
+    """
+    ch_normal = JerarquiaContraccion.construir(motor, weight=weight)
+    ch_normal.guardar(CH_NORMAL_PATH)
+    jerarquias = [ch_normal]
+    print("Jerarquía guardada en:", CH_NORMAL_PATH)
+    for huella, (cerradas, dias) in motor.patrones_cierre().items():
+        ch = JerarquiaContraccion.construir(motor, weight=weight, cerradas=cerradas)
+        path = CH_CIERRE_PATH.format(huella)
+        ch.guardar(path)
+        jerarquias.append(ch)
+        print(f"Jerarquía con cierres (días {dias}) guardada en:", path)
+    return jerarquias
+
+def load_contraction_hierarchies(motor):
+    """Adjunta al motor las jerarquías guardadas que correspondan a su red."""
+    for path in [CH_NORMAL_PATH] + sorted(glob.glob(CH_CIERRE_PATH.format("*"))):
+        if not os.path.exists(path):
+            continue
+        try:
+            motor.adjuntar_jerarquia(JerarquiaContraccion.cargar(path))
+            print("Jerarquía de contracción cargada:", os.path.basename(path))
+        except Exception as e:
+            print(f"Jerarquía ignorada ({os.path.basename(path)}): {e}")
+
+def pick_random_nodes(motor, rng, center=None, max_nodes=200, radius_m=1200):
+    """Elige hasta max_nodes osmids aleatorios dentro de radius_m del centro (lat, lon)."""
+    px, py = motor.proyectar(motor.x, motor.y)
     if center is None:
-        center = nodes_proj.unary_union.centroid
+        cx, cy = px.mean(), py.mean()
     else:
-        center = gpd.GeoSeries([Point(center[1], center[0])], crs="EPSG:4326").to_crs(utm_crs).geometry.values[0]
-    
-    nodes_proj["dist_center"] = nodes_proj.geometry.distance(center)
-    sub = nodes_proj[nodes_proj["dist_center"] <= radius_m]
-    if len(sub) < 10:
-        sub = nodes_proj
-    choices = sub.sample(min(max_nodes, len(sub)), random_state=42).index.tolist()
-    return choices
-
-def simulate_dataset(G_normal, G_feria, n_pairs=200, feria_center_latlon=None):
-    """Genera pares O-D simulados (dist, tiempo base, time_real) con thursday/no."""
-    od_nodes = pick_random_nodes(G_normal, center=feria_center_latlon, max_nodes=300, radius_m=1500)
-    rows = []
-    attempts = 0
-    while len(rows) < n_pairs and attempts < n_pairs*20:
-        attempts += 1
-        o, d = np.random.choice(od_nodes, 2, replace=False)
-        p_norm, dist_norm_m, t_norm_sec = shortest_route_stats(G_normal, o, d, weight="length")
-        if p_norm is None or not np.isfinite(dist_norm_m):
-            continue
-        # decide si es jueves
-        is_thursday = np.random.choice([0,1], p=[0.7,0.3])  # más no-jueves
-        G_used = G_feria if is_thursday else G_normal
-        p_used, dist_used_m, t_used_sec = shortest_route_stats(G_used, o, d, weight="length")
-        if p_used is None or not np.isfinite(dist_used_m):
-            continue
-        feria_factor = 1.0 + (0.2 + 0.4*np.random.rand()) if is_thursday else 1.0 + (0.0 + 0.1*np.random.rand())
-        noise = np.random.normal(loc=1.0, scale=0.05)
-        time_real_sec = t_used_sec * feria_factor * max(noise, 0.8)
-        rows.append({
-            "orig": int(o), "dest": int(d),
-            "dist_m": float(dist_used_m),
-            "base_time_sec": float(t_used_sec),
-            "time_real_sec": float(time_real_sec),
-            "is_thursday": int(is_thursday)
-        })
-    df = pd.DataFrame(rows)
+        cx, cy = motor.proyectar(center[1], center[0])
+    cerca = np.flatnonzero(np.hypot(px - cx, py - cy) <= radius_m)
+    if len(cerca) < 10:
+        cerca = np.arange(motor.n_nodos)
+    elegidos = rng.choice(cerca, size=min(max_nodes, len(cerca)), replace=False)
+    return motor.node_ids[elegidos]
+
+# Motor de cada proceso de la simulación (abierto desde el snapshot con mmap).
+# Sin jerarquías: caracteristicas_od necesita el árbol de búsqueda completo.
+_MOTOR_SIM = None
+
+def _init_simulacion(snapshot_dir):
+    global _MOTOR_SIM
+    _MOTOR_SIM = MotorRutas.cargar(snapshot_dir, mmap_mode="r")
+
+def _distancias_lote(origenes, destinos, dia_feria):
+    """Distancias/tiempos/features (ruta por length) de un lote de orígenes: red normal y día de feria."""
+    normal = _MOTOR_SIM.caracteristicas_od(origenes, destinos, weight="length")
+    feria = _MOTOR_SIM.caracteristicas_od(origenes, destinos, weight="length", dia=dia_feria)
+    return normal, feria
+
+def simulate_dataset(motor, n_pairs=200, feria_center_latlon=None, seed=42,
+                     workers=None, snapshot_dir=SNAPSHOT_DIR, p_thursday=0.3):
+    """
+    Genera pares O-D simulados (MODEL_FEATURES y time_real) con thursday/no.
+
+    Una búsqueda uno-a-muchos por origen muestreado hacia todos los destinos
+    muestreados (red normal y red con cierres de feria), repartida en un pool
+    de procesos que abren el snapshot; las features de camino salen del árbol
+    de cada búsqueda. Ruido y factores de feria se generan vectorizados con un
+    np.random.Generator semillado (resultado reproducible).
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    rng = np.random.default_rng(seed)
+    # nodos suficientes para n_pairs pares distintos (con holgura por inalcanzables)
+    n_nodos = max(300, int(np.ceil(np.sqrt(n_pairs * 1.5))) + 1)
+    od_nodes = pick_random_nodes(motor, rng, center=feria_center_latlon, max_nodes=n_nodos, radius_m=1500)
+    dia_feria = FERIA_DIAS[0]
+
+    workers = workers or os.cpu_count() or 1
+    tam = max(1, int(np.ceil(len(od_nodes) / (workers * 4))))
+    lotes = [od_nodes[k:k + tam] for k in range(0, len(od_nodes), tam)]
+    if workers == 1:
+        global _MOTOR_SIM
+        _MOTOR_SIM = motor
+        resultados = [_distancias_lote(lote, od_nodes, dia_feria) for lote in lotes]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_simulacion,
+                                 initargs=(snapshot_dir,)) as pool:
+            resultados = list(pool.map(_distancias_lote, lotes, [od_nodes] * len(lotes), [dia_feria] * len(lotes)))
+    dist_norm = np.vstack([r[0][0] for r in resultados])
+    t_norm = np.vstack([r[0][1] for r in resultados])
+    dist_feria = np.vstack([r[1][0] for r in resultados])
+    t_feria = np.vstack([r[1][1] for r in resultados])
+    camino_norm = {c: np.vstack([r[0][2][c] for r in resultados]) for c in FEATURES_CAMINO}
+    camino_feria = {c: np.vstack([r[1][2][c] for r in resultados]) for c in FEATURES_CAMINO}
+
+    # pares válidos: distintos y con ruta en ambas redes
+    oi, di = np.nonzero(np.isfinite(dist_norm) & np.isfinite(dist_feria))
+    distintos = oi != di
+    oi, di = oi[distintos], di[distintos]
+    if len(oi) == 0:
+        return pd.DataFrame(columns=["orig", "dest", *MODEL_FEATURES, "time_real_sec"])
+    sel = rng.choice(len(oi), size=n_pairs, replace=n_pairs > len(oi))
+    oi, di = oi[sel], di[sel]
+
+    is_thursday = rng.random(n_pairs) < p_thursday
+    dist_m = np.where(is_thursday, dist_feria[oi, di], dist_norm[oi, di])
+    t_sec = np.where(is_thursday, t_feria[oi, di], t_norm[oi, di])
+    u = rng.random(n_pairs)
+    feria_factor = np.where(is_thursday, 1.2 + 0.4 * u, 1.0 + 0.1 * u)
+    noise = np.maximum(rng.normal(loc=1.0, scale=0.05, size=n_pairs), 0.8)
+
+    df = pd.DataFrame({
+        "orig": od_nodes[oi].astype(np.int64),
+        "dest": od_nodes[di].astype(np.int64),
+        "dist_m": dist_m,
+        "base_time_sec": t_sec,
+        "time_real_sec": t_sec * feria_factor * noise,
+        "is_thursday": is_thursday.astype(int),
+    })
+    for c in FEATURES_CAMINO:
+        df[c] = np.where(is_thursday, camino_feria[c][oi, di], camino_norm[c][oi, di])
     return df
 
 # --------------------------
 # ENTRENAMIENTO
 # --------------------------
 
-def train_and_save_model(df, model_path=MODEL_PATH):
+def train_and_save_model(df, model_path=MODEL_PATH, forest_path=FOREST_PATH, features=MODEL_FEATURES):
     from sklearn.ensemble import RandomForestRegressor
-    features = ["dist_m", "base_time_sec", "is_thursday"]
     target = "time_real_sec"
-    X = df[features]
+    X = df[list(features)]
     y = df[target]
     model = RandomForestRegressor(n_estimators=200, random_state=42, n_jobs=-1)
     model.fit(X, y)
     joblib.dump(model, model_path)
     print("Modelo guardado en:", model_path)
+    BosquePlano.desde_sklearn(model).guardar(forest_path)
+    print("Bosque aplanado guardado en:", forest_path)
     return model
 
+def entrenar_version(df, metadatos=None, modelos_dir=MODELOS_DIR):
+    """
+    Entrena una versión en su propio directorio (modelos_dir/<version>/): el
+    bosque con MODEL_FEATURES (find_route calcula las features de camino) y
+    uno de servicio con ESQUEMA_LEGADO para quien solo manda dist_m,
+    base_time_sec e is_thursday. Retorna el artefacto para el registro
+    (ModeloML), que queda también como descriptor junto a los archivos.
+    """
+    version = datetime.datetime.now().strftime("%Y%m%d%H%M%S") + "-" + os.urandom(3).hex()
+    out_dir = os.path.join(modelos_dir, version)
+    os.makedirs(out_dir, exist_ok=True)
+    pkl, npz = os.path.join(out_dir, "model_rf.pkl"), os.path.join(out_dir, "model_rf.npz")
+    pkl_legado, npz_legado = os.path.join(out_dir, "model_rf_legado.pkl"), os.path.join(out_dir, "model_rf_legado.npz")
+    model = train_and_save_model(df, model_path=pkl, forest_path=npz)
+    train_and_save_model(df, model_path=pkl_legado, forest_path=npz_legado, features=ESQUEMA_LEGADO)
+    artefacto = {
+        "nombre": "tiempo_ruta",
+        "tipo": type(model).__name__,
+        "version": version,
+        "ruta_archivo": npz,
+        "formato": "bosque_npz",
+        "esquema": MODEL_FEATURES,
+        "metadatos": {
+            "n_filas": int(len(df)),
+            "n_estimators": int(model.n_estimators),
+            **(metadatos or {}),
+            "respaldo_joblib": pkl,
+            # modelo de servicio para solicitudes sin features de camino
+            "legado": {"ruta_archivo": npz_legado, "formato": "bosque_npz",
+                       "esquema": ESQUEMA_LEGADO, "respaldo_joblib": pkl_legado},
+        },
+    }
+    guardar_descriptor(out_dir, artefacto)
+    return artefacto
+
 # --------------------------
 # MAIN: pipeline completo
 # --------------------------
-def main():
-    print("Cargando grafo...")
+def main(progreso=None):
+    """
+    Pipeline completo. `progreso(etapa, mensaje)` (opcional) recibe el avance
+    por etapa: graph, restrictions, simulate, fit, export.
+    """
+    def etapa(nombre, mensaje):
+        print(mensaje)
+        if progreso is not None:
+            progreso(nombre, mensaje)
+
+    etapa("graph", "Cargando grafo...")
     G_normal = load_graph_z16()
     ensure_edge_speeds(G_normal, fallback_kph=30.0)
 
-    print("Aplicando restricciones por ferias...")
-    # Crea grafo con restricciones por todas las ferias
-    G_feria = graph_with_ferias_restrictions(G_normal, FERIA_POINTS, buffer_m=500)
-    ensure_edge_speeds(G_feria, fallback_kph=30.0)
+    etapa("restrictions", "Exportando snapshot binario del grafo (con cierres de feria)...")
+    motor = export_graph_snapshot(G_normal, ferias=FERIA_POINTS, buffer_m=500)
+
+    etapa("restrictions", "Preprocesando jerarquías de contracción...")
+    build_contraction_hierarchies(motor)
 
-    print("Generando dataset simulado...")
-    df = simulate_dataset(G_normal, G_feria, n_pairs=300, feria_center_latlon=FERIA_POINTS[0])
+    etapa("simulate", "Generando dataset simulado...")
+    df = simulate_dataset(motor, n_pairs=SIM_N_PAIRS, feria_center_latlon=FERIA_POINTS[0], seed=SIM_SEED)
     print("Filas generadas:", len(df))
 
-    print("Entrenando modelo RandomForest...")
-    model = train_and_save_model(df)
+    etapa("fit", f"Entrenando modelo RandomForest con {len(df)} filas...")
+    artefacto = entrenar_version(df, {"sim_seed": SIM_SEED, "grafo_version": motor.version})
 
+    etapa("export", "Exportando artefactos...")
     # exportar ferias a GeoJSON (opcional)
     gdf_ferias = gpd.GeoDataFrame({
         "id": list(range(1, len(FERIA_POINTS)+1)),
@@ -257,5 +434,7 @@ def main():
     gdf_ferias.to_file(out_geojson, driver="GeoJSON")
     print("Ferias guardadas en:", out_geojson)
 
+    return artefacto
+
 if __name__ == "__main__":
     main()
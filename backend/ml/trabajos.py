@@ -0,0 +1,254 @@
+"""
+trabajos.py
+
+- Trabajos de entrenamiento en segundo plano: cada uno corre ruta_modelo.main()
+  (completo) o historial.reentrenar_incremental() en un proceso aparte (spawn),
+  fuera de los workers HTTP.
+- Tabla local de trabajos y eventos de progreso en SQLite (ml/trabajos.db),
+  compartida por todos los workers de gunicorn.
+- Un lock de archivo serializa los entrenamientos: dos reentrenamientos nunca
+  escriben el snapshot, las jerarquías o los artefactos a la vez.
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import sqlite3
+import traceback
+import multiprocessing
+
+TRABAJOS_DB = os.path.join(os.path.dirname(__file__), "trabajos.db")
+LOCK_PATH = os.path.join(os.path.dirname(__file__), "entrenamiento.lock")
+
+# Etapas de cada tipo de trabajo, en orden
+ETAPAS = {
+    "entrenamiento": ("graph", "restrictions", "simulate", "fit", "export"),
+    "incremental": ("extract", "fit", "export"),
+}
+
+ACTIVOS = ("pendiente", "en_espera", "en_curso")
+
+# Segundos que un trabajo 'pendiente' puede estar sin pid (entre el INSERT y el
+# arranque de su proceso) antes de darlo por perdido
+GRACIA_PENDIENTE_S = float(os.getenv("TRABAJO_GRACIA_PENDIENTE_S", 60))
+
+
+def _conectar(db_path=TRABAJOS_DB):
+    con = sqlite3.connect(db_path, timeout=30)
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA journal_mode=WAL")
+    con.executescript("""
+        CREATE TABLE IF NOT EXISTS trabajos (
+            id TEXT PRIMARY KEY,
+            tipo TEXT NOT NULL,
+            estado TEXT NOT NULL,
+            etapa TEXT,
+            pid INTEGER,
+            creado REAL NOT NULL,
+            actualizado REAL NOT NULL,
+            resultado TEXT,
+            error TEXT,
+            registrado INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS eventos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            trabajo_id TEXT NOT NULL,
+            etapa TEXT,
+            mensaje TEXT,
+            ts REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_eventos_trabajo ON eventos (trabajo_id, id);
+    """)
+    return con
+
+
+def _actualizar(con, trabajo_id, **campos):
+    campos["actualizado"] = time.time()
+    columnas = ", ".join(f"{k} = ?" for k in campos)
+    con.execute(f"UPDATE trabajos SET {columnas} WHERE id = ?", (*campos.values(), trabajo_id))
+    con.commit()
+
+
+def _evento(con, trabajo_id, etapa, mensaje):
+    con.execute("INSERT INTO eventos (trabajo_id, etapa, mensaje, ts) VALUES (?, ?, ?, ?)",
+                (trabajo_id, etapa, mensaje, time.time()))
+    con.commit()
+
+
+def _vivo(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# --------------------------
+# API PARA LOS WORKERS HTTP
+# --------------------------
+
+def trabajo_activo(db_path=TRABAJOS_DB):
+    """
+    Id del trabajo pendiente/en curso de cualquier tipo (None si no hay).
+    Marca como error los huérfanos: los que tienen pid de un proceso que ya
+    no existe y los pendientes sin pid pasada la gracia de arranque.
+    """
+    con = _conectar(db_path)
+    try:
+        filas = con.execute(
+            f"SELECT id, estado, pid, creado FROM trabajos WHERE estado IN ({','.join('?' * len(ACTIVOS))}) ORDER BY creado",
+            ACTIVOS).fetchall()
+        for f in filas:
+            if f["pid"]:
+                vivo = _vivo(f["pid"])
+            else:
+                vivo = f["estado"] == "pendiente" and time.time() - f["creado"] < GRACIA_PENDIENTE_S
+            if not vivo:
+                _actualizar(con, f["id"], estado="error", error="El proceso del trabajo terminó inesperadamente")
+                continue
+            return f["id"]
+        return None
+    finally:
+        con.close()
+
+
+def lanzar_entrenamiento(tipo="entrenamiento", db_path=TRABAJOS_DB):
+    """Crea el trabajo ('entrenamiento' o 'incremental') y arranca su proceso; retorna (trabajo_id, proceso)."""
+    if tipo not in ETAPAS:
+        raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+    trabajo_id = uuid.uuid4().hex
+    ahora = time.time()
+    con = _conectar(db_path)
+    try:
+        con.execute("INSERT INTO trabajos (id, tipo, estado, creado, actualizado) VALUES (?, ?, 'pendiente', ?, ?)",
+                    (trabajo_id, tipo, ahora, ahora))
+        con.commit()
+        _evento(con, trabajo_id, None, "Trabajo creado")
+    finally:
+        con.close()
+    # spawn: no se heredan hilos, conexiones ni el estado de Flask del worker
+    proceso = multiprocessing.get_context("spawn").Process(
+        target=_ejecutar_entrenamiento, args=(trabajo_id, db_path, tipo), name=f"{tipo}-{trabajo_id[:8]}")
+    try:
+        proceso.start()
+    except Exception as e:
+        con = _conectar(db_path)
+        try:
+            _actualizar(con, trabajo_id, estado="error", error=f"No se pudo iniciar el proceso: {e}")
+            _evento(con, trabajo_id, None, f"Error: {e}")
+        finally:
+            con.close()
+        raise
+    con = _conectar(db_path)
+    try:
+        _actualizar(con, trabajo_id, pid=proceso.pid)
+    finally:
+        con.close()
+    return trabajo_id, proceso
+
+
+def obtener_trabajo(trabajo_id, db_path=TRABAJOS_DB):
+    """Estado del trabajo como dict (None si no existe)."""
+    con = _conectar(db_path)
+    try:
+        f = con.execute("SELECT * FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+        if f is None:
+            return None
+        etapa = f["etapa"]
+        etapas = ETAPAS.get(f["tipo"], ())
+        return {
+            "id": f["id"],
+            "tipo": f["tipo"],
+            "estado": f["estado"],
+            "etapa": etapa,
+            "etapas": list(etapas),
+            "progreso": round((etapas.index(etapa) if etapa in etapas else 0) / len(etapas), 2)
+                        if f["estado"] != "completado" else 1.0,
+            "creado": f["creado"],
+            "actualizado": f["actualizado"],
+            "resultado": json.loads(f["resultado"]) if f["resultado"] else None,
+            "error": f["error"],
+            "registrado": bool(f["registrado"]),
+        }
+    finally:
+        con.close()
+
+
+def eventos_trabajo(trabajo_id, desde=0, db_path=TRABAJOS_DB):
+    """Eventos de progreso con id > desde, en orden."""
+    con = _conectar(db_path)
+    try:
+        return [dict(f) for f in con.execute(
+            "SELECT id, etapa, mensaje, ts FROM eventos WHERE trabajo_id = ? AND id > ? ORDER BY id",
+            (trabajo_id, desde)).fetchall()]
+    finally:
+        con.close()
+
+
+def reclamar_registro(trabajo_id, db_path=TRABAJOS_DB):
+    """True solo para el primer worker que registra un trabajo completado."""
+    con = _conectar(db_path)
+    try:
+        cur = con.execute("UPDATE trabajos SET registrado = 1 WHERE id = ? AND estado = 'completado' AND registrado = 0",
+                          (trabajo_id,))
+        con.commit()
+        return cur.rowcount == 1
+    finally:
+        con.close()
+
+
+def anotar_resultado(trabajo_id, db_path=TRABAJOS_DB, **extra):
+    """Agrega claves al resultado (p. ej. el id de ModeloML registrado)."""
+    con = _conectar(db_path)
+    try:
+        f = con.execute("SELECT resultado FROM trabajos WHERE id = ?", (trabajo_id,)).fetchone()
+        resultado = json.loads(f["resultado"]) if f and f["resultado"] else {}
+        resultado.update(extra)
+        _actualizar(con, trabajo_id, resultado=json.dumps(resultado))
+    finally:
+        con.close()
+
+
+# --------------------------
+# PROCESO DEL TRABAJO
+# --------------------------
+
+def _ejecutar_entrenamiento(trabajo_id, db_path, tipo="entrenamiento"):
+    con = _conectar(db_path)
+
+    def progreso(etapa, mensaje=None):
+        _actualizar(con, trabajo_id, etapa=etapa)
+        _evento(con, trabajo_id, etapa, mensaje or f"Etapa: {etapa}")
+
+    try:
+        with open(LOCK_PATH, "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                _actualizar(con, trabajo_id, estado="en_espera")
+                _evento(con, trabajo_id, None, "Esperando a que termine otro entrenamiento")
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            _actualizar(con, trabajo_id, estado="en_curso")
+            _evento(con, trabajo_id, None, "Entrenamiento iniciado")
+
+            if tipo == "incremental":
+                from ml import historial
+                artefacto = historial.reentrenar_incremental(progreso=progreso)
+            else:
+                from ml import ruta_modelo
+                artefacto = ruta_modelo.main(progreso=progreso)
+
+        _actualizar(con, trabajo_id, estado="completado", resultado=json.dumps(artefacto))
+        _evento(con, trabajo_id, None, "Entrenamiento completado")
+    except Exception as e:
+        print(traceback.format_exc())
+        _actualizar(con, trabajo_id, estado="error", error=str(e))
+        _evento(con, trabajo_id, None, f"Error: {e}")
+    finally:
+        con.close()
@@ -0,0 +1,165 @@
+"""
+tsp.py
+
+- Tour inicial por vecino más cercano (el que usaba find_route).
+- Mejora por búsqueda local 2-opt y Or-opt sobre una matriz NumPy (asimétrica).
+- Held-Karp exacto para instancias pequeñas (n <= HELD_KARP_MAX_N).
+"""
+
+import time
+import numpy as np
+
+HELD_KARP_MAX_N = 12
+
+# Las distancias infinitas (sin ruta) se reemplazan por un costo finito grande
+# para que los deltas de la búsqueda local no den inf - inf.
+COSTO_SIN_RUTA = 1e12
+
+
+def _preparar(distance_matrix):
+    D = np.array(distance_matrix, dtype=np.float64)
+    D[~np.isfinite(D)] = COSTO_SIN_RUTA
+    np.fill_diagonal(D, 0.0)
+    return D
+
+
+def tour_length(D, tour):
+    """Costo de un tour cerrado [depot, ..., depot]."""
+    t = np.asarray(tour)
+    return float(D[t[:-1], t[1:]].sum())
+
+
+def solve_tsp_nearest_neighbor(distance_matrix, depot=0):
+    """Tour greedy: siempre al punto no visitado más cercano; vuelve al depósito."""
+    D = _preparar(distance_matrix)
+    n = len(D)
+    visitado = np.zeros(n, dtype=bool)
+    visitado[depot] = True
+    tour = [depot]
+    actual = depot
+    for _ in range(n - 1):
+        fila = np.where(visitado, np.inf, D[actual])
+        actual = int(np.argmin(fila))
+        visitado[actual] = True
+        tour.append(actual)
+    tour.append(depot)
+    return tour, tour_length(D, tour)
+
+
+def two_opt(D, tour, deadline=None):
+    """
+    2-opt con mejor mejora. Como la matriz es asimétrica (calles de un
+    sentido), el costo del segmento invertido se calcula con sumas prefijas
+    en ambos sentidos y todos los pares (i, j) se evalúan vectorizados.
+    """
+    t = np.array(tour)
+    n = len(t) - 1
+    if n < 4:
+        return t.tolist(), False
+    mejorado = False
+    while deadline is None or time.perf_counter() < deadline:
+        F = np.concatenate(([0.0], np.cumsum(D[t[:-1], t[1:]])))
+        R = np.concatenate(([0.0], np.cumsum(D[t[1:], t[:-1]])))
+        i = np.arange(1, n - 1)[:, None]
+        j = np.arange(2, n)[None, :]
+        a, b = t[i - 1], t[j + 1]
+        ti, tj = t[i], t[j]
+        delta = (D[a, tj] + (R[j] - R[i]) + D[ti, b]) - (D[a, ti] + (F[j] - F[i]) + D[tj, b])
+        delta = np.where(j > i, delta, 0.0)
+        k = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[k] >= -1e-9:
+            break
+        ii, jj = int(i[k[0], 0]), int(j[0, k[1]])
+        t[ii:jj + 1] = t[ii:jj + 1][::-1]
+        mejorado = True
+    return t.tolist(), mejorado
+
+
+def or_opt(D, tour, deadline=None, max_segmento=3):
+    """Or-opt: mueve segmentos de 1..max_segmento puntos (sin invertir) a su mejor posición."""
+    t = list(tour)
+    n = len(t) - 1
+    mejorado = False
+    hubo_mejora = True
+    while hubo_mejora and (deadline is None or time.perf_counter() < deadline):
+        hubo_mejora = False
+        for largo in range(1, max_segmento + 1):
+            for i in range(1, n - largo + 1):
+                arr = np.asarray(t)
+                p, nx = arr[i - 1], arr[i + largo]
+                s0, sl = arr[i], arr[i + largo - 1]
+                ganancia = D[p, s0] + D[sl, nx] - D[p, nx]
+                k = np.arange(0, n)
+                k = k[(k < i - 1) | (k > i + largo - 1)]
+                if len(k) == 0:
+                    continue
+                costo = D[arr[k], s0] + D[sl, arr[k + 1]] - D[arr[k], arr[k + 1]]
+                m = int(np.argmin(costo))
+                if costo[m] - ganancia < -1e-9:
+                    kk = int(k[m])
+                    segmento = t[i:i + largo]
+                    resto = t[:i] + t[i + largo:]
+                    pos = kk + 1 if kk < i else kk + 1 - largo
+                    t = resto[:pos] + segmento + resto[pos:]
+                    hubo_mejora = mejorado = True
+                    break
+            if hubo_mejora:
+                break
+    return t, mejorado
+
+
+def held_karp(D, depot=0):
+    """Programación dinámica exacta sobre subconjuntos (O(n^2 2^n))."""
+    n = len(D)
+    otros = [k for k in range(n) if k != depot]
+    m = len(otros)
+    if m == 0:
+        return [depot, depot], 0.0
+    sub = D[np.ix_(otros, otros)]
+    dp = np.full((1 << m, m), np.inf)
+    padre = np.full((1 << m, m), -1, dtype=np.int64)
+    for j in range(m):
+        dp[1 << j, j] = D[depot, otros[j]]
+    for mask in range(1, 1 << m):
+        for j in range(m):
+            if not (mask >> j) & 1 or mask == 1 << j:
+                continue
+            previo = mask ^ (1 << j)
+            cand = dp[previo] + sub[:, j]
+            k = int(np.argmin(cand))
+            dp[mask, j] = cand[k]
+            padre[mask, j] = k
+    lleno = (1 << m) - 1
+    cierre = dp[lleno] + D[otros, depot]
+    j = int(np.argmin(cierre))
+    total = float(cierre[j])
+    orden = []
+    mask = lleno
+    while j >= 0:
+        orden.append(otros[j])
+        j, mask = int(padre[mask, j]), mask ^ (1 << j)
+    tour = [depot] + orden[::-1] + [depot]
+    return tour, total
+
+
+def solve_tsp(distance_matrix, depot=0, time_budget_s=0.5):
+    """
+    Resuelve el TSP cerrado desde `depot`. Exacto (Held-Karp) si n <= 12;
+    si no, vecino más cercano + 2-opt / Or-opt hasta agotar `time_budget_s`.
+    Retorna (tour [depot, ..., depot], costo total).
+    """
+    D = _preparar(distance_matrix)
+    n = len(D)
+    if n <= 3:
+        return solve_tsp_nearest_neighbor(D, depot)
+    if n <= HELD_KARP_MAX_N:
+        return held_karp(D, depot)
+
+    deadline = time.perf_counter() + time_budget_s
+    tour, _ = solve_tsp_nearest_neighbor(D, depot)
+    while time.perf_counter() < deadline:
+        tour, m1 = two_opt(D, tour, deadline)
+        tour, m2 = or_opt(D, tour, deadline)
+        if not (m1 or m2):
+            break
+    return tour, tour_length(D, tour)
@@ -0,0 +1,206 @@
+"""
+vrp.py
+
+- Ruteo de flota con capacidad (CVRP) sobre una matriz NumPy asimétrica.
+- Solución inicial por ahorros de Clarke-Wright; ajuste al número de vehículos
+  y a sus capacidades (flota heterogénea).
+- Búsqueda local: relocalización entre rutas y 2-opt / Or-opt dentro de cada ruta.
+- El índice 0 de la matriz es el depósito; los demás son paradas.
+"""
+
+import time
+import numpy as np
+
+from ml.tsp import _preparar, two_opt, or_opt
+
+
+def route_cost(D, ruta, depot=0):
+    """Costo de depósito -> paradas -> depósito."""
+    if not ruta:
+        return 0.0
+    t = np.asarray([depot] + list(ruta) + [depot])
+    return float(D[t[:-1], t[1:]].sum())
+
+
+def clarke_wright(D, demandas, capacidad, clientes, depot=0):
+    """
+    Ahorros de Clarke-Wright (versión asimétrica): une la ruta que termina en i
+    con la que empieza en j si s(i, j) = d(i,0) + d(0,j) - d(i,j) > 0 y la carga
+    total cabe en `capacidad`.
+    """
+    clientes = list(clientes)
+    rutas = {c: [c] for c in clientes}
+    carga = {c: float(demandas[c]) for c in clientes}
+    ruta_de = {c: c for c in clientes}
+    if len(clientes) < 2:
+        return list(rutas.values())
+
+    idx = np.asarray(clientes)
+    ahorro = D[idx, depot][:, None] + D[depot, idx][None, :] - D[np.ix_(idx, idx)]
+    np.fill_diagonal(ahorro, -np.inf)
+    pares = np.argwhere(ahorro > 0)
+    orden = np.argsort(-ahorro[pares[:, 0], pares[:, 1]], kind="stable")
+
+    for a, b in pares[orden].tolist():
+        i, j = clientes[a], clientes[b]
+        ri, rj = ruta_de[i], ruta_de[j]
+        if ri == rj or rutas[ri][-1] != i or rutas[rj][0] != j:
+            continue
+        if carga[ri] + carga[rj] > capacidad:
+            continue
+        rutas[ri].extend(rutas[rj])
+        carga[ri] += carga[rj]
+        for c in rutas[rj]:
+            ruta_de[c] = ri
+        del rutas[rj], carga[rj]
+    return list(rutas.values())
+
+
+def _mejor_insercion(D, ruta, c, depot=0):
+    """Posición y costo extra de insertar la parada c en la ruta."""
+    t = np.asarray([depot] + list(ruta) + [depot])
+    extra = D[t[:-1], c] + D[c, t[1:]] - D[t[:-1], t[1:]]
+    k = int(np.argmin(extra))
+    return k, float(extra[k])
+
+
+def _ajustar_flota(D, rutas, demandas, capacidades, prioridades, depot=0):
+    """
+    Reduce las rutas al número de vehículos (uniendo las de menor costo extra)
+    y asigna cada ruta a un vehículo por carga/capacidad descendente. Las
+    paradas que no caben quedan sin asignar, empezando por las de menor prioridad.
+    """
+    cap_max = max(capacidades)
+    carga = lambda r: float(sum(demandas[c] for c in r))
+    sin_asignar = []
+    rutas = [list(r) for r in rutas]
+
+    while len(rutas) > len(capacidades):
+        mejor = None
+        for a in range(len(rutas)):
+            for b in range(len(rutas)):
+                if a == b or carga(rutas[a]) + carga(rutas[b]) > cap_max:
+                    continue
+                extra = route_cost(D, rutas[a] + rutas[b], depot) - route_cost(D, rutas[a], depot) - route_cost(D, rutas[b], depot)
+                if mejor is None or extra < mejor[0]:
+                    mejor = (extra, a, b)
+        if mejor is None:
+            # Ninguna unión cabe: se descarta la ruta de menor prioridad
+            peor = min(range(len(rutas)), key=lambda k: (max(prioridades[c] for c in rutas[k]), -carga(rutas[k])))
+            sin_asignar.extend(rutas.pop(peor))
+            continue
+        _, a, b = mejor
+        rutas[a] = rutas[a] + rutas[b]
+        rutas.pop(b)
+
+    orden_v = sorted(range(len(capacidades)), key=lambda v: -capacidades[v])
+    rutas.sort(key=lambda r: -carga(r))
+    asignadas = [[] for _ in capacidades]
+    for v, r in zip(orden_v, rutas):
+        asignadas[v] = r
+
+    # Rutas que exceden la capacidad de su vehículo: sacar paradas
+    for v, r in enumerate(asignadas):
+        while r and carga(r) > capacidades[v]:
+            c = min(r, key=lambda c: (prioridades[c], -demandas[c]))
+            r.remove(c)
+            sin_asignar.append(c)
+    return asignadas, sin_asignar
+
+
+def _insertar_pendientes(D, rutas, pendientes, demandas, capacidades, prioridades, depot=0):
+    """Intenta ubicar paradas sin asignar (mayor prioridad primero) donde haya holgura."""
+    restantes = []
+    for c in sorted(pendientes, key=lambda c: (-prioridades[c], demandas[c])):
+        mejor = None
+        for v, r in enumerate(rutas):
+            if sum(demandas[x] for x in r) + demandas[c] > capacidades[v]:
+                continue
+            k, extra = _mejor_insercion(D, r, c, depot)
+            if mejor is None or extra < mejor[0]:
+                mejor = (extra, v, k)
+        if mejor is None:
+            restantes.append(c)
+        else:
+            _, v, k = mejor
+            rutas[v].insert(k, c)
+    return restantes
+
+
+def _relocalizar(D, rutas, demandas, capacidades, depot=0):
+    """Primer movimiento de una parada a otra ruta que reduzca el costo total."""
+    cargas = [sum(demandas[c] for c in r) for r in rutas]
+    for a, ra in enumerate(rutas):
+        for pos, c in enumerate(ra):
+            prev = ra[pos - 1] if pos > 0 else depot
+            sig = ra[pos + 1] if pos + 1 < len(ra) else depot
+            ganancia = D[prev, c] + D[c, sig] - D[prev, sig]
+            for b, rb in enumerate(rutas):
+                if b == a or cargas[b] + demandas[c] > capacidades[b]:
+                    continue
+                k, extra = _mejor_insercion(D, rb, c, depot)
+                if extra - ganancia < -1e-9:
+                    ra.pop(pos)
+                    rb.insert(k, c)
+                    return True
+    return False
+
+
+def _mejorar_ruta(D, ruta, deadline, depot=0):
+    """2-opt / Or-opt sobre el tour cerrado de un vehículo."""
+    if len(ruta) < 3:
+        return ruta
+    tour = [depot] + list(ruta) + [depot]
+    while time.perf_counter() < deadline:
+        tour, m1 = two_opt(D, tour, deadline)
+        tour, m2 = or_opt(D, tour, deadline)
+        if not (m1 or m2):
+            break
+    return [int(c) for c in tour[1:-1]]
+
+
+def solve_cvrp(distance_matrix, demandas, capacidades, prioridades=None, depot=0, time_budget_s=2.0):
+    """
+    Reparte las paradas (todos los índices != depot) entre los vehículos.
+
+    - demandas: carga de cada índice de la matriz (la del depósito se ignora).
+    - capacidades: capacidad de cada vehículo (None = sin límite).
+    - prioridades: rango numérico por índice; mayor = se atiende primero si
+      la flota no alcanza.
+
+    Retorna (rutas, sin_asignar): rutas[v] es la lista ordenada de paradas del
+    vehículo v (sin el depósito); sin_asignar las paradas que no cupieron.
+    """
+    D = _preparar(distance_matrix)
+    n = len(D)
+    deadline = time.perf_counter() + time_budget_s
+    demandas = [float(d or 0) for d in demandas]
+    capacidades = [float('inf') if c is None else float(c) for c in capacidades]
+    prioridades = list(prioridades) if prioridades is not None else [0] * n
+    clientes = [c for c in range(n) if c != depot]
+    if not capacidades:
+        return [], clientes
+
+    # Si la demanda total excede la flota, fuera primero las de menor prioridad
+    sin_asignar = []
+    total_cap = sum(capacidades)
+    exceso = sum(demandas[c] for c in clientes) - total_cap
+    if exceso > 0:
+        for c in sorted(clientes, key=lambda c: (prioridades[c], -demandas[c])):
+            if exceso <= 0:
+                break
+            sin_asignar.append(c)
+            exceso -= demandas[c]
+        clientes = [c for c in clientes if c not in set(sin_asignar)]
+    cabe = [c for c in clientes if demandas[c] <= max(capacidades)]
+    sin_asignar.extend(c for c in clientes if demandas[c] > max(capacidades))
+
+    rutas = clarke_wright(D, demandas, max(capacidades), cabe, depot)
+    rutas, fuera = _ajustar_flota(D, rutas, demandas, capacidades, prioridades, depot)
+    sin_asignar = _insertar_pendientes(D, rutas, sin_asignar + fuera, demandas, capacidades, prioridades, depot)
+
+    while time.perf_counter() < deadline:
+        rutas = [_mejorar_ruta(D, r, deadline, depot) for r in rutas]
+        if not _relocalizar(D, rutas, demandas, capacidades, depot):
+            break
+    return rutas, sin_asignar
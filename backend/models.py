@@ -61,6 +61,7 @@ class Cliente(db.Model):
     direccion = db.Column(db.Text)
     telefono = db.Column(db.String(20))
     nit = db.Column(db.String(50))
+    usuario = db.relationship('User')
 
 
 # =========================
@@ -110,6 +111,7 @@ class Producto(db.Model):
     precio = db.Column(db.Numeric(10,2), nullable=False)
     stock = db.Column(db.Integer, default=0)
     activo = db.Column(db.Boolean, default=True)
+    __table_args__ = (db.Index('ix_productos_nombre_id', 'nombre', 'id'),)
 
 
 # =========================
@@ -127,6 +129,12 @@ class Pedido(db.Model):
     estado = db.Column(db.String(50), default='pendiente')
     prioridad = db.Column(db.String(20), default='normal')
     total = db.Column(db.Numeric(10,2), nullable=False)
+    vehiculo_id = db.Column(db.Integer, db.ForeignKey('vehiculos.id'))
+    lat = db.Column(db.Numeric(9,6))
+    lon = db.Column(db.Numeric(9,6))
+    detalles = db.relationship('PedidoDetalle', backref='pedido', lazy=True, passive_deletes=True)
+    __table_args__ = (db.Index('ix_pedidos_fecha_pedido_id', 'fecha_pedido', 'id'),
+                      db.Index('ix_pedidos_estado', 'estado'))
 
 
 # =========================
@@ -159,6 +167,9 @@ class Ruta(db.Model):
     conductor_id = db.Column(db.Integer, db.ForeignKey('conductores.id'))
     fecha_programada = db.Column(db.DateTime)
     estado = db.Column(db.String(50), default='pendiente')
+    detalles = db.relationship('RutaDetalle', backref='ruta', lazy=True, passive_deletes=True,
+                               order_by='RutaDetalle.orden')
+    metricas = db.relationship('MetricaEntrega', backref='ruta', lazy=True)
 
 
 # =========================
@@ -172,6 +183,7 @@ class RutaDetalle(db.Model):
     __tablename__ = 'ruta_detalles'
     id = db.Column(db.Integer, primary_key=True)
     ruta_id = db.Column(db.Integer, db.ForeignKey('rutas.id', ondelete='CASCADE'))
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedidos.id'))
     lat = db.Column(db.Numeric(9,6))
     lon = db.Column(db.Numeric(9,6))
     orden = db.Column(db.Integer)
@@ -209,6 +221,28 @@ class MetricaEntrega(db.Model):
     combustible_usado = db.Column(db.Numeric(10,2))
 
 
+# =========================
+# RESUMEN DE ENTREGAS (DASHBOARD)
+# =========================
+
+class ResumenEntrega(db.Model):
+    """
+    Agregados de entregas por ruta, con su día y vehículo. Se mantienen de
+    forma incremental al escribir rutas y métricas (resumen_entregas.py).
+    """
+    __tablename__ = 'resumen_entregas'
+    ruta_id = db.Column(db.Integer, db.ForeignKey('rutas.id', ondelete='CASCADE'), primary_key=True)
+    fecha = db.Column(db.Date, nullable=False, index=True)
+    vehiculo_id = db.Column(db.Integer, db.ForeignKey('vehiculos.id'), index=True)
+    pedidos = db.Column(db.Integer, nullable=False, default=0)
+    entregas = db.Column(db.Integer, nullable=False, default=0)
+    retrasadas = db.Column(db.Integer, nullable=False, default=0)
+    con_tiempo = db.Column(db.Integer, nullable=False, default=0)  # entregas con tiempo registrado
+    tiempo_total_min = db.Column(db.Integer, nullable=False, default=0)
+    combustible_total = db.Column(db.Numeric(12,2), nullable=False, default=0)
+    distancia_m = db.Column(db.Numeric(12,2))  # planificada (plan_fleet)
+
+
 # =========================
 # MÉTODOS DE PAGO
 # =========================
@@ -363,6 +397,7 @@ class Proveedor(db.Model):
     telefono = db.Column(db.String(50))
     direccion = db.Column(db.Text)
     datos_extra = db.Column(db.JSON)  # RFC, NIT, condiciones, etc.
+    __table_args__ = (db.Index('ix_proveedores_nombre_id', 'nombre', 'id'),)
 
 
 class Distribuidor(db.Model):
@@ -389,6 +424,7 @@ class OrdenCompra(db.Model):
     total = db.Column(db.Numeric(14,2), nullable=False, default=0)
     proveedor = db.relationship('Proveedor', backref='ordenes_compra')
     detalles = db.relationship('OrdenCompraDetalle', backref='orden', cascade='all, delete-orphan', lazy=True)
+    __table_args__ = (db.Index('ix_ordenes_compra_fecha_id', 'fecha', 'id'),)
 
 
 class OrdenCompraDetalle(db.Model):
@@ -421,6 +457,7 @@ class CuentaPagar(db.Model):
     estado = db.Column(db.String(50), default='pendiente')  # pendiente, parcial, pagada, vencida
     descripcion = db.Column(db.Text)
     proveedor = db.relationship('Proveedor', backref='cuentas_pagar')
+    __table_args__ = (db.Index('ix_cuentas_pagar_fecha_emision_id', 'fecha_emision', 'id'),)
 
 
 class CuentaCobrar(db.Model):
@@ -462,6 +499,7 @@ class MovimientoPago(db.Model):
     cuenta_pagar = db.relationship('CuentaPagar', backref='pagos')
     cuenta_cobrar = db.relationship('CuentaCobrar', backref='pagos')
     metodo_pago = db.relationship('MetodoPago')
+    __table_args__ = (db.Index('ix_movimientos_pago_fecha_pago_id', 'fecha_pago', 'id'),)
 
 
 # =========================
@@ -548,6 +586,7 @@ class Cotizacion(db.Model):
     estado = db.Column(db.String(50), default='emitida')  # emitida, aceptada, vencida, cancelada
     usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
     detalles = db.Column(db.JSON, nullable=True)
+    __table_args__ = (db.Index('ix_cotizaciones_fecha_emitida_id', 'fecha_emitida', 'id'),)
 
 
 # =========================
@@ -566,6 +605,18 @@ class ReporteGuardado(db.Model):
     resultado_cache = db.Column(db.JSON)  # opcional, guardar datos para graficar
     creado_en = db.Column(db.DateTime, server_default=db.func.now())
     creado_por = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
+    clave_filtro = db.Column(db.String(64), index=True)  # hash de tipo + filtro canónico
+    versiones = db.Column(db.JSON)  # versiones de las tablas con las que se calculó resultado_cache
+    actualizado_en = db.Column(db.DateTime)
+
+
+class VersionTabla(db.Model):
+    """
+    Contador de cambios por tabla; invalida los reportes cacheados (reportes.py).
+    """
+    __tablename__ = 'versiones_tabla'
+    tabla = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
 
 
 # =========================
@@ -583,6 +634,10 @@ class ModeloML(db.Model):
     ruta_archivo = db.Column(db.String(255))  # Ruta al archivo .pkl o URI (s3://...)
     fecha_entrenamiento = db.Column(db.DateTime, server_default=db.func.now())
     activo = db.Column(db.Boolean, default=True)
+    version = db.Column(db.String(40))
+    formato = db.Column(db.String(20))  # bosque_npz, joblib
+    esquema = db.Column(db.JSON)  # lista ordenada de features de entrada
+    metadatos = db.Column(db.JSON)  # filas, hiperparámetros, versión del grafo, etc.
     # opcionales: metricas, hiperparams, creado_por (puedes ampliarlo según necesites)
 
 
@@ -0,0 +1,309 @@
+"""
+reportes.py
+
+- Motor de reportes ('presupuesto', 'movimientos', 'control_precios'): el
+  filtro se compila a una consulta con GROUP BY que agrega en la base.
+- El resultado se cachea en ReporteGuardado con la clave = hash del tipo y
+  del filtro canónico (mismo filtro escrito distinto -> misma clave).
+- Invalidación por versiones: cada tabla tiene un contador en
+  versiones_tabla que sube en cada flush que la modifica. Un resultado
+  cacheado vale mientras las versiones de sus tablas no cambien, así que
+  repetir un reporte cuesta dos consultas chicas y no vuelve a recorrer
+  historial_precios ni movimientos_pago.
+"""
+
+import json
+import hashlib
+import datetime
+
+from sqlalchemy import event, select, update, insert, func, case, extract, literal
+from sqlalchemy.orm import Session
+
+from models import (PresupuestoCompra, Proveedor, MovimientoPago, CuentaPagar, MetodoPago,
+                    HistorialPrecio, Producto, ReporteGuardado, VersionTabla)
+
+
+class ErrorReporte(ValueError):
+    """Tipo o filtro de reporte inválido (se responde 400)."""
+
+
+# -------------------------
+# Versiones por tabla
+# -------------------------
+TABLAS_VERSIONADAS = (
+    "presupuestos_compra", "proveedores", "movimientos_pago", "cuentas_pagar",
+    "metodos_pago", "historial_precios", "productos",
+)
+
+
+def subir_versiones(conexion, tablas):
+    """+1 a la versión de cada tabla (crea el contador si falta)."""
+    for tabla in sorted(tablas):
+        r = conexion.execute(update(VersionTabla).where(VersionTabla.tabla == tabla)
+                             .values(version=VersionTabla.version + 1))
+        if r.rowcount == 0:
+            conexion.execute(insert(VersionTabla).values(tabla=tabla, version=1))
+
+
+def versiones(session, tablas):
+    """{tabla: versión} actual (0 si la tabla nunca cambió)."""
+    actuales = dict(session.execute(
+        select(VersionTabla.tabla, VersionTabla.version).where(VersionTabla.tabla.in_(tablas))).all())
+    return {t: int(actuales.get(t, 0)) for t in sorted(tablas)}
+
+
+@event.listens_for(Session, "after_flush")
+def _al_hacer_flush(session, contexto):
+    tablas = set()
+    for obj in session.new | session.deleted:
+        tablas.add(obj.__table__.name)
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            tablas.add(obj.__table__.name)
+    tablas &= set(TABLAS_VERSIONADAS)
+    if tablas:
+        subir_versiones(session.connection(), tablas)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _al_ejecutar(estado):
+    # Query.update() / Query.delete() en bloque no pasan por el flush
+    if (estado.is_update or estado.is_delete) and estado.bind_mapper is not None:
+        tabla = estado.bind_mapper.local_table.name
+        if tabla in TABLAS_VERSIONADAS:
+            subir_versiones(estado.session.connection(), {tabla})
+
+
+# -------------------------
+# Filtros
+# -------------------------
+
+def canonico(filtro):
+    """Filtro sin vacíos, listas ordenadas y sin duplicados, claves ordenadas."""
+    limpio = {}
+    for k, v in (filtro or {}).items():
+        if v is None or v == "" or v == []:
+            continue
+        if isinstance(v, (list, tuple)):
+            v = sorted({str(x) for x in v})
+        else:
+            v = str(v)
+        limpio[str(k)] = v
+    return dict(sorted(limpio.items()))
+
+
+def clave_reporte(tipo, filtro):
+    texto = json.dumps([tipo, canonico(filtro)], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(texto.encode()).hexdigest()
+
+
+def _lista(filtro, nombre, tipo=str):
+    valor = filtro.get(nombre)
+    if valor is None:
+        return []
+    valores = valor if isinstance(valor, list) else str(valor).split(",")
+    try:
+        return [tipo(v) for v in valores]
+    except ValueError:
+        raise ErrorReporte(f"Filtro '{nombre}' inválido: {valor}")
+
+
+def _rango(q, columna, filtro):
+    """desde / hasta (ISO); una fecha sola como hasta incluye todo ese día."""
+    for nombre in ("desde", "hasta"):
+        texto = filtro.get(nombre)
+        if not texto:
+            continue
+        try:
+            limite = datetime.datetime.fromisoformat(texto)
+        except ValueError:
+            raise ErrorReporte(f"Fecha inválida en '{nombre}': {texto}")
+        if nombre == "desde":
+            q = q.where(columna >= limite)
+        else:
+            if len(texto) == 10:
+                q = q.where(columna < limite + datetime.timedelta(days=1))
+            else:
+                q = q.where(columna <= limite)
+    return q
+
+
+def _agrupacion(filtro, opciones, defecto):
+    agrupar = filtro.get("agrupar") or defecto
+    if agrupar not in opciones:
+        raise ErrorReporte(f"agrupar debe ser uno de: {', '.join(opciones)}")
+    return agrupar
+
+
+def _mes(columna):
+    """(año, mes) portables entre PostgreSQL y SQLite."""
+    return extract("year", columna).label("anio"), extract("month", columna).label("mes")
+
+
+def _num(v):
+    return float(v) if v is not None else None
+
+
+# -------------------------
+# Definiciones de reportes
+# -------------------------
+
+def reporte_presupuesto(session, filtro):
+    """Compras de bobina: cantidad y desglose de costos por mes, proveedor o estado."""
+    P = PresupuestoCompra
+    agrupar = _agrupacion(filtro, ("mes", "proveedor", "estado"), "mes")
+    if agrupar == "mes":
+        grupo = list(_mes(P.fecha))
+    elif agrupar == "proveedor":
+        grupo = [P.proveedor_id, Proveedor.nombre.label("proveedor")]
+    else:
+        grupo = [P.estado]
+    q = (select(*grupo,
+                func.count(P.id).label("presupuestos"),
+                func.coalesce(func.sum(P.cantidad_bobinas), 0).label("bobinas"),
+                func.coalesce(func.sum(P.cantidad_bobinas * P.precio_bobina), 0).label("costo_bobinas"),
+                func.coalesce(func.sum(P.costo_flete_maritimo), 0).label("flete_maritimo"),
+                func.coalesce(func.sum(P.costo_flete_terrestre), 0).label("flete_terrestre"),
+                func.coalesce(func.sum(P.costo_aduanas), 0).label("aduanas"),
+                func.coalesce(func.sum(P.otros_costos), 0).label("otros"),
+                func.coalesce(func.sum(P.total_compra), 0).label("total"))
+         .group_by(*grupo).order_by(*grupo))
+    if agrupar == "proveedor":
+        q = q.outerjoin(Proveedor, P.proveedor_id == Proveedor.id)
+    q = _rango(q, P.fecha, filtro)
+    if filtro.get("proveedor_id"):
+        q = q.where(P.proveedor_id.in_(_lista(filtro, "proveedor_id", int)))
+    if filtro.get("estado"):
+        q = q.where(P.estado.in_(_lista(filtro, "estado")))
+    return agrupar, q
+
+
+def reporte_movimientos(session, filtro):
+    """Pagos y cobros: cantidad y monto por mes, método de pago o tipo de cuenta."""
+    M = MovimientoPago
+    tipo = case((M.cuenta_pagar_id.isnot(None), literal("pagar")),
+                (M.cuenta_cobrar_id.isnot(None), literal("cobrar")),
+                else_=literal("otro"))
+    agrupar = _agrupacion(filtro, ("mes", "metodo_pago", "tipo"), "mes")
+    if agrupar == "mes":
+        grupo = list(_mes(M.fecha_pago))
+    elif agrupar == "metodo_pago":
+        grupo = [M.metodo_pago_id, MetodoPago.nombre.label("metodo_pago")]
+    else:
+        grupo = [tipo.label("tipo")]
+    q = (select(*grupo,
+                func.count(M.id).label("movimientos"),
+                func.coalesce(func.sum(M.monto), 0).label("monto"))
+         .group_by(*grupo).order_by(*grupo))
+    if agrupar == "metodo_pago":
+        q = q.outerjoin(MetodoPago, M.metodo_pago_id == MetodoPago.id)
+    q = _rango(q, M.fecha_pago, filtro)
+    if filtro.get("tipo"):
+        q = q.where(tipo.in_(_lista(filtro, "tipo")))
+    if filtro.get("metodo_pago_id"):
+        q = q.where(M.metodo_pago_id.in_(_lista(filtro, "metodo_pago_id", int)))
+    if filtro.get("proveedor_id"):
+        q = q.where(M.cuenta_pagar_id.in_(
+            select(CuentaPagar.id).where(CuentaPagar.proveedor_id.in_(_lista(filtro, "proveedor_id", int)))))
+    return agrupar, q
+
+
+def reporte_control_precios(session, filtro):
+    """Cambios de precio: cantidad, variación y rango de precios por producto, mes o tipo de cliente."""
+    H = HistorialPrecio
+    agrupar = _agrupacion(filtro, ("producto", "mes", "tipo_cliente"), "producto")
+    if agrupar == "producto":
+        grupo = [H.producto_id, Producto.nombre.label("producto")]
+    elif agrupar == "mes":
+        grupo = list(_mes(H.fecha))
+    else:
+        grupo = [H.tipo_cliente]
+    q = (select(*grupo,
+                func.count(H.id).label("cambios"),
+                func.avg(H.porcentaje_cambio).label("variacion_promedio"),
+                func.max(H.porcentaje_cambio).label("variacion_max"),
+                func.min(H.precio_nuevo).label("precio_min"),
+                func.max(H.precio_nuevo).label("precio_max"),
+                func.max(H.fecha).label("ultimo_cambio"))
+         .group_by(*grupo).order_by(*grupo))
+    if agrupar == "producto":
+        q = q.outerjoin(Producto, H.producto_id == Producto.id)
+    q = _rango(q, H.fecha, filtro)
+    if filtro.get("producto_id"):
+        q = q.where(H.producto_id.in_(_lista(filtro, "producto_id", int)))
+    if filtro.get("tipo_cliente"):
+        q = q.where(H.tipo_cliente.in_(_lista(filtro, "tipo_cliente")))
+    return agrupar, q
+
+
+# tipo -> (constructor de la consulta, tablas de las que depende, columnas que se suman en totales)
+REPORTES = {
+    "presupuesto": (reporte_presupuesto, ("presupuestos_compra", "proveedores"),
+                    ("presupuestos", "bobinas", "costo_bobinas", "flete_maritimo", "flete_terrestre",
+                     "aduanas", "otros", "total")),
+    "movimientos": (reporte_movimientos, ("movimientos_pago", "cuentas_pagar", "metodos_pago"),
+                    ("movimientos", "monto")),
+    "control_precios": (reporte_control_precios, ("historial_precios", "productos"), ("cambios",)),
+}
+
+
+def calcular(session, tipo, filtro):
+    """Ejecuta el reporte en la base: {tipo, agrupar, filas, totales}."""
+    construir, _, sumables = REPORTES[tipo]
+    agrupar, q = construir(session, filtro)
+    filas = []
+    for fila in session.execute(q).mappings():
+        item = {}
+        for k, v in fila.items():
+            if isinstance(v, (datetime.datetime, datetime.date)):
+                v = v.isoformat()
+            elif k in ("anio", "mes") and v is not None:
+                v = int(v)
+            elif not isinstance(v, (str, int, type(None))):
+                v = _num(v)
+            item[k] = v
+        if "anio" in item:
+            item["periodo"] = f"{item['anio']:04d}-{item['mes']:02d}" if item["anio"] else None
+        filas.append(item)
+    totales = {c: round(sum(f[c] or 0 for f in filas), 2) for c in sumables}
+    return {"tipo": tipo, "agrupar": agrupar, "filas": filas, "totales": totales}
+
+
+def ejecutar(session, tipo, filtro=None):
+    """
+    Resultado del reporte, desde el cache si sus tablas no cambiaron. Retorna
+    (datos, desde_cache, registro ReporteGuardado). No hace commit.
+    """
+    if tipo not in REPORTES:
+        raise ErrorReporte(f"Tipo de reporte desconocido: {tipo} (use {', '.join(REPORTES)})")
+    filtro = canonico(filtro)
+    clave = clave_reporte(tipo, filtro)
+    # versiones antes de calcular: si algo cambia mientras tanto, el próximo pedido recalcula
+    actuales = versiones(session, REPORTES[tipo][1])
+
+    registros = ReporteGuardado.query.filter_by(clave_filtro=clave).order_by(ReporteGuardado.id).all()
+    for registro in registros:
+        if registro.versiones == actuales and registro.resultado_cache is not None:
+            return registro.resultado_cache, True, registro
+
+    datos = calcular(session, tipo, filtro)
+    registro = registros[0] if registros else ReporteGuardado(tipo_reporte=tipo, filtro=filtro, clave_filtro=clave)
+    registro.resultado_cache = datos
+    registro.versiones = actuales
+    registro.actualizado_en = datetime.datetime.now()
+    if registro.id is None:
+        session.add(registro)
+    return datos, False, registro
+
+
+def guardar(session, tipo, filtro, nombre, creado_por=None):
+    """Guarda un reporte con nombre (ejecutándolo para dejar su cache al día)."""
+    _, _, registro = ejecutar(session, tipo, filtro)
+    if registro.nombre is not None and registro.nombre != nombre:
+        registro = ReporteGuardado(tipo_reporte=tipo, filtro=registro.filtro, clave_filtro=registro.clave_filtro,
+                                   resultado_cache=registro.resultado_cache, versiones=registro.versiones,
+                                   actualizado_en=registro.actualizado_en)
+        session.add(registro)
+    registro.nombre = nombre
+    registro.creado_por = creado_por
+    return registro
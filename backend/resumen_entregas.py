@@ -0,0 +1,190 @@
+"""
+resumen_entregas.py
+
+- Tabla resumen_entregas: una fila por ruta con su día, vehículo y los
+  agregados de sus métricas (entregas, retrasos, tiempo, combustible).
+- Se actualiza de forma incremental en el mismo flush que escribe Ruta o
+  MetricaEntrega: solo se recalculan las rutas tocadas, cada una a partir de
+  sus propias métricas (pocas filas), nunca el historial completo.
+- El dashboard suma filas del resumen en la base (GROUP BY por día o por
+  ruta) en lugar de recorrer todas las entregas.
+"""
+
+import os
+import datetime
+
+from sqlalchemy import event, select, delete, insert, func, case, inspect
+from sqlalchemy.orm import Session
+
+from models import Ruta, RutaDetalle, MetricaEntrega, Conductor, Vehiculo, ResumenEntrega
+
+# Ventana (días) de los indicadores generales del dashboard
+DASHBOARD_DIAS = int(os.getenv("DASHBOARD_DIAS", 30))
+
+
+def _porcentaje(parte, total):
+    return round(100 * float(parte) / float(total)) if total else 0
+
+
+# -------------------------
+# Actualización incremental
+# -------------------------
+
+def recalcular(conexion, ruta_ids, distancias=None):
+    """
+    Reescribe las filas de resumen de `ruta_ids`. `distancias` = {ruta_id:
+    metros} planificados; si no viene, se conserva la distancia ya guardada.
+    """
+    ids = sorted({int(r) for r in ruta_ids if r is not None})
+    if not ids:
+        return
+    distancias = dict(distancias or {})
+
+    rutas = conexion.execute(
+        select(Ruta.id, Ruta.fecha_programada, Conductor.vehiculo_id)
+        .outerjoin(Conductor, Ruta.conductor_id == Conductor.id)
+        .where(Ruta.id.in_(ids))).all()
+    metricas = {fila[0]: fila[1:] for fila in conexion.execute(
+        select(MetricaEntrega.ruta_id,
+               func.count(MetricaEntrega.id),
+               func.coalesce(func.sum(case((MetricaEntrega.retraso.is_(True), 1), else_=0)), 0),
+               func.count(MetricaEntrega.tiempo_entrega),
+               func.coalesce(func.sum(MetricaEntrega.tiempo_entrega), 0),
+               func.coalesce(func.sum(MetricaEntrega.combustible_usado), 0))
+        .where(MetricaEntrega.ruta_id.in_(ids))
+        .group_by(MetricaEntrega.ruta_id))}
+    pedidos = dict(conexion.execute(
+        select(RutaDetalle.ruta_id, func.count(RutaDetalle.id))
+        .where(RutaDetalle.ruta_id.in_(ids), RutaDetalle.pedido_id.isnot(None))
+        .group_by(RutaDetalle.ruta_id)).all())
+    for ruta_id, distancia in conexion.execute(
+            select(ResumenEntrega.ruta_id, ResumenEntrega.distancia_m)
+            .where(ResumenEntrega.ruta_id.in_(ids))):
+        distancias.setdefault(ruta_id, distancia)
+
+    filas = []
+    for ruta_id, fecha_programada, vehiculo_id in rutas:
+        if fecha_programada is None:
+            continue
+        entregas, retrasadas, con_tiempo, tiempo_total, combustible = metricas.get(ruta_id, (0, 0, 0, 0, 0))
+        filas.append({
+            'ruta_id': ruta_id,
+            'fecha': fecha_programada.date(),
+            'vehiculo_id': vehiculo_id,
+            'pedidos': pedidos.get(ruta_id, 0),
+            'entregas': entregas,
+            'retrasadas': retrasadas,
+            'con_tiempo': con_tiempo,
+            'tiempo_total_min': tiempo_total,
+            'combustible_total': combustible,
+            'distancia_m': distancias.get(ruta_id),
+        })
+    conexion.execute(delete(ResumenEntrega).where(ResumenEntrega.ruta_id.in_(ids)))
+    if filas:
+        conexion.execute(insert(ResumenEntrega), filas)
+
+
+def registrar_rutas(session, distancias):
+    """Para escrituras en bloque (bulk_insert_mappings no pasa por el flush): {ruta_id: metros}."""
+    recalcular(session.connection(), distancias.keys(), distancias)
+
+
+def _anteriores(obj, atributo):
+    return inspect(obj).attrs[atributo].history.deleted or ()
+
+
+def _cambio(obj, *atributos):
+    estado = inspect(obj)
+    return any(estado.attrs[a].history.has_changes() for a in atributos)
+
+
+@event.listens_for(Session, "after_flush")
+def _al_hacer_flush(session, contexto):
+    """Junta las rutas afectadas por el flush y recalcula solo esas."""
+    rutas = set()
+    borradas = set()
+    for obj in session.new:
+        if isinstance(obj, MetricaEntrega):
+            rutas.add(obj.ruta_id)
+        elif isinstance(obj, Ruta):
+            rutas.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, MetricaEntrega):
+            rutas.add(obj.ruta_id)
+            rutas.update(_anteriores(obj, 'ruta_id'))
+        elif isinstance(obj, Ruta) and _cambio(obj, 'fecha_programada', 'conductor_id'):
+            rutas.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, MetricaEntrega):
+            rutas.add(obj.ruta_id)
+            rutas.update(_anteriores(obj, 'ruta_id'))
+        elif isinstance(obj, Ruta):
+            borradas.add(obj.id)
+    rutas.discard(None)
+    rutas -= borradas
+    if not rutas and not borradas:
+        return
+    conexion = session.connection()
+    if borradas:
+        conexion.execute(delete(ResumenEntrega).where(ResumenEntrega.ruta_id.in_(borradas)))
+    recalcular(conexion, rutas)
+
+
+# -------------------------
+# Lectura para el dashboard
+# -------------------------
+
+def datos_dashboard(session, hoy=None):
+    """Indicadores del dashboard a partir de resumen_entregas (más las 6 últimas métricas)."""
+    hoy = hoy or datetime.date.today()
+    desde = hoy - datetime.timedelta(days=DASHBOARD_DIAS - 1)
+    semana = hoy - datetime.timedelta(days=6)
+    R = ResumenEntrega
+
+    entregas, retrasadas, con_tiempo, tiempo_total, combustible, rutas, distancia = session.execute(
+        select(func.coalesce(func.sum(R.entregas), 0), func.coalesce(func.sum(R.retrasadas), 0),
+               func.coalesce(func.sum(R.con_tiempo), 0), func.coalesce(func.sum(R.tiempo_total_min), 0),
+               func.coalesce(func.sum(R.combustible_total), 0), func.count(R.distancia_m),
+               func.coalesce(func.sum(R.distancia_m), 0))
+        .where(R.fecha.between(desde, hoy))).one()
+
+    por_dia = {fecha: (e, r) for fecha, e, r in session.execute(
+        select(R.fecha, func.sum(R.entregas), func.sum(R.retrasadas))
+        .where(R.fecha.between(semana, hoy))
+        .group_by(R.fecha))}
+    weekly = []
+    for k in range(7):
+        e, r = por_dia.get(semana + datetime.timedelta(days=k), (0, 0))
+        weekly.append(_porcentaje(e - r, e))
+
+    comparacion = session.execute(
+        select(R.ruta_id, Vehiculo.placa, R.entregas, R.retrasadas)
+        .outerjoin(Vehiculo, R.vehiculo_id == Vehiculo.id)
+        .where(R.fecha.between(semana, hoy), R.entregas > 0)
+        .order_by(R.entregas.desc(), R.ruta_id.desc())
+        .limit(4)).all()
+
+    ultimas = session.execute(
+        select(MetricaEntrega.ruta_id, MetricaEntrega.retraso, Ruta.fecha_programada)
+        .outerjoin(Ruta, MetricaEntrega.ruta_id == Ruta.id)
+        .order_by(MetricaEntrega.id.desc())
+        .limit(6)).all()
+
+    return {
+        "on_time_delivery": _porcentaje(entregas - retrasadas, entregas),
+        "avg_delivery_time": round(float(tiempo_total) / con_tiempo) if con_tiempo else 0,
+        "fuel_consumption": round(float(combustible)),
+        "mileage_per_route": round(float(distancia) / 1000.0 / rutas) if rutas else 0,
+        "weekly_performance": weekly,
+        "route_comparison": [
+            {"name": f"Ruta {ruta_id}" + (f" ({placa})" if placa else ""),
+             "efficiency": _porcentaje(e - r, e)}
+            for ruta_id, placa, e, r in comparacion
+        ],
+        "delivery_status": [
+            {"route": f"Ruta {ruta_id}",
+             "status": "Retrasada" if retraso else "A tiempo",
+             "time": fecha.strftime("%I:%M %p") if fecha else None}
+            for ruta_id, retraso, fecha in ultimas
+        ],
+    }
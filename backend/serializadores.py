@@ -0,0 +1,218 @@
+"""
+serializadores.py
+
+- Un serializador por modelo de models.py: dict listo para jsonify
+  (Numeric -> float, fechas -> ISO) con la misma forma que ya devuelven los
+  endpoints.
+- consulta(Modelo) trae precargados los hijos que usa su serializador
+  (selectinload / joinedload): una lista se arma en un número fijo de
+  consultas, sin una consulta extra por fila.
+- Con `campos` (proyección) solo se leen esas columnas y solo se cargan los
+  hijos que alguno de esos campos necesita.
+"""
+
+import datetime
+from decimal import Decimal
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import selectinload, joinedload, load_only, configure_mappers
+
+import models as m
+
+# los backref (User.role, PedidoDetalle.pedido, ...) existen recién al configurar
+configure_mappers()
+
+
+def valor_json(v):
+    """Numeric -> float, fecha -> ISO; el resto tal cual."""
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (datetime.datetime, datetime.date)):
+        return v.isoformat()
+    return v
+
+
+def campos_modelo(modelo):
+    """Nombres de las columnas del modelo, en el orden en que se declararon."""
+    return [c.key for c in inspect(modelo).column_attrs]
+
+
+# -------------------------
+# Campos expuestos por modelo: los mismos que devolvía cada endpoint. Una
+# columna nueva no aparece en las respuestas hasta agregarla aquí; los modelos
+# sin entrada (solo exportaciones) exponen todas sus columnas.
+# -------------------------
+CAMPOS = {
+    m.Pedido: ['id', 'cliente_id', 'fecha_pedido', 'estado', 'prioridad', 'total', 'vehiculo_id', 'lat', 'lon'],
+    m.PedidoDetalle: ['id', 'producto_id', 'cantidad', 'subtotal'],
+    m.Proveedor: ['id', 'nombre', 'contacto', 'telefono', 'direccion', 'datos_extra'],
+    m.OrdenCompra: ['id', 'proveedor_id', 'referencia', 'fecha', 'estado', 'total'],
+    m.OrdenCompraDetalle: ['id', 'producto_id', 'cantidad', 'precio_unitario', 'subtotal'],
+    m.CuentaPagar: ['id', 'proveedor_id', 'referencia', 'monto_total', 'monto_pagado',
+                    'fecha_emision', 'fecha_vencimiento', 'estado', 'descripcion'],
+    m.MovimientoPago: ['id', 'cuenta_pagar_id', 'cuenta_cobrar_id', 'monto', 'fecha_pago',
+                       'metodo_pago_id', 'referencia_pago', 'nota'],
+    m.InventarioSucursal: ['id', 'producto_id', 'sucursal_id', 'cantidad', 'estado', 'ultimo_movimiento'],
+    m.Producto: ['id', 'nombre', 'descripcion', 'categoria', 'precio', 'stock', 'activo'],
+    m.Vehiculo: ['id', 'placa', 'marca', 'modelo', 'capacidad'],
+    m.Cliente: ['id', 'usuario_id', 'direccion', 'telefono', 'nit'],
+    m.Cotizacion: ['id', 'cliente_id', 'nombre_cliente', 'producto', 'color', 'fecha_emitida',
+                   'fecha_expiracion', 'precio_unitario', 'cantidad', 'estado', 'usuario_id'],
+    m.CodigosVerificacion: ['id', 'usuario_id', 'expiracion', 'usado'],
+}
+
+# Resumen de cotización para la lista
+CAMPOS_COTIZACION_LISTA = ['id', 'nombre_cliente', 'producto', 'color', 'cantidad', 'estado']
+
+# Campos que no son columnas propias (vienen de una relación)
+EXTRAS = {
+    m.Cliente: ['nombre', 'email'],
+    m.Pedido: ['detalles'],
+    m.OrdenCompra: ['detalles'],
+    m.Ruta: ['detalles', 'metricas'],
+}
+
+# Hijos que lee cada serializador: (campos que los usan, opción de carga)
+CARGAS = {
+    m.User: [(('role',), joinedload(m.User.role))],
+    m.Cliente: [(('nombre', 'email'), joinedload(m.Cliente.usuario))],
+    m.Pedido: [(('detalles',), selectinload(m.Pedido.detalles))],
+    m.OrdenCompra: [(('detalles',), selectinload(m.OrdenCompra.detalles))],
+    m.Ruta: [(('detalles',), selectinload(m.Ruta.detalles)),
+             (('metricas',), selectinload(m.Ruta.metricas))],
+}
+
+
+def visibles(modelo):
+    """Columnas que expone el serializador del modelo."""
+    return CAMPOS.get(modelo) or campos_modelo(modelo)
+
+
+def campos_disponibles(modelo):
+    """Todo lo que se puede pedir con `fields=`."""
+    return visibles(modelo) + EXTRAS.get(modelo, [])
+
+
+def propios(modelo, campos):
+    """Columnas visibles del modelo que entran en la proyección (todas si campos es None)."""
+    if campos is None:
+        return visibles(modelo)
+    return [c for c in visibles(modelo) if c in campos]
+
+
+def pide(campos, campo):
+    return campos is None or campo in campos
+
+
+def columnas(obj, campos=None):
+    """Dict {campo: valor} de las columnas de `obj` (o solo de `campos`)."""
+    if campos is None:
+        campos = visibles(type(obj))
+    return {c: valor_json(getattr(obj, c)) for c in campos}
+
+
+def consulta(modelo, campos=None, extra=()):
+    """
+    Query del modelo con los hijos de su serializador ya precargados. Con
+    `campos` lee solo esas columnas (+ id y las de `extra`, p. ej. la de orden)
+    y omite los hijos que ningún campo pedido usa.
+    """
+    opciones = [op for usados, op in CARGAS.get(modelo, ())
+                if campos is None or set(usados) & set(campos)]
+    if campos is not None:
+        leer = {'id', *extra, *propios(modelo, campos)}
+        opciones.append(load_only(*[getattr(modelo, c) for c in campos_modelo(modelo) if c in leer]))
+    return modelo.query.options(*opciones)
+
+
+def obtener(modelo, id_):
+    """Un registro por id con sus hijos (None si no existe)."""
+    return consulta(modelo).filter(modelo.id == id_).first()
+
+
+# -------------------------
+# Serializadores con forma propia
+# -------------------------
+SERIALIZADORES = {}
+
+
+def serializador(modelo):
+    def registrar(funcion):
+        SERIALIZADORES[modelo] = funcion
+        return funcion
+    return registrar
+
+
+def serializar(obj, campos=None):
+    """Dict JSON de cualquier modelo de models.py (solo `campos` si se indica)."""
+    funcion = SERIALIZADORES.get(type(obj))
+    if funcion:
+        return funcion(obj, campos)
+    return columnas(obj, propios(type(obj), campos))
+
+
+def serializar_lista(objetos, campos=None):
+    return [serializar(o, campos) for o in objetos]
+
+
+@serializador(m.User)
+def serializar_usuario(u, campos=None):
+    # nunca expone password_hash
+    return {
+        'id': u.id,
+        'username': u.nombre,
+        'email': u.email,
+        'role': u.role.nombre if u.role else None,
+        'is_active': u.activo
+    }
+
+
+@serializador(m.Cliente)
+def serializar_cliente(c, campos=None):
+    data = columnas(c, propios(m.Cliente, campos))
+    # nombre y email viven en el usuario; '' si el cliente no tiene usuario
+    for campo in ('nombre', 'email'):
+        if pide(campos, campo):
+            data[campo] = getattr(c.usuario, campo) if c.usuario else ''
+    return data
+
+
+@serializador(m.Pedido)
+def serializar_pedido(p, campos=None):
+    data = columnas(p, propios(m.Pedido, campos))
+    if pide(campos, 'detalles'):
+        data['detalles'] = serializar_lista(p.detalles)
+    return data
+
+
+@serializador(m.OrdenCompra)
+def serializar_orden_compra(o, campos=None):
+    data = columnas(o, propios(m.OrdenCompra, campos))
+    if pide(campos, 'detalles'):
+        data['detalles'] = serializar_lista(o.detalles)
+    return data
+
+
+@serializador(m.Ruta)
+def serializar_ruta(r, campos=None):
+    data = columnas(r, propios(m.Ruta, campos))
+    if pide(campos, 'detalles'):
+        data['detalles'] = serializar_lista(r.detalles)
+    if pide(campos, 'metricas'):
+        data['metricas'] = serializar_lista(r.metricas)
+    return data
+
+
+@serializador(m.Cotizacion)
+def serializar_cotizacion(c, campos=None):
+    if campos is not None:
+        return columnas(c, propios(m.Cotizacion, campos))
+    data = columnas(c)
+    # los detalles (calaminas, cumbreras, etc.) se fusionan con los datos principales
+    if c.detalles:
+        data.update(c.detalles)
+    return data
+
+
+def resumen_cotizacion(c):
+    return columnas(c, CAMPOS_COTIZACION_LISTA)
@@ -0,0 +1,14 @@
+"""
+Configuración común de las pruebas del backend: base SQLite en memoria y
+caches de rutas/distancias desactivados, antes de importar app.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("MAIL_PORT", "25")
+os.environ.setdefault("RUTA_CACHE_DB", "")
+os.environ.setdefault("DISTANCIAS_DB", "")
@@ -0,0 +1,59 @@
+"""
+Listas por páginas: sin limit la respuesta trae como mucho LISTA_LIMITE_MAX
+filas y 'siguiente_cursor'; siguiendo el cursor se recorre todo sin repetir.
+"""
+
+import datetime
+
+import pytest
+from flask import Flask
+
+import models as m
+import listados
+
+
+@pytest.fixture
+def app_pedidos(monkeypatch):
+    monkeypatch.setattr(listados, "LISTA_LIMITE_MAX", 7)
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    m.db.init_app(app)
+    with app.app_context():
+        m.db.create_all()
+        base = datetime.datetime(2024, 1, 1)
+        for i in range(30):
+            # fechas repetidas y algunas nulas: el cursor desempata por id
+            fecha = None if i in (3, 4) else base + datetime.timedelta(days=i // 3)
+            m.db.session.add(m.Pedido(total=i, estado="pendiente" if i % 2 else "entregado", fecha_pedido=fecha))
+        m.db.session.commit()
+        yield app
+        m.db.session.remove()
+
+
+def _todas(args):
+    filas, cursor = [], None
+    while True:
+        items, cursor = listados.listar("pedidos", dict(args, cursor=cursor) if cursor else args)
+        assert len(items) <= listados.LISTA_LIMITE_MAX
+        filas += [p["id"] for p in items]
+        if not cursor:
+            return filas
+
+
+def test_sin_limit_se_pagina_con_el_maximo(app_pedidos):
+    items, cursor = listados.listar("pedidos", {})
+    assert len(items) == listados.LISTA_LIMITE_MAX
+    assert cursor is not None
+
+
+def test_siguiendo_el_cursor_se_recorre_todo(app_pedidos):
+    ids = _todas({})
+    assert sorted(ids) == list(range(1, 31))
+    esperado = [p.id for p in m.Pedido.query.order_by(m.Pedido.fecha_pedido.desc().nullslast(), m.Pedido.id.desc())]
+    assert ids == esperado
+    assert sorted(_todas({"estado": "pendiente", "limit": "4"})) == list(range(2, 31, 2))
+
+
+def test_limit_no_supera_el_maximo(app_pedidos):
+    items, _ = listados.listar("pedidos", {"limit": "1000"})
+    assert len(items) == listados.LISTA_LIMITE_MAX
@@ -0,0 +1,127 @@
+"""
+Consultas del motor CSR sobre una grilla pequeña: A*, Dijkstra uno-a-muchos y
+la jerarquía de contracción deben dar las mismas distancias que networkx, y
+los cierres de feria se aplican solo en su día.
+"""
+
+import math
+import random
+
+import networkx as nx
+import pytest
+
+from ml.motor_rutas import MotorRutas
+from ml.jerarquia import JerarquiaContraccion
+
+LADO = 6
+PASO_LAT = 0.0018   # ~200 m
+PASO_LON = 0.001876  # ~200 m a -16.5°
+JUEVES = 3
+
+
+def _haversine(G, a, b):
+    la1, lo1, la2, lo2 = map(math.radians, (G.nodes[a]["y"], G.nodes[a]["x"], G.nodes[b]["y"], G.nodes[b]["x"]))
+    h = math.sin((la2 - la1) / 2) ** 2 + math.cos(la1) * math.cos(la2) * math.sin((lo2 - lo1) / 2) ** 2
+    return 2 * 6371008.8 * math.asin(math.sqrt(h))
+
+
+def _grilla(seed=7):
+    """Grilla dirigida con pesos asimétricos (length >= distancia recta)."""
+    rnd = random.Random(seed)
+    G = nx.MultiDiGraph()
+    for i in range(LADO):
+        for j in range(LADO):
+            G.add_node(i * LADO + j + 1, y=-16.5 + i * PASO_LAT, x=-68.15 + j * PASO_LON)
+    for i in range(LADO):
+        for j in range(LADO):
+            u = i * LADO + j + 1
+            vecinos = ([u + 1] if j + 1 < LADO else []) + ([u + LADO] if i + 1 < LADO else [])
+            for v in vecinos:
+                for a, b in ((u, v), (v, u)):
+                    largo = _haversine(G, a, b) * (1 + rnd.random())
+                    vel = rnd.choice([20, 30, 50])
+                    G.add_edge(a, b, length=largo, travel_time=largo / (vel / 3.6),
+                               speed_kph=vel, highway=rnd.choice(["primary", "residential"]))
+    return G
+
+
+def _pares(G, n=25, seed=3):
+    rnd = random.Random(seed)
+    nodos = list(G.nodes)
+    return [tuple(rnd.sample(nodos, 2)) for _ in range(n)]
+
+
+@pytest.fixture
+def grilla():
+    return _grilla()
+
+
+@pytest.mark.parametrize("weight", ["length", "travel_time"])
+def test_astar_y_dijkstra_igual_a_networkx(grilla, weight):
+    motor = MotorRutas.desde_grafo(grilla)
+    pares = _pares(grilla)
+    origenes = sorted({o for o, _ in pares})
+    destinos = sorted({d for _, d in pares})
+    distancia, tiempo = motor.distancias(origenes, destinos, weight=weight)
+    for o, d in pares:
+        esperado = nx.shortest_path_length(grilla, o, d, weight=weight)
+        path, dist_m, t_s = motor.ruta(o, d, weight=weight)
+        assert path[0] == o and path[-1] == d
+        obtenido = dist_m if weight == "length" else t_s
+        assert obtenido == pytest.approx(esperado, rel=1e-6)
+        total = (distancia if weight == "length" else tiempo)[origenes.index(o), destinos.index(d)]
+        assert total == pytest.approx(esperado, rel=1e-6)
+
+
+def test_jerarquia_igual_a_networkx(grilla):
+    motor = MotorRutas.desde_grafo(grilla)
+    motor.adjuntar_jerarquia(JerarquiaContraccion.construir(motor))
+    for o, d in _pares(grilla):
+        esperado = nx.shortest_path_length(grilla, o, d, weight="length")
+        path, dist_m, _ = motor.ruta(o, d)
+        assert path[0] == o and path[-1] == d
+        assert dist_m == pytest.approx(esperado, rel=1e-6)
+        assert nx.path_weight(grilla, path, "length") == pytest.approx(esperado, rel=1e-6)
+
+
+def test_cierres_de_feria_solo_el_dia_de_feria(grilla, tmp_path):
+    pytest.importorskip("shapely")
+    pytest.importorskip("osmnx")
+    from ml.ruta_modelo import export_graph_snapshot
+
+    centro = (LADO // 2) * LADO + LADO // 2 + 1
+    feria = (grilla.nodes[centro]["y"], grilla.nodes[centro]["x"], 150, (JUEVES,))
+    motor = export_graph_snapshot(grilla, snapshot_dir=str(tmp_path / "snap"), ferias=[feria])
+
+    # con 150 m de radio solo quedan dentro los puntos medios de las calles del centro
+    sin_feria = grilla.copy()
+    sin_feria.remove_edges_from(list(grilla.in_edges(centro, keys=True)) + list(grilla.out_edges(centro, keys=True)))
+    assert int(motor.cerradas(JUEVES).sum()) == grilla.number_of_edges() - sin_feria.number_of_edges()
+    assert not motor.cerradas(JUEVES - 1).any()
+
+    pares = [(o, d) for o, d in _pares(grilla, n=40) if o != centro and d != centro]
+    ch_feria = JerarquiaContraccion.construir(motor, cerradas=motor.cerradas(JUEVES))
+    for jerarquia in (None, ch_feria):  # A* con cierres, luego la jerarquía del jueves
+        if jerarquia is not None:
+            motor.adjuntar_jerarquia(jerarquia)
+        for o, d in pares:
+            path, dist_m, _ = motor.ruta(o, d, dia=JUEVES)
+            assert centro not in path
+            assert dist_m == pytest.approx(nx.shortest_path_length(sin_feria, o, d, weight="length"), rel=1e-6)
+            _, dist_m, _ = motor.ruta(o, d, dia=JUEVES - 1)
+            assert dist_m == pytest.approx(nx.shortest_path_length(grilla, o, d, weight="length"), rel=1e-6)
+
+
+def test_guardar_conserva_el_snapshot_de_otro_worker(grilla, tmp_path, monkeypatch):
+    import ml.motor_rutas as motor_rutas
+    motor = MotorRutas.desde_grafo(grilla)
+    destino = str(tmp_path / "snap")
+    motor.guardar(destino)
+
+    # otro worker deja su snapshot entre nuestro borrado y nuestro renombre
+    borrar = motor_rutas.shutil.rmtree
+    monkeypatch.setattr(motor_rutas.shutil, "rmtree",
+                        lambda p, **kw: None if p == destino else borrar(p, **kw))
+    motor.guardar(destino)
+    assert MotorRutas.cargar(destino).version == motor.version
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["snap"]
@@ -0,0 +1,86 @@
+"""
+Contrato de /api/predict-route-time y /batch después de reentrenar: los
+clientes que solo mandan dist_m, base_time_sec e is_thursday se siguen
+respondiendo (modelo de servicio de 3 features) aunque el modelo activo use
+también las features de camino.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sklearn")
+pytest.importorskip("osmnx")
+
+from ml.caracteristicas import MODEL_FEATURES, FEATURES_CAMINO, ESQUEMA_LEGADO
+from ml.bosque import BosquePlano
+from ml import ruta_modelo
+
+LEGADO = {"dist_m": 2500.0, "base_time_sec": 420.0, "is_thursday": 1}
+
+
+def _dataset(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "dist_m": rng.uniform(200, 8000, n),
+        "is_thursday": rng.integers(0, 2, n),
+        "n_aristas": rng.integers(2, 120, n).astype(float),
+        "n_giros": rng.integers(0, 40, n).astype(float),
+        "frac_principal": rng.random(n),
+        "frac_secundaria": rng.random(n),
+        "frac_local": rng.random(n),
+        "aristas_feria": rng.integers(0, 5, n).astype(float),
+    })
+    df["base_time_sec"] = df["dist_m"] / 8.0
+    df["time_real_sec"] = df["base_time_sec"] * (1.0 + 0.3 * df["is_thursday"]) + 2.0 * df["n_giros"]
+    return df[[*MODEL_FEATURES, "time_real_sec"]]
+
+
+@pytest.fixture
+def reentrenado(tmp_path):
+    import app as servidor
+    from models import db, ModeloML
+    from ml.registro import registrar_modelo
+
+    artefacto = ruta_modelo.entrenar_version(_dataset(), modelos_dir=str(tmp_path))
+    with servidor.app.app_context():
+        db.create_all()
+        registrar_modelo(db, ModeloML, artefacto)
+        servidor.REGISTRO.verificar(forzar=True)
+    yield servidor, artefacto
+    with servidor.app.app_context():
+        db.drop_all()
+
+
+def test_reentrenamiento_registra_esquema_completo_y_servicio_legado(reentrenado):
+    _, artefacto = reentrenado
+    assert artefacto["esquema"] == MODEL_FEATURES
+    assert artefacto["metadatos"]["legado"]["esquema"] == ESQUEMA_LEGADO
+
+
+def test_predict_route_time_con_payload_legado(reentrenado):
+    servidor, artefacto = reentrenado
+    r = servidor.app.test_client().post("/api/predict-route-time", json=LEGADO)
+    assert r.status_code == 200, r.get_json()
+    esperado = BosquePlano.cargar(artefacto["metadatos"]["legado"]["ruta_archivo"]).predict(
+        np.array([[LEGADO[c] for c in ESQUEMA_LEGADO]]))[0]
+    assert r.get_json()["predicted_time_sec"] == pytest.approx(esperado)
+
+    # con las features de camino responde el modelo principal
+    completo = dict(LEGADO, n_aristas=30, n_giros=12, frac_principal=0.2, frac_secundaria=0.3,
+                    frac_local=0.5, aristas_feria=1)
+    r = servidor.app.test_client().post("/api/predict-route-time", json=completo)
+    assert r.status_code == 200, r.get_json()
+    esperado = BosquePlano.cargar(artefacto["ruta_archivo"]).predict(
+        np.array([[completo[c] for c in MODEL_FEATURES]]))[0]
+    assert r.get_json()["predicted_time_sec"] == pytest.approx(esperado)
+
+
+def test_batch_con_payload_legado(reentrenado):
+    servidor, _ = reentrenado
+    rutas = [LEGADO, {"dist_m": 900, "base_time_sec": 150}, dict(LEGADO, **{c: 1 for c in FEATURES_CAMINO})]
+    r = servidor.app.test_client().post("/api/predict-route-time/batch", json={"routes": rutas})
+    assert r.status_code == 200, r.get_json()
+    cuerpo = r.get_json()
+    assert cuerpo["errors"] == 0
+    assert all(res["success"] for res in cuerpo["results"])
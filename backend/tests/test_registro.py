@@ -0,0 +1,49 @@
+"""
+RegistroModelos.verificar cuando la tabla ModeloML no responde: con un modelo
+cargado se sigue sirviendo ése; el respaldo de archivos es solo para arrancar.
+"""
+
+from ml import registro
+from ml.registro import RegistroModelos
+
+
+class _SesionCaida:
+    def rollback(self):
+        pass
+
+
+class _ConsultaCaida:
+    session = _SesionCaida()
+
+    def filter_by(self, **kwargs):
+        raise RuntimeError("la base no responde")
+
+
+class _ModeloML:
+    query = _ConsultaCaida()
+
+
+def test_error_de_base_conserva_el_modelo_vigente(monkeypatch):
+    reg = RegistroModelos(_ModeloML)
+    vigente = object()
+    info = {"clave": "modelo_ml:7", "esquema": ["dist_m"]}
+    reg._vigente = (vigente, info, {("dist_m",): vigente})
+    monkeypatch.setattr(RegistroModelos, "_info_legado",
+                        staticmethod(lambda: {"clave": "archivo:viejo"}))
+    monkeypatch.setattr(RegistroModelos, "_cargar", lambda self, info: None)
+
+    assert reg.verificar(forzar=True) is vigente
+    assert reg.info is info
+    assert reg._cargando is None  # no se lanzó la carga del respaldo
+
+
+def test_error_de_base_sin_modelo_usa_los_archivos(monkeypatch):
+    reg = RegistroModelos(_ModeloML)
+    respaldo = object()
+    monkeypatch.setattr(RegistroModelos, "_info_legado", staticmethod(
+        lambda: {"clave": "archivo:respaldo", "ruta_archivo": "x.npz", "formato": "bosque_npz",
+                 "esquema": ["dist_m"]}))
+    monkeypatch.setattr(registro, "cargar_artefacto", lambda ruta, formato: respaldo)
+
+    assert reg.verificar() is respaldo
+    assert reg.info["clave"] == "archivo:respaldo"
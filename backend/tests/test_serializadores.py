@@ -0,0 +1,39 @@
+"""
+Forma de las respuestas: cada endpoint devuelve exactamente los campos que
+devolvía antes de pasar a los serializadores compartidos.
+"""
+
+import pytest
+
+import models as m
+from serializadores import serializar
+
+FORMAS = {
+    m.Pedido: {'id', 'cliente_id', 'fecha_pedido', 'estado', 'prioridad', 'total', 'vehiculo_id',
+               'lat', 'lon', 'detalles'},
+    m.PedidoDetalle: {'id', 'producto_id', 'cantidad', 'subtotal'},
+    m.Proveedor: {'id', 'nombre', 'contacto', 'telefono', 'direccion', 'datos_extra'},
+    m.OrdenCompra: {'id', 'proveedor_id', 'referencia', 'fecha', 'estado', 'total', 'detalles'},
+    m.OrdenCompraDetalle: {'id', 'producto_id', 'cantidad', 'precio_unitario', 'subtotal'},
+    m.CuentaPagar: {'id', 'proveedor_id', 'referencia', 'monto_total', 'monto_pagado', 'fecha_emision',
+                    'fecha_vencimiento', 'estado', 'descripcion'},
+    m.MovimientoPago: {'id', 'cuenta_pagar_id', 'cuenta_cobrar_id', 'monto', 'fecha_pago', 'metodo_pago_id',
+                       'referencia_pago', 'nota'},
+    m.InventarioSucursal: {'id', 'producto_id', 'sucursal_id', 'cantidad', 'estado', 'ultimo_movimiento'},
+    m.Producto: {'id', 'nombre', 'descripcion', 'categoria', 'precio', 'stock', 'activo'},
+    m.Vehiculo: {'id', 'placa', 'marca', 'modelo', 'capacidad'},
+    m.Cliente: {'id', 'usuario_id', 'nombre', 'email', 'direccion', 'telefono', 'nit'},
+    m.User: {'id', 'username', 'email', 'role', 'is_active'},
+}
+
+
+@pytest.mark.parametrize("modelo", list(FORMAS), ids=lambda c: c.__name__)
+def test_campos_por_endpoint(modelo):
+    assert set(serializar(modelo(id=1))) == FORMAS[modelo]
+
+
+def test_cotizacion_fusiona_sus_detalles():
+    c = m.Cotizacion(id=1, nombre_cliente="Ana", detalles={"calaminas": 12})
+    data = serializar(c)
+    assert data["calaminas"] == 12
+    assert "detalles" not in data
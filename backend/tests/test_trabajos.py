@@ -0,0 +1,60 @@
+"""
+Trabajos huérfanos: un 'pendiente' cuyo proceso murió, o que nunca llegó a
+tener pid, no bloquea para siempre los entrenamientos siguientes.
+"""
+
+import subprocess
+import sys
+import time
+
+import pytest
+
+from ml import trabajos
+
+
+def _insertar(db, trabajo_id, estado="pendiente", pid=None, creado=None):
+    creado = time.time() if creado is None else creado
+    con = trabajos._conectar(db)
+    con.execute("INSERT INTO trabajos (id, tipo, estado, pid, creado, actualizado) VALUES (?, 'entrenamiento', ?, ?, ?, ?)",
+                (trabajo_id, estado, pid, creado, creado))
+    con.commit()
+    con.close()
+
+
+def _pid_muerto():
+    p = subprocess.Popen([sys.executable, "-c", "pass"])
+    p.wait()
+    return p.pid
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "trabajos.db")
+
+
+def test_pendiente_con_proceso_muerto_se_descarta(db):
+    _insertar(db, "a", pid=_pid_muerto())
+    assert trabajos.trabajo_activo(db) is None
+    assert trabajos.obtener_trabajo("a", db)["estado"] == "error"
+
+
+def test_pendiente_sin_pid_vence_tras_la_gracia(db):
+    _insertar(db, "viejo", creado=time.time() - trabajos.GRACIA_PENDIENTE_S - 1)
+    _insertar(db, "nuevo")
+    assert trabajos.trabajo_activo(db) == "nuevo"
+    assert trabajos.obtener_trabajo("viejo", db)["estado"] == "error"
+    assert trabajos.obtener_trabajo("nuevo", db)["estado"] == "pendiente"
+
+
+def test_fallo_al_arrancar_marca_error(db, monkeypatch):
+    def no_arranca(self):
+        raise OSError("sin procesos disponibles")
+    monkeypatch.setattr(trabajos.multiprocessing.get_context("spawn").Process, "start", no_arranca)
+
+    with pytest.raises(OSError):
+        trabajos.lanzar_entrenamiento(db_path=db)
+    assert trabajos.trabajo_activo(db) is None
+    con = trabajos._conectar(db)
+    estados = [f["estado"] for f in con.execute("SELECT estado FROM trabajos")]
+    con.close()
+    assert estados == ["error"]
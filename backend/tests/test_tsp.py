@@ -0,0 +1,53 @@
+"""
+solve_tsp sobre matrices asimétricas aleatorias pequeñas: hasta
+HELD_KARP_MAX_N da el óptimo (comparado con fuerza bruta) y la búsqueda local
+devuelve un tour válido que no es peor que el del vecino más cercano ni mejor
+que el de Held-Karp.
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from ml import tsp
+
+
+def _matriz(n, seed):
+    rng = np.random.default_rng(seed)
+    D = rng.uniform(10, 1000, (n, n))
+    np.fill_diagonal(D, 0.0)
+    return D
+
+
+def _fuerza_bruta(D, depot=0):
+    otros = [k for k in range(len(D)) if k != depot]
+    return min(tsp.tour_length(D, [depot, *p, depot]) for p in itertools.permutations(otros))
+
+
+def _valido(tour, n, depot=0):
+    return tour[0] == depot and tour[-1] == depot and sorted(tour[:-1]) == list(range(n))
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_held_karp_es_optimo_en_matrices_asimetricas(seed):
+    n = 4 + seed % 4
+    D = _matriz(n, seed)
+    tour, costo = tsp.solve_tsp(D, depot=0)
+    assert _valido(tour, n)
+    assert costo == pytest.approx(tsp.tour_length(D, tour))
+    assert costo == pytest.approx(_fuerza_bruta(D))
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_busqueda_local_acotada_por_held_karp(seed, monkeypatch):
+    n = 9 + seed % 3
+    D = _matriz(n, 100 + seed)
+    _, optimo = tsp.held_karp(D, depot=0)
+    _, greedy = tsp.solve_tsp_nearest_neighbor(D, depot=0)
+
+    monkeypatch.setattr(tsp, "HELD_KARP_MAX_N", 0)  # fuerza 2-opt / Or-opt
+    tour, costo = tsp.solve_tsp(D, depot=0, time_budget_s=1.0)
+    assert _valido(tour, n)
+    assert costo == pytest.approx(tsp.tour_length(D, tour))
+    assert optimo - 1e-9 <= costo <= greedy + 1e-9
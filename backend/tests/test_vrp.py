@@ -0,0 +1,61 @@
+"""
+solve_cvrp sobre matrices asimétricas aleatorias: cada ruta respeta la
+capacidad de su vehículo, cada parada aparece exactamente una vez (en una ruta
+o en sin_asignar) y capacidad None significa sin límite.
+"""
+
+import numpy as np
+import pytest
+
+from ml.vrp import solve_cvrp
+
+
+def _instancia(n, seed):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, 5000, (n, 2))
+    D = np.hypot(*(xy[:, None, :] - xy[None, :, :]).transpose(2, 0, 1)) * rng.uniform(1.0, 1.4, (n, n))
+    np.fill_diagonal(D, 0.0)
+    demandas = [0.0] + rng.integers(1, 10, n - 1).astype(float).tolist()
+    prioridades = [0] + rng.integers(0, 3, n - 1).tolist()
+    return D, demandas, prioridades
+
+
+def _cada_parada_una_vez(rutas, fuera, n):
+    visitas = [c for ruta in rutas for c in ruta] + list(fuera)
+    return sorted(visitas) == list(range(1, n))
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_capacidades_y_paradas_unicas(seed):
+    n = 15 + seed * 3
+    D, demandas, prioridades = _instancia(n, seed)
+    capacidades = [12, 20, 8, 15][: 2 + seed % 3]
+    rutas, fuera = solve_cvrp(D, demandas, capacidades, prioridades, time_budget_s=0.2)
+    assert len(rutas) == len(capacidades)
+    for ruta, capacidad in zip(rutas, capacidades):
+        assert sum(demandas[c] for c in ruta) <= capacidad
+        assert 0 not in ruta
+    assert _cada_parada_una_vez(rutas, fuera, n)
+
+
+def test_fuera_de_capacidad_las_de_menor_prioridad():
+    D, demandas, _ = _instancia(12, 42)
+    prioridades = [0] + [2] * 5 + [0] * 6
+    capacidad = sum(demandas[1:6])  # alcanza justo para las prioritarias
+    rutas, fuera = solve_cvrp(D, demandas, [capacidad], prioridades, time_budget_s=0.2)
+    assert set(range(1, 6)) <= set(rutas[0])
+    assert all(prioridades[c] == 0 for c in fuera)
+    assert _cada_parada_una_vez(rutas, fuera, 12)
+
+
+def test_capacidad_none_es_sin_limite():
+    D, demandas, prioridades = _instancia(25, 7)
+    demandas = [0.0] + [1000.0] * 24
+    rutas, fuera = solve_cvrp(D, demandas, [None, None], prioridades, time_budget_s=0.2)
+    assert fuera == []
+    assert _cada_parada_una_vez(rutas, fuera, 25)
+    # con un vehículo limitado, el resto va al que no tiene límite
+    rutas, fuera = solve_cvrp(D, demandas, [1500, None], prioridades, time_budget_s=0.2)
+    assert fuera == []
+    assert sum(demandas[c] for c in rutas[0]) <= 1500
+    assert _cada_parada_una_vez(rutas, fuera, 25)
@@ -2,6 +2,7 @@ import React, { useEffect, useRef, useState, useCallback } from 'react';
 import 'leaflet/dist/leaflet.css';
 import L from 'leaflet';
 import axios from 'axios';
+import { listarTodo } from '../utils/api';
 
 const API_BASE_URL = 'http://localhost:8080';
 
@@ -158,7 +159,7 @@ const MapView = ({ initialCoord = null }) => {
 
   const fetchPendingPedidos = async () => {
     try {
-      const r = await axios.get(`${API_BASE_URL}/api/pedidos`);
+      const r = await listarTodo(`${API_BASE_URL}/api/pedidos`, 'pedidos', { estado: 'pendiente' });
       if (r.data && r.data.pedidos) {
         const pendientes = r.data.pedidos.filter(p => p.estado === 'pendiente');
         setPendingPedidos(pendientes);
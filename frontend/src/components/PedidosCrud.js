@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import axios from 'axios';
+import { listarTodo } from '../utils/api';
 import './Pedidos.css';
 
 const API_BASE = process.env.REACT_APP_API_BASE || 'http://localhost:8080';
@@ -47,7 +48,7 @@ const Pedidos = () => {
   const fetchPedidos = async () => {
     setLoading(true);
     try {
-      const r = await axios.get(`${API_BASE}/api/pedidos`);
+      const r = await listarTodo(`${API_BASE}/api/pedidos`, 'pedidos');
       setList(r.data.pedidos || []);
     } catch (e) {
       console.error(e);
@@ -58,7 +59,7 @@ const Pedidos = () => {
 
   const fetchClientes = async () => {
     try {
-      const r = await axios.get(`${API_BASE}/api/clientes`);
+      const r = await listarTodo(`${API_BASE}/api/clientes`, 'clientes');
       if (r.data.success) {
         setClientes(r.data.clientes || []);
       }
@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import './UserCrud.css';
+import { listarTodo } from '../utils/api';
 
 const ProductoCrud = () => {
   const [activeSection, setActiveSection] = useState('productos');
@@ -49,8 +50,7 @@ const ProductoCrud = () => {
   // ==================== PRODUCTOS ====================
   const fetchProductos = async () => {
     try {
-      const response = await fetch('http://localhost:8080/api/productos');
-      const data = await response.json();
+      const { data } = await listarTodo('http://localhost:8080/api/productos', 'productos');
       if (data.success) {
         setProductos(data.productos);
         
@@ -163,8 +163,7 @@ const ProductoCrud = () => {
   // ==================== VEHÍCULOS ====================
   const fetchVehiculos = async () => {
     try {
-      const response = await fetch('http://localhost:8080/api/vehiculos');
-      const data = await response.json();
+      const { data } = await listarTodo('http://localhost:8080/api/vehiculos', 'vehiculos');
       if (data.success) {
         setVehiculos(data.vehiculos);
       }
@@ -262,8 +261,7 @@ const ProductoCrud = () => {
   // ==================== CLIENTES ====================
   const fetchClientes = async () => {
     try {
-      const response = await fetch('http://localhost:8080/api/clientes');
-      const data = await response.json();
+      const { data } = await listarTodo('http://localhost:8080/api/clientes', 'clientes');
       if (data.success) {
         setClientes(data.clientes);
       }
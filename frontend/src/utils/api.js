@@ -24,6 +24,20 @@ api.interceptors.request.use(
   }
 );
 
+// Las listas vienen por páginas: pide la siguiente con 'siguiente_cursor'
+// hasta la última y devuelve todas las filas con la forma de siempre
+// ({ data: { success, [clave]: [...] } }). `path` puede ser una URL completa.
+export const listarTodo = async (path, clave, params = {}) => {
+  const filas = [];
+  let cursor = null;
+  do {
+    const res = await api.get(path, { params: cursor ? { ...params, cursor } : params });
+    if (!res.data || !res.data.success) return res;
+    filas.push(...(res.data[clave] || []));
+    cursor = res.data.siguiente_cursor;
+  } while (cursor);
+  return { data: { success: true, [clave]: filas } };
+};
 
 export const authAPI = {
   login: (credentials) => api.post('/login', credentials),
@@ -40,7 +54,7 @@ export const dashboardAPI = {
 };
 
 export const proveedoresAPI = {
-  list: () => api.get('/proveedores'),
+  list: (params) => listarTodo('/proveedores', 'proveedores', params),
   get: (id) => api.get(`/proveedores/${id}`),
   create: (data) => api.post('/proveedores', data),
   update: (id, data) => api.put(`/proveedores/${id}`, data),
@@ -48,7 +62,7 @@ export const proveedoresAPI = {
 };
 
 export const ordenesAPI = {
-  list: () => api.get('/ordenes-compra'),
+  list: (params) => listarTodo('/ordenes-compra', 'ordenes', params),
   get: (id) => api.get(`/ordenes-compra/${id}`),
   create: (data) => api.post('/ordenes-compra', data),
   update: (id, data) => api.put(`/ordenes-compra/${id}`, data),
@@ -56,7 +70,7 @@ export const ordenesAPI = {
 };
 
 export const finanzasAPI = {
-  listCuentasPagar: () => api.get('/cuentas-pagar'),
+  listCuentasPagar: (params) => listarTodo('/cuentas-pagar', 'cuentas_pagar', params),
   getCuentaPagar: (id) => api.get(`/cuentas-pagar/${id}`),
   createCuentaPagar: (data) => api.post('/cuentas-pagar', data),
   updateCuentaPagar: (id, data) => api.put(`/cuentas-pagar/${id}`, data),
@@ -64,12 +78,12 @@ export const finanzasAPI = {
 };
 
 export const movimientosAPI = {
-  list: () => api.get('/movimientos-pago'),
+  list: (params) => listarTodo('/movimientos-pago', 'movimientos', params),
   create: (data) => api.post('/movimientos-pago', data),
 };
 
 export const inventarioAPI = {
-  list: () => api.get('/inventario'),
+  list: (params) => listarTodo('/inventario', 'inventario', params),
   get: (id) => api.get(`/inventario/${id}`),
   create: (data) => api.post('/inventario', data),
   update: (id, data) => api.put(`/inventario/${id}`, data),
@@ -77,7 +91,7 @@ export const inventarioAPI = {
 };
 
 export const cotizacionesAPI = {
-  list: () => api.get('/cotizaciones'),
+  list: (params) => listarTodo('/cotizaciones', 'cotizaciones', params),
   get: (id) => api.get(`/cotizaciones/${id}`),
   create: (data) => api.post('/cotizaciones', data),
   update: (id, data) => api.put(`/cotizaciones/${id}`, data),
@@ -85,7 +99,7 @@ export const cotizacionesAPI = {
 };
 
 export const pedidosAPI = {
-  list: () => api.get('/pedidos'),
+  list: (params) => listarTodo('/pedidos', 'pedidos', params),
   get: (id) => api.get(`/pedidos/${id}`),
   create: (data) => api.post('/pedidos', data),
   update: (id, data) => api.put(`/pedidos/${id}`, data),